@@ -1,14 +1,25 @@
 from datetime import datetime, timedelta
-import yfinance as yf
 import pandas as pd
 import numpy as np
-import talib
 import plotly.graph_objs as go
 from plotly.subplots import make_subplots
 import streamlit as st
 
+from bar_store import DAILY_INTERVALS, first_bar, load_bars
+from core.indicators import IndicatorCache, calculate_indicators, warmup_bars
+from data_service import DataService
+from live_bars import LiveBars, LiveFeed, replay_ticks
+from metadata_cache import MetadataCache, get_company_name
+from plotting import downsample_ohlc, patch_figure, signal_shapes
+from resample import base_bars, base_interval, resample_bars
+from table_view import DEFAULT_TABLE_COLUMNS, TABLE_FILTERS, table_page
+from tracing import make_tracer, show_timings
+
 st.set_page_config(layout="wide")
 
+# st.fragment is called st.experimental_fragment before Streamlit 1.37
+fragment = getattr(st, "fragment", None) or st.experimental_fragment
+
 # Define the available intervals
 intervals = [
     "1m",
@@ -27,60 +38,137 @@ intervals = [
 ]
 
 
-def download_data(symbol, interval):
-    if interval =="1d":
-        data = yf.download(symbol, interval=interval)
-        # return data
-    elif interval == "1h":
-        # Calculate the start date (2 years ago from today)
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=728)
-
-        # Download the data
-        data = yf.download(symbol, start=start_date.strftime('%Y-%m-%d'), interval='1h')
-        data=yf.download(symbol, period="1y",interval=interval)
-        # return data
-    data.index = pd.to_datetime(data.index)  # Ensure index is DatetimeIndex
-    data = data[data.index.weekday < 5]
-    data.reset_index(inplace=True)
-    data.rename(columns={"index": "Datetime"}, inplace=True)
-    return data
-
-
-def point_pos(data, column):
-    if data[column]==1:
-        return data["RSI_14"]
+# The metadata cache is stored on disk and shared by all sessions and processes
+@st.cache_resource
+def get_metadata_cache():
+    return MetadataCache()
+
+
+# Identical downloads of concurrent sessions are made once
+@st.cache_resource
+def get_data_service():
+    return DataService()
+
+
+# Stage timings of all sessions, exported for Prometheus
+@st.cache_resource
+def get_tracer():
+    return make_tracer("app")
+
+
+# Indicator columns are cached per window, shared by all sessions
+@st.cache_resource
+def get_indicator_cache():
+    return IndicatorCache()
+
+
+def get_live_feed(symbol, interval, history, replay_file, replay_speed, windows, capacity):
+    # One live feed per session, a new one replaces it when the inputs change
+    key = (symbol, interval, replay_file, replay_speed, windows, capacity)
+    if st.session_state.get("live_key") != key:
+        feed = st.session_state.get("live_feed")
+        if feed is not None:
+            feed.stop()
+        # The bars before the buffer only warm up the indicators
+        history = history.iloc[-(capacity + warmup_bars(*windows)) :]
+        bars = LiveBars(interval, capacity, history, *windows)
+        st.session_state["live_feed"] = LiveFeed(bars, replay_ticks(replay_file, replay_speed)).start()
+        st.session_state["live_figure"] = None
+        st.session_state["live_key"] = key
+    return st.session_state["live_feed"]
+
+
+@fragment(run_every=1)
+def live_chart(webgl, capacity):
+    # Only this fragment reruns. The changed candles are patched into the
+    # figure instead of building it from all bars, but Streamlit still sends
+    # the whole figure of at most capacity candles to the browser every tick
+    feed = st.session_state["live_feed"]
+    fig = st.session_state.get("live_figure")
+    if fig is None:
+        feed.drain()
+        fig = plot_data(feed.frame(), webgl=webgl)
+        st.session_state["live_figure"] = fig
     else:
-        return None
-
-
-def calculate_indicators(data, ema5_window, ema20_window, rsi_window):
-    data["EMA_5"] = talib.EMA(data["Close"], timeperiod=ema5_window)
-    data["EMA_20"] = talib.EMA(data["Close"], timeperiod=ema20_window)
-    data["RSI_14"] = talib.RSI(data["Close"], timeperiod=rsi_window)
-    data["SMA_RSI_14"] = data["RSI_14"].rolling(window=14).mean()
-    # data["signal_1"] = ((data["RSI_14"].shift(1) < data["SMA_RSI_14"].shift(1)) & (data["RSI_14"] >= data["SMA_RSI_14"])).astype(int)
-    data["point_pos_signal_2"] = ((data["Adj Close"].shift(1) < data["EMA_20"].shift(1)) & (data["Adj Close"] >= data["EMA_20"])).astype(int)
-    data["signal_3"] = ((data["EMA_5"].shift(1) < data["EMA_20"].shift(1)) & (data["EMA_5"] >= data["EMA_20"])).astype(int)
-    data["signal_1"] = ((data["RSI_14"] >= data["SMA_RSI_14"])).astype(int)
-    data["point_pos_signal_1"] = (
-        (data["RSI_14"].shift(1) < data["SMA_RSI_14"].shift(1))
-        & (data["RSI_14"] >= data["SMA_RSI_14"])
-    ).astype(int)
-
-    # data["point_pos_signal_1"] = data.apply(lambda x: point_pos(x, "signal_1"), axis=1)
-    data["signal_2"] = ((data["Adj Close"] >= data["EMA_20"])).astype(int)
-    # data["stop_price"] =
-    # data["signal_3"] = ((data["EMA_5"] >= data["EMA_20"])).astype(int)
-    data["long_signal"] = ((data["signal_1"] + data["signal_2"] + data["signal_3"]) == 3).astype(int)
-    # data.reset_index(drop=False, inplace=True)
-    return data
+        patch_figure(fig, feed.drain(), max_points=capacity)
+    if feed.error is not None:
+        st.error(f"Live feed stopped: {feed.error}")
+    st.caption(f"{feed.ticks} ticks")
+    st.plotly_chart(fig, use_container_width=True)
+
+
+@fragment
+def show_table(data):
+    # Paging only reruns this fragment and only ships the rows of one page
+    col1, col2, col3 = st.columns([2, 1, 1])
+    with col1:
+        columns = st.multiselect(
+            "Columns",
+            list(data.columns),
+            default=[column for column in DEFAULT_TABLE_COLUMNS if column in data],
+        )
+    with col2:
+        only = TABLE_FILTERS[st.selectbox("Rows", list(TABLE_FILTERS))]
+    with col3:
+        page_size = st.selectbox("Rows per page", [50, 100, 250, 500], index=1)
+
+    page = st.number_input("Page (newest first)", min_value=1, value=1, key="table_page")
+    rows, total, pages = table_page(data, page, page_size, columns, only)
+    st.caption(f"Page {min(page, pages)} of {pages}, {total:,} rows")
+    with get_tracer().span("dataframe"):
+        st.dataframe(rows, hide_index=True)
+
+
+def download_data(symbol, interval, compact=False, bars=None):
+    # Read the bars from the local bar store, only the bars after the last
+    # stored timestamp are downloaded from yfinance. Only the base interval
+    # (1m, 1h or 1d) is stored, all other intervals are resampled from it.
+    # With bars only the last bars bars are read instead of the full history.
+    base = base_interval(interval)
+    window = None if bars is None else base_bars(interval, bars)
+    # Compact bars are compacted and the weekends dropped while they are
+    # read, so the full width bars are never copied
+    # Sessions loading the same bars at the same time share one load, the
+    # shared frame is not modified below
+    data = get_data_service().call(
+        ("bars", symbol.upper(), base, compact, window),
+        load_bars,
+        symbol,
+        base,
+        compact=compact,
+        bars=window,
+        drop_weekends=True,
+    )
+    if interval != base:
+        data = resample_bars(data, interval)
+    if bars is not None:
+        data = data.iloc[-bars:]
+    # yfinance names the index Datetime for intraday bars, the charts use Date
+    return data.rename_axis("Date").reset_index()
 
 
 # Function to plot data
-def plot_data(data, indices=[]):
-    
+def plot_data(data, indices=[], max_points=None, webgl=False, shade_signal=None, visible=None):
+    """
+    Plot the candlesticks with EMAs and the RSI with its SMA.
+
+    Parameters:
+        data (pd.DataFrame): The bars with the indicator columns.
+        indices (list): Signal indices, currently unused.
+        max_points (int): Downsample the bars to at most this many candles,
+            usually the chart width in pixels. Highs and lows are kept.
+        webgl (bool): Draw the indicator lines as WebGL traces.
+        shade_signal (str): Shade the background where this signal column is 1.
+        visible (int): Initially show the last visible candles, the earlier
+            candles are reached by panning. All candles are shown if None.
+    """
     global company_name
+    xaxis_range = None
+    if visible is not None and len(data) > visible:
+        xaxis_range = [data["Date"].iloc[-visible], data["Date"].iloc[-1]]
+    data = downsample_ohlc(data, max_points)
+    # WebGL traces stay responsive with many points
+    Line = go.Scattergl if webgl else go.Scatter
     config = {"scrollZoom": True}
     # Create a figure with two rows and shared x-axis
     fig = make_subplots(
@@ -107,7 +195,7 @@ def plot_data(data, indices=[]):
                                  row=1, col=1)
 
     fig.add_trace(
-        go.Scatter(
+        Line(
             x=data['Date'],
             y=data["EMA_5"],
             mode="lines",
@@ -118,7 +206,7 @@ def plot_data(data, indices=[]):
         col=1,
     )
     fig.add_trace(
-        go.Scatter(
+        Line(
             x=data['Date'],
             y=data["EMA_20"],
             mode="lines",
@@ -131,7 +219,7 @@ def plot_data(data, indices=[]):
 
     # Add trace for the RSI plot
     fig.add_trace(
-        go.Scatter(
+        Line(
             x=data['Date'],
             y=data["RSI_14"],
             mode="lines",
@@ -142,7 +230,7 @@ def plot_data(data, indices=[]):
         col=1,
     )
     fig.add_trace(
-        go.Scatter(
+        Line(
             x=data['Date'],
             y=data["SMA_RSI_14"],
             mode="lines",
@@ -167,23 +255,6 @@ def plot_data(data, indices=[]):
     #     col=1,
     # )
 
-    # # # Add background shading based on signal_1
-    # # for i in range(len(data) - 1):
-    # #     if data["signal_1"].iloc[i] == 1:
-    # #         fig.add_shape(
-    # #             type="rect",
-    # #             x0=data.index[i],
-    # #             x1=data.index[i + 1],
-    # #             y0=0,
-    # #             y1=1,
-    # #             xref="x",
-    # #             yref="paper",
-    # #             fillcolor="LightGreen",
-    # #             opacity=0.5,
-    # #             layer="below",
-    # #             line_width=0,
-    # #         )
-
     # # Add shapes to highlight candles with signal_2
 
     # shapes = []
@@ -204,53 +275,9 @@ def plot_data(data, indices=[]):
     #         }
     #     )
 
-    # # Add background shading based on signal_1
-
-    # in_signal = False
-    # for i in range(len(data)):
-    #     if data["signal_1"].iloc[i] == 1 and not in_signal:
-    #         start_idx = data.index[i]
-    #         in_signal = True
-    #     elif data["signal_1"].iloc[i] == 0 and in_signal:
-    #         end_idx = data.index[i]
-    #         shapes.append(
-    #             {
-    #                 "type": "rect",
-    #                 "x0": start_idx,
-    #                 "x1": end_idx,
-    #                 "y0": 0,
-    #                 "y1": 1,
-    #                 "xref": "x",
-    #                 "yref": "paper",
-    #                 "fillcolor": "LightGreen",
-    #                 "opacity": 0.5,
-    #                 "layer": "below",
-    #                 "line_width": 0,
-    #             }
-    #         )
-    #         in_signal = False
-
-    # # Handle case where the signal extends to the end of the data
-    # if in_signal:
-    #     end_idx = data.index[-1]
-    #     shapes.append(
-    #         {
-    #             "type": "rect",
-    #             "x0": start_idx,
-    #             "x1": end_idx,
-    #             "y0": 0,
-    #             "y1": 1,
-    #             "xref": "x",
-    #             "yref": "paper",
-    #             "fillcolor": "LightGreen",
-    #             "opacity": 0.5,
-    #             "layer": "below",
-    #             "line_width": 0,
-    #         }
-    #     )
-
-    # # Update layout with shapes
-    # fig.update_layout(shapes=shapes)
+    # Add background shading with one shape per run of the signal
+    if shade_signal is not None:
+        fig.update_layout(shapes=signal_shapes(data, shade_signal))
 
     # # Update layout for the figure
     # # Get the last 30 candles
@@ -279,8 +306,7 @@ def plot_data(data, indices=[]):
         # ],  # Set initial y-axis range
         # uirevision="yaxis.range",  # Enable the vertical zoom bar
         yaxis_fixedrange=False,
-        xaxis_range=[datetime(2013, 10, 17),
-                               datetime(2013, 11, 20)]
+        xaxis_range=xaxis_range,
     )
 
     # # Add vertical lines at specified indices
@@ -298,11 +324,16 @@ def plot_data(data, indices=[]):
     return fig
 
 
+def load_earlier_candles():
+    st.session_state["chart_pages"] += 1
+
+
 def main():
     symbol = st.text_input("Ticker Symbol", "AAPL")
-    ticker = yf.Ticker(symbol)
     global company_name
-    company_name = ticker.info["shortName"]
+    company_name = get_data_service().call(
+        ("company_name", symbol.upper()), get_company_name, symbol, get_metadata_cache()
+    )
 
     st.markdown(f"{company_name}")
     st.sidebar.title("Financial Analysis Tool")
@@ -330,23 +361,78 @@ def main():
         "RSI 14 Window", min_value=1, max_value=365, value=14
     )
 
-    # Download data
-    data = download_data(symbol, interval)
-
-    # Remove weekends from the data
-    data.index = pd.to_datetime(data.index)
-    data = data[data.index.weekday < 5]
-    data.reset_index(inplace=True)
-    data.rename(columns={'index': 'Datetime'}, inplace=True)
-
+    # Large histories are downsampled to the chart width and drawn with WebGL
+    fast_rendering = st.sidebar.checkbox("Fast rendering", value=True)
+    chart_width = st.sidebar.number_input(
+        "Chart width (px)", min_value=200, max_value=8000, value=1600
+    )
+    shade_signal = st.sidebar.selectbox(
+        "Shade signal", [None, "signal_1", "signal_2", "signal_3", "long_signal"]
+    )
 
+    # Store flags as int8 and prices as float32 for long histories
+    compact = st.sidebar.checkbox("Compact memory", value=True)
+
+    # Build the last candles from a tick stream, a recorded replay file for now
+    live = st.sidebar.checkbox("Live mode")
+    if live:
+        replay_file = st.sidebar.text_input("Replay file (timestamp,price,size)", "ticks.csv")
+        replay_speed = st.sidebar.number_input("Replay speed", min_value=1.0, value=60.0)
+
+    with st.sidebar.expander("Data Service"):
+        for name, value in get_data_service().stats().items():
+            st.write(f"{name}: {value}")
+
+    # Only the shown candles, one page of candles per "Load earlier candles"
+    # click, and the warm-up bars of the indicators before them are loaded
+    if st.session_state.get("chart_key") != (symbol.upper(), interval):
+        st.session_state["chart_key"] = (symbol.upper(), interval)
+        st.session_state["chart_pages"] = 1
+    shown = candles * st.session_state["chart_pages"]
+    requested = shown + warmup_bars(ema5_window, ema20_window, rsi_window)
+
+    # Download data, download_data already removes the weekends
+    tracer = get_tracer()
+    with tracer.span("download_data", symbol=symbol, interval=interval):
+        data = download_data(symbol, interval, compact=compact, bars=requested)
+    if data.empty:
+        st.warning(f"No {interval} bars found for {symbol}")
+        st.stop()
+    # The first stored bar is loaded: there are no earlier candles and the
+    # indicators are the same as over the full history
+    stored_from = first_bar(symbol, base_interval(interval), drop_weekends=True)
+    history_start = stored_from is None or data["Date"].iloc[0] <= stored_from
 
     # Calculate indicators
-    data = calculate_indicators(data, ema5_window, ema20_window, rsi_window)
-
-    st.dataframe(data)
-
-    data_reduced = data[-candles:-1]
+    with tracer.span("calculate_indicators", symbol=symbol, interval=interval):
+        data = calculate_indicators(
+            data,
+            ema5_window,
+            ema20_window,
+            rsi_window,
+            cache=get_indicator_cache(),
+            key=(symbol, interval),
+            compact=compact,
+        )
+
+    if live and interval not in DAILY_INTERVALS:
+        get_live_feed(
+            symbol,
+            interval,
+            data,
+            replay_file,
+            replay_speed,
+            (ema5_window, ema20_window, rsi_window),
+            candles,
+        )
+        live_chart(fast_rendering, candles)
+        return
+    if live:
+        st.warning("Live mode needs an intraday interval")
+
+    show_table(data)
+
+    data_reduced = data if history_start else data.iloc[-shown:]
     signal_indices = data_reduced[data_reduced["long_signal"] == 1].index
     # signal_indices = data[
 
@@ -354,10 +440,24 @@ def main():
     # ].index
 
     # Plot data
-    fig = plot_data(data_reduced, indices=signal_indices)
+    with tracer.span("plot_data", symbol=symbol, interval=interval):
+        fig = plot_data(
+            data_reduced,
+            indices=signal_indices,
+            max_points=chart_width if fast_rendering else None,
+            webgl=fast_rendering,
+            shade_signal=shade_signal,
+            visible=candles,
+        )
     # fig = plot_data(data)
-    st.plotly_chart(fig, use_container_width=True)  # Use full width of the container
+    with tracer.span("plotly_chart", symbol=symbol, interval=interval):
+        st.plotly_chart(fig, use_container_width=True)  # Use full width of the container
+    if not history_start:
+        st.button(f"Load {candles} earlier candles", on_click=load_earlier_candles)
 
 
 if __name__ == "__main__":
-    main()
+    with get_tracer().span("rerun"):
+        main()
+    show_timings(st.sidebar.expander("Timings"), get_tracer())
+    get_tracer().export()
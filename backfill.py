@@ -0,0 +1,172 @@
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from bar_store import INITIAL_HISTORY_DAYS, fetch_range
+
+# Days of bars yfinance serves per request, intervals that are not listed
+# are served in one request
+MAX_CHUNK_DAYS = {
+    "1m": 7,
+    "2m": 59,
+    "5m": 59,
+    "15m": 59,
+    "30m": 59,
+    "60m": 365,
+    "90m": 59,
+    "1h": 365,
+}
+
+
+def plan_chunks(interval, start, end=None, now=None, chunk_days=None):
+    """
+    Split a date range into the chunks yfinance serves in one request.
+
+    The range is clipped to the history yfinance serves for the interval
+    (INITIAL_HISTORY_DAYS), older intraday bars cannot be downloaded.
+
+    Parameters:
+        interval (str): The bar interval.
+        start (datetime-like): The first day of the range.
+        end (datetime-like): The day after the range, defaults to tomorrow.
+        now (datetime-like): The current time, defaults to now.
+        chunk_days (int): The days per chunk, defaults to the MAX_CHUNK_DAYS
+            entry for the interval.
+
+    Returns:
+        list: (start, end) dates per chunk, end excluded, oldest first.
+    """
+    now = pd.Timestamp(datetime.now() if now is None else now).tz_localize(None).normalize()
+    start = pd.Timestamp(start).tz_localize(None).normalize()
+    end = now + timedelta(days=1) if end is None else pd.Timestamp(end).tz_localize(None).normalize()
+    if interval in INITIAL_HISTORY_DAYS:
+        start = max(start, now - timedelta(days=INITIAL_HISTORY_DAYS[interval]))
+
+    chunk_days = chunk_days or MAX_CHUNK_DAYS.get(interval)
+    if chunk_days is None:
+        return [(start, end)] if start < end else []
+    chunks = []
+    while start < end:
+        chunk_end = min(start + timedelta(days=chunk_days), end)
+        chunks.append((start, chunk_end))
+        start = chunk_end
+    return chunks
+
+
+def _fetch_chunk(fetch, symbol, interval, start, end, max_attempts, backoff_seconds):
+    # One chunk, retried with exponential backoff
+    for attempt in range(1, max_attempts + 1):
+        try:
+            return fetch(symbol, interval, start, end)
+        except Exception:
+            if attempt == max_attempts:
+                raise
+            time.sleep(backoff_seconds * 2 ** (attempt - 1))
+
+
+def merge_chunks(chunks):
+    """
+    Merge downloaded chunks into one frame sorted by timestamp, a bar that is
+    in two chunks is kept once from the later chunk.
+    """
+    chunks = [chunk for chunk in chunks if chunk is not None and not chunk.empty]
+    if not chunks:
+        return pd.DataFrame()
+    data = chunks[0] if len(chunks) == 1 else pd.concat(chunks)
+    duplicated = data.index.duplicated(keep="last")
+    if duplicated.any():
+        data = data[~duplicated]
+    if not data.index.is_monotonic_increasing:
+        data = data.sort_index()
+    return data
+
+
+def backfill(
+    symbol,
+    interval,
+    start,
+    end=None,
+    fetch=fetch_range,
+    max_workers=4,
+    max_attempts=3,
+    backoff_seconds=1.0,
+    chunk_days=None,
+):
+    """
+    Download a date range of bars in chunks that yfinance serves, concurrently.
+
+    Parameters:
+        symbol (str): The ticker symbol.
+        interval (str): The bar interval.
+        start (datetime-like): The first day of the range.
+        end (datetime-like): The day after the range, defaults to tomorrow.
+        fetch (callable): fetch(symbol, interval, start, end) returning the
+            bars of one chunk.
+        max_workers (int): The number of concurrent requests.
+        max_attempts (int): The number of attempts per chunk.
+        backoff_seconds (float): The wait before the second attempt, doubled
+            for every further attempt.
+        chunk_days (int): The days per chunk, see plan_chunks.
+
+    Returns:
+        pd.DataFrame: The bars of all chunks indexed by timestamp, sorted and
+        without duplicates. Raises the error of a chunk that failed all
+        attempts, so no gap is stored.
+    """
+    chunks = plan_chunks(interval, start, end, chunk_days=chunk_days)
+    if len(chunks) <= 1:
+        return merge_chunks(
+            [
+                _fetch_chunk(fetch, symbol, interval, *chunk, max_attempts, backoff_seconds)
+                for chunk in chunks
+            ]
+        )
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="backfill") as executor:
+        futures = [
+            executor.submit(
+                _fetch_chunk, fetch, symbol, interval, *chunk, max_attempts, backoff_seconds
+            )
+            for chunk in chunks
+        ]
+        return merge_chunks([future.result() for future in futures])
+
+
+def main():
+    from bar_store import load_bars
+    from resample import BASE_INTERVALS
+    from scanner import read_watchlist
+
+    parser = argparse.ArgumentParser(
+        description="Backfill the bar store with as much intraday history as yfinance serves"
+    )
+    parser.add_argument("symbols", nargs="*", help="Ticker symbols")
+    parser.add_argument("--watchlist", help="Text file with ticker symbols")
+    # Only the base intervals are stored, the app resamples all others from them
+    parser.add_argument("--interval", default="1m", choices=sorted(set(BASE_INTERVALS.values())))
+    parser.add_argument("--workers", type=int, default=4, help="Symbols backfilled concurrently")
+    args = parser.parse_args()
+
+    symbols = list(args.symbols)
+    if args.watchlist:
+        symbols.extend(read_watchlist(args.watchlist))
+    if not symbols:
+        parser.error("No symbols given")
+
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = {symbol: executor.submit(load_bars, symbol, args.interval) for symbol in symbols}
+        for symbol, future in futures.items():
+            try:
+                data = future.result()
+                if data.empty:
+                    print(f"{symbol}: No data")
+                    continue
+                print(f"{symbol}: {len(data)} bars from {data.index[0]} to {data.index[-1]}")
+            except Exception as e:
+                print(f"{symbol}: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+import argparse
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from bar_store import load_bars
+from core.indicators import calculate_indicators
+from core.sizing import calculate_position_sizes
+
+
+def _next_true(mask):
+    # Index of the next True at or after every position, len(mask) if there is none
+    n = len(mask)
+    positions = np.where(mask, np.arange(n), n)
+    return np.minimum.accumulate(positions[::-1])[::-1]
+
+
+def backtest_long_signal(
+    data,
+    account_balance=100000.0,
+    risk_per_trade_percent=0.5,
+    risked_capital_percent=10.0,
+    stop_lookback=5,
+    max_holding=60,
+):
+    """
+    Backtest the long_signal of calculate_indicators without a per-bar loop.
+
+    A trade is entered at the open of the bar after a new long_signal. The
+    initial stop is the lowest low of the last stop_lookback bars up to the
+    signal bar, and the trade is sized with the rules of
+    calculate_position_size against the starting account balance. The trade
+    is closed at the stop (or the open if it gaps below the stop), at the
+    close of the first bar that closes below EMA_20 (signal_2 == 0), or at the
+    close after max_holding bars, whatever comes first. Only one trade is
+    open at a time.
+
+    Parameters:
+        data (pd.DataFrame): The bars with the columns of calculate_indicators.
+        account_balance (float): The starting account balance.
+        risk_per_trade_percent (float): The percentage of account balance to risk per trade.
+        risked_capital_percent (float): The maximum percentage of account balance to allocate to a trade.
+        stop_lookback (int): The number of bars for the initial stop.
+        max_holding (int): The maximum number of bars a trade is held.
+
+    Returns:
+        dict: The "trades" as a DataFrame, the "equity" curve as a Series with
+        one value per bar and the "stats" (trades, win rate, expectancy in
+        dollars and R multiples, total return and maximum drawdown).
+    """
+    n = len(data)
+    opens = data["Open"].to_numpy(dtype=np.float64)
+    lows = data["Low"].to_numpy(dtype=np.float64)
+    closes = data["Close"].to_numpy(dtype=np.float64)
+    long_signal = data["long_signal"].to_numpy() == 1
+    exit_signal = data["signal_2"].to_numpy() == 0
+
+    # Enter at the open of the bar after the first bar of every long_signal run
+    new_signal = long_signal & ~np.concatenate(([False], long_signal[:-1]))
+    signal_bars = np.flatnonzero(new_signal[:-1])
+    signal_bars = signal_bars[signal_bars >= stop_lookback - 1]
+    entry_bars = signal_bars + 1
+
+    lowest_lows = pd.Series(lows).rolling(stop_lookback).min().to_numpy()
+    entry_prices = opens[entry_bars]
+    stops = lowest_lows[signal_bars]
+
+    # First bar from the entry on where the low touches the stop, within max_holding bars
+    padded_lows = np.concatenate((lows, np.full(max_holding, np.inf)))
+    windows = sliding_window_view(padded_lows, max_holding)[entry_bars]
+    stop_hit = windows <= stops[:, None]
+    stop_bars = np.where(stop_hit.any(axis=1), entry_bars + stop_hit.argmax(axis=1), n)
+
+    # First close below EMA_20 after the entry, or the end of the holding period
+    signal_exit_bars = _next_true(exit_signal)[entry_bars]
+    time_exit_bars = np.minimum(entry_bars + max_holding - 1, n - 1)
+    exit_bars = np.minimum(np.minimum(stop_bars, signal_exit_bars), time_exit_bars)
+    stopped = stop_bars == exit_bars
+    exit_prices = np.where(
+        stopped, np.minimum(opens[np.minimum(exit_bars, n - 1)], stops), closes[exit_bars]
+    )
+
+    quantities, invalid = calculate_position_sizes(
+        entry_prices, stops, account_balance, risk_per_trade_percent, risked_capital_percent
+    )
+    valid = ~invalid & (stops < entry_prices) & (quantities > 0)
+
+    # Only one trade at a time: skip the entries while a trade is open.
+    # This loops over the trades, not over the bars.
+    candidates = np.flatnonzero(valid)
+    candidate_entry_bars = entry_bars[candidates]
+    taken = []
+    position = 0
+    while position < len(candidates):
+        trade = candidates[position]
+        taken.append(trade)
+        position = np.searchsorted(candidate_entry_bars, exit_bars[trade], side="right")
+    taken = np.array(taken, dtype=np.int64)
+
+    trades = pd.DataFrame(
+        {
+            "entry_bar": entry_bars[taken],
+            "exit_bar": exit_bars[taken],
+            "entry_price": entry_prices[taken],
+            "stop": stops[taken],
+            "exit_price": exit_prices[taken],
+            "quantity": quantities[taken],
+            "stopped": stopped[taken],
+        }
+    )
+    trades["pnl"] = trades["quantity"] * (trades["exit_price"] - trades["entry_price"])
+    trades["r_multiple"] = (trades["exit_price"] - trades["entry_price"]) / (
+        trades["entry_price"] - trades["stop"]
+    )
+    if "Date" in data:
+        trades["entry_date"] = data["Date"].to_numpy()[trades["entry_bar"]]
+        trades["exit_date"] = data["Date"].to_numpy()[trades["exit_bar"]]
+
+    # Realized equity curve and drawdown
+    pnl_per_bar = np.bincount(trades["exit_bar"], weights=trades["pnl"], minlength=n)
+    equity = account_balance + np.cumsum(pnl_per_bar)
+    drawdown = equity / np.maximum.accumulate(equity) - 1
+    equity = pd.Series(equity, index=data.index, name="equity")
+
+    stats = {
+        "trades": len(trades),
+        "win_rate": float((trades["pnl"] > 0).mean()) if len(trades) else np.nan,
+        "expectancy": float(trades["pnl"].mean()) if len(trades) else np.nan,
+        "expectancy_r": float(trades["r_multiple"].mean()) if len(trades) else np.nan,
+        "total_return": float(equity.iloc[-1] / account_balance - 1) if n else 0.0,
+        "max_drawdown": float(drawdown.min()) if n else 0.0,
+    }
+    return {"trades": trades, "equity": equity, "stats": stats}
+
+
+def _backtest_symbol_grid(symbol, data, parameter_grid, backtest_kwargs):
+    rows = []
+    for ema5_window, ema20_window, rsi_window in parameter_grid:
+        indicators = calculate_indicators(
+            data.copy(), ema5_window, ema20_window, rsi_window, backend="auto"
+        )
+        stats = backtest_long_signal(indicators, **backtest_kwargs)["stats"]
+        rows.append(
+            {
+                "symbol": symbol,
+                "ema5_window": ema5_window,
+                "ema20_window": ema20_window,
+                "rsi_window": rsi_window,
+                **stats,
+            }
+        )
+    return rows
+
+
+def run_grid(
+    bars_by_symbol,
+    ema5_windows=(5,),
+    ema20_windows=(20,),
+    rsi_windows=(14,),
+    max_workers=None,
+    **backtest_kwargs,
+):
+    """
+    Backtest every combination of the indicator windows for every symbol in
+    parallel worker processes.
+
+    Each worker process receives the bars of one symbol and runs the whole
+    parameter grid on them, so the bars are only sent to a worker once.
+
+    Parameters:
+        bars_by_symbol (dict): The bars per ticker symbol, e.g. from load_bars.
+        ema5_windows (list): The windows of the fast EMA.
+        ema20_windows (list): The windows of the slow EMA.
+        rsi_windows (list): The windows of the RSI.
+        max_workers (int): The number of worker processes, defaults to the
+            number of CPUs.
+        **backtest_kwargs: Passed on to backtest_long_signal.
+
+    Returns:
+        pd.DataFrame: The stats of every symbol and parameter combination.
+    """
+    parameter_grid = list(itertools.product(ema5_windows, ema20_windows, rsi_windows))
+    symbols = list(bars_by_symbol)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(
+            _backtest_symbol_grid,
+            symbols,
+            [bars_by_symbol[symbol] for symbol in symbols],
+            itertools.repeat(parameter_grid),
+            itertools.repeat(backtest_kwargs),
+        )
+        rows = [row for symbol_rows in results for row in symbol_rows]
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest the long signal over a parameter grid")
+    parser.add_argument("symbols", nargs="+", help="Ticker symbols to backtest")
+    parser.add_argument("--interval", default="1d")
+    parser.add_argument("--ema5-windows", type=int, nargs="+", default=[5])
+    parser.add_argument("--ema20-windows", type=int, nargs="+", default=[20])
+    parser.add_argument("--rsi-windows", type=int, nargs="+", default=[14])
+    parser.add_argument("--account-balance", type=float, default=100000.0)
+    parser.add_argument("--risk-per-trade-percent", type=float, default=0.5)
+    parser.add_argument("--risked-capital-percent", type=float, default=10.0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--output", help="Write the results to this CSV file")
+    args = parser.parse_args()
+
+    bars_by_symbol = {}
+    for symbol in args.symbols:
+        data = load_bars(symbol, args.interval)
+        bars_by_symbol[symbol] = data[data.index.weekday < 5].reset_index()
+
+    results = run_grid(
+        bars_by_symbol,
+        args.ema5_windows,
+        args.ema20_windows,
+        args.rsi_windows,
+        max_workers=args.workers,
+        account_balance=args.account_balance,
+        risk_per_trade_percent=args.risk_per_trade_percent,
+        risked_capital_percent=args.risked_capital_percent,
+    )
+    if args.output:
+        results.to_csv(args.output, index=False)
+    print(results.sort_values("expectancy_r", ascending=False).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
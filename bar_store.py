@@ -0,0 +1,562 @@
+import os
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from data_service import upstream_slot
+
+# Root directory of the local bar store, partitioned as
+# <root>/symbol=<SYMBOL>/interval=<INTERVAL>/part-<first bar epoch>.parquet
+BAR_STORE_DIR = os.getenv("BAR_STORE_DIR", os.path.join("data", "bars"))
+
+# Touched in a partition when a download returned no new bars, so the
+# refresh period also applies to symbols without any bars
+CHECKED_FILE = ".checked"
+
+# Compact a partition into a single file once it holds this many part files
+MAX_PARTS = 20
+
+# Minimum number of seconds between two tail updates of the same partition
+REFRESH_SECONDS = {
+    "1m": 30,
+    "2m": 60,
+    "5m": 60,
+    "15m": 120,
+    "30m": 300,
+    "60m": 300,
+    "90m": 300,
+    "1h": 300,
+    "1d": 900,
+}
+DEFAULT_REFRESH_SECONDS = 3600
+
+DAILY_INTERVALS = ("1d", "5d", "1wk", "1mo", "3mo")
+
+# Columns that compact_bars stores as float32, float32 resolves a cent below
+# FLOAT32_MAX_PRICE, columns with higher prices stay float64
+PRICE_COLUMNS = ["Open", "High", "Low", "Close", "Adj Close"]
+FLOAT32_MAX_PRICE = 2.0**16
+
+# Rows per row group of the part files, a compact read only holds one row
+# group at full width
+ROW_GROUP_ROWS = 65536
+
+
+def partition_path(symbol, interval, root=None):
+    """
+    Return the directory holding the bars of one symbol and interval.
+
+    Parameters:
+        symbol (str): The ticker symbol.
+        interval (str): The bar interval, e.g. "1d" or "1h".
+        root (str): The store root directory, defaults to BAR_STORE_DIR.
+
+    Returns:
+        str: The partition directory.
+    """
+    root = BAR_STORE_DIR if root is None else root
+    return os.path.join(root, f"symbol={symbol.upper()}", f"interval={interval}")
+
+
+def _part_files(path):
+    if not os.path.isdir(path):
+        return []
+    return sorted(
+        os.path.join(path, name)
+        for name in os.listdir(path)
+        if name.startswith("part-") and name.endswith(".parquet")
+    )
+
+
+def _normalize(data):
+    # yfinance returns (field, ticker) MultiIndex columns in newer versions
+    if isinstance(data.columns, pd.MultiIndex):
+        data = data.droplevel(-1, axis=1)
+    data.columns.name = None
+    data.index = pd.to_datetime(data.index)
+    return data
+
+
+def _empty_bars(compact=False):
+    # No bars stored, the columns and the index type are the same as with bars
+    price_dtype, volume_dtype = ("float32", "int32") if compact else ("float64", "int64")
+    data = pd.DataFrame(
+        {column: pd.Series(dtype=price_dtype) for column in PRICE_COLUMNS},
+        index=pd.DatetimeIndex([], name="Date"),
+    )
+    data["Volume"] = pd.Series(dtype=volume_dtype)
+    return data
+
+
+def _compact_column(column, values):
+    # float32 prices and int32 volume where the values fit
+    if column in PRICE_COLUMNS and values.dtype == np.float64:
+        high = max(np.nanmax(values, initial=-np.inf), -np.nanmin(values, initial=np.inf))
+        if high < FLOAT32_MAX_PRICE:
+            return values.astype(np.float32)
+    elif column == "Volume" and values.dtype == np.int64:
+        if len(values) == 0 or values.max() <= np.iinfo(np.int32).max:
+            return values.astype(np.int32)
+    return values
+
+
+def compact_bars(data):
+    """
+    Store the prices of the bars as float32 and the volume as int32 where the
+    values allow it, to halve the memory of a long history.
+
+    The columns are replaced one at a time, so at most one column exists twice
+    at any time.
+
+    Parameters:
+        data (pd.DataFrame): The bars, modified in place.
+
+    Returns:
+        pd.DataFrame: data with the compact columns.
+    """
+    for column in data.columns:
+        values = data[column].to_numpy()
+        compacted = _compact_column(column, values)
+        if compacted is not values:
+            data[column] = compacted
+    return data
+
+
+def _compact_dtype(column, parquet):
+    # The compact dtype of a column from the min and max statistics of its row
+    # groups, None if a statistic is missing or the column has nulls
+    field = parquet.schema_arrow.field(column)
+    dtype = np.dtype(field.type.to_pandas_dtype())
+    if column not in PRICE_COLUMNS and column != "Volume":
+        return dtype
+    low, high = np.inf, -np.inf
+    metadata = parquet.metadata
+    for i in range(metadata.num_row_groups):
+        row_group = metadata.row_group(i)
+        for j in range(row_group.num_columns):
+            chunk = row_group.column(j)
+            if chunk.path_in_schema != column:
+                continue
+            statistics = chunk.statistics
+            if statistics is None or not statistics.has_min_max or statistics.null_count:
+                return None
+            low, high = min(low, statistics.min), max(high, statistics.max)
+    if column in PRICE_COLUMNS and dtype == np.float64:
+        if max(high, -low) < FLOAT32_MAX_PRICE:
+            return np.dtype(np.float32)
+    elif column == "Volume" and dtype == np.int64:
+        if high <= np.iinfo(np.int32).max:
+            return np.dtype(np.int32)
+    return dtype
+
+
+def _without_weekends(data):
+    # Only copy the bars if there is a weekend bar
+    weekend = data.index.weekday >= 5
+    return data[~weekend] if weekend.any() else data
+
+
+def _read_part(file, compact=False, filters=None, drop_weekends=False):
+    # filters are pushed down to parquet, only the matching rows are converted
+    if not compact or filters is not None:
+        data = pd.read_parquet(file, filters=filters)
+        if drop_weekends:
+            data = _without_weekends(data)
+        # Windows are small, they are compacted after the read
+        return compact_bars(data) if compact else data
+
+    # Read the bars one row group at a time into arrays of the compact dtypes,
+    # chosen from the column statistics, so the full width float64 bars are
+    # never held in memory. Weekend bars are dropped row group by row group.
+    parquet = pq.ParquetFile(file)
+    index_columns = set(parquet.schema_arrow.pandas_metadata["index_columns"])
+    columns = [column for column in parquet.schema_arrow.names if column not in index_columns]
+    # The index first, to know the number of bars that are kept
+    indexes = []
+    keeps = []
+    for i in range(parquet.num_row_groups):
+        index = parquet.read_row_group(i, columns=[], use_pandas_metadata=True).to_pandas().index
+        keep = index.weekday < 5 if drop_weekends else None
+        if keep is not None and keep.all():
+            keep = None
+        indexes.append(index if keep is None else index[keep])
+        keeps.append(keep)
+    if not indexes:
+        return pd.read_parquet(file).pipe(compact_bars)
+    index = indexes[0].append(indexes[1:]) if len(indexes) > 1 else indexes[0]
+    del indexes
+
+    dtypes = {column: _compact_dtype(column, parquet) for column in columns}
+    streamed = [column for column in columns if dtypes[column] is not None]
+    values = {column: np.empty(len(index), dtypes[column]) for column in streamed}
+    offset = 0
+    for i, keep in enumerate(keeps if streamed else []):
+        kept = parquet.metadata.row_group(i).num_rows if keep is None else int(keep.sum())
+        # One column chunk at a time, the decoded row group is larger than the bars
+        for column in streamed:
+            column_values = parquet.read_row_group(i, columns=[column]).column(column).to_numpy()
+            if keep is not None:
+                column_values = column_values[keep]
+            values[column][offset : offset + kept] = column_values
+        offset += kept
+
+    data = pd.DataFrame(index=index)
+    for column in columns:
+        if column in values:
+            data[column] = values.pop(column)
+        else:
+            # No statistics, read and compact the whole column
+            column_values = pq.read_table(file, columns=[column]).column(column).to_numpy()
+            if any(keep is not None for keep in keeps):
+                column_values = column_values[np.concatenate([
+                    np.ones(parquet.metadata.row_group(i).num_rows, bool) if keep is None else keep
+                    for i, keep in enumerate(keeps)
+                ])]
+            data[column] = _compact_column(column, column_values)
+    return data
+
+
+def _merge_parts(parts):
+    data = parts[0] if len(parts) == 1 else pd.concat(parts)
+    # A tail update re-fetches the last stored bar, the newer copy wins.
+    # Only copy the bars if there is anything to drop or sort.
+    duplicated = data.index.duplicated(keep="last")
+    if duplicated.any():
+        data = data[~duplicated]
+    if not data.index.is_monotonic_increasing:
+        data = data.sort_index()
+    return data
+
+
+def read_bars(symbol, interval, start=None, end=None, root=None, compact=False, drop_weekends=False):
+    """
+    Read the stored bars of one symbol and interval.
+
+    Parameters:
+        symbol (str): The ticker symbol.
+        interval (str): The bar interval.
+        start (datetime-like): Only return bars at or after this timestamp.
+        end (datetime-like): Only return bars at or before this timestamp.
+        root (str): The store root directory, defaults to BAR_STORE_DIR.
+        compact (bool): Return the bars as compact_bars does.
+        drop_weekends (bool): Leave out the bars on Saturdays and Sundays.
+
+    Returns:
+        pd.DataFrame: The bars indexed by timestamp, without rows if nothing
+        is stored.
+    """
+    files = _part_files(partition_path(symbol, interval, root))
+    if not files:
+        return _empty_bars(compact)
+
+    data = _merge_parts([_read_part(file, compact, drop_weekends=drop_weekends) for file in files])
+
+    if start is not None:
+        data = data[data.index >= _as_index_timestamp(start, data.index)]
+    if end is not None:
+        data = data[data.index <= _as_index_timestamp(end, data.index)]
+    return data
+
+
+def read_window(symbol, interval, bars, end=None, root=None, compact=False, drop_weekends=False):
+    """
+    Read the last stored bars of one symbol and interval.
+
+    Only the timestamps of the part files are read in full, the prices are
+    read for the bars of the window only. The time to read a window grows
+    with bars, not with the stored history.
+
+    Parameters:
+        symbol (str): The ticker symbol.
+        interval (str): The bar interval.
+        bars (int): The number of bars.
+        end (datetime-like): Only return bars before this timestamp, e.g. the
+            first bar of a window that is already loaded.
+        root (str): The store root directory, defaults to BAR_STORE_DIR.
+        compact (bool): Return the bars as compact_bars does.
+        drop_weekends (bool): Leave out the bars on Saturdays and Sundays,
+            they do not count towards bars.
+
+    Returns:
+        pd.DataFrame: The bars indexed by timestamp, fewer than bars if the
+        history starts within the window, empty if nothing is stored.
+    """
+    files = _part_files(partition_path(symbol, interval, root))
+    if not files or bars <= 0:
+        return _empty_bars(compact)
+
+    indexes = {file: _normalize(pd.read_parquet(file, columns=[])).index for file in files}
+    index = indexes[files[0]].append([indexes[file] for file in files[1:]]).unique().sort_values()
+    if drop_weekends:
+        index = index[index.weekday < 5]
+    if end is not None:
+        index = index[index < _as_index_timestamp(end, index)]
+    if index.empty:
+        return _empty_bars(compact)
+    first, last = index[-bars:][[0, -1]]
+
+    parts = []
+    for file in files:
+        # Part files without a bar in the window are not read at all
+        if ((indexes[file] >= first) & (indexes[file] <= last)).any():
+            column = pq.read_schema(file).pandas_metadata["index_columns"][0]
+            filters = [(column, ">=", first), (column, "<=", last)]
+            parts.append(_read_part(file, compact, filters, drop_weekends))
+    return _merge_parts(parts)
+
+
+def _as_index_timestamp(value, index):
+    value = pd.Timestamp(value)
+    if index.tz is not None and value.tz is None:
+        value = value.tz_localize(index.tz)
+    elif index.tz is None and value.tz is not None:
+        value = value.tz_localize(None)
+    return value
+
+
+def append_bars(symbol, interval, data, root=None):
+    """
+    Append bars to the store as a new part file.
+
+    Bars that overlap with already stored timestamps replace the stored ones
+    when the partition is read. The partition is compacted into a single file
+    once it holds more than MAX_PARTS part files.
+
+    Parameters:
+        symbol (str): The ticker symbol.
+        interval (str): The bar interval.
+        data (pd.DataFrame): The bars indexed by timestamp.
+        root (str): The store root directory, defaults to BAR_STORE_DIR.
+    """
+    if data.empty:
+        return
+    path = partition_path(symbol, interval, root)
+    os.makedirs(path, exist_ok=True)
+
+    data = _normalize(data.copy()).sort_index()
+    first_bar = int(data.index[0].timestamp())
+    file = os.path.join(path, f"part-{first_bar:012d}-{time.time_ns()}.parquet")
+    data.to_parquet(file, row_group_size=ROW_GROUP_ROWS)
+
+    if len(_part_files(path)) > MAX_PARTS:
+        compact(symbol, interval, root)
+
+
+def compact(symbol, interval, root=None):
+    """
+    Rewrite all part files of a partition into a single file.
+
+    Parameters:
+        symbol (str): The ticker symbol.
+        interval (str): The bar interval.
+        root (str): The store root directory, defaults to BAR_STORE_DIR.
+    """
+    path = partition_path(symbol, interval, root)
+    files = _part_files(path)
+    if len(files) < 2:
+        return
+    data = read_bars(symbol, interval, root=root)
+    first_bar = int(data.index[0].timestamp())
+    compacted = os.path.join(path, f"part-{first_bar:012d}-{time.time_ns()}.parquet")
+    data.to_parquet(compacted, row_group_size=ROW_GROUP_ROWS)
+    for file in files:
+        os.remove(file)
+
+
+def _mark_checked(path):
+    # Records a download without new bars, also when nothing is stored yet
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, CHECKED_FILE), "a"):
+        pass
+    os.utime(os.path.join(path, CHECKED_FILE))
+
+
+def last_update(symbol, interval, root=None):
+    """
+    Return the time of the last write to a partition or of the last download
+    without new bars as a UNIX timestamp, or None if neither happened.
+    """
+    path = partition_path(symbol, interval, root)
+    files = _part_files(path)
+    checked = os.path.join(path, CHECKED_FILE)
+    if os.path.exists(checked):
+        files.append(checked)
+    if not files:
+        return None
+    return max(os.path.getmtime(file) for file in files)
+
+
+def first_bar(symbol, interval, root=None, drop_weekends=False):
+    """
+    Return the timestamp of the first stored bar, or None if nothing is stored.
+
+    Part files are sorted, only their first row groups are read.
+
+    Parameters:
+        symbol (str): The ticker symbol.
+        interval (str): The bar interval.
+        root (str): The store root directory, defaults to BAR_STORE_DIR.
+        drop_weekends (bool): Skip the bars on Saturdays and Sundays.
+    """
+    first = None
+    for file in _part_files(partition_path(symbol, interval, root)):
+        parquet = pq.ParquetFile(file)
+        for i in range(parquet.num_row_groups):
+            index = parquet.read_row_group(i, columns=[], use_pandas_metadata=True).to_pandas().index
+            index = pd.to_datetime(index)
+            if drop_weekends:
+                index = index[index.weekday < 5]
+            if not index.empty:
+                first = index[0] if first is None else min(first, index[0])
+                break
+    return first
+
+
+# Days of intraday history yfinance serves per interval, the initial history
+# is downloaded in chunks by backfill
+INITIAL_HISTORY_DAYS = {
+    "1m": 29,
+    "2m": 59,
+    "5m": 59,
+    "15m": 59,
+    "30m": 59,
+    "60m": 728,
+    "90m": 59,
+    "1h": 728,
+}
+
+
+def fetch_range(symbol, interval, start=None, end=None):
+    """
+    Download bars from yfinance in one request.
+
+    Parameters:
+        symbol (str): The ticker symbol.
+        interval (str): The bar interval.
+        start (datetime-like): The first day, the full history if None.
+        end (datetime-like): The day after the last bar, up to now if None.
+
+    Returns:
+        pd.DataFrame: The downloaded bars indexed by timestamp.
+    """
+    kwargs = dict(interval=interval, auto_adjust=False, actions=False)
+    if start is None:
+        kwargs["period"] = "max"
+    else:
+        kwargs["start"] = pd.Timestamp(start).strftime("%Y-%m-%d")
+    if end is not None:
+        kwargs["end"] = pd.Timestamp(end).strftime("%Y-%m-%d")
+
+    # Imported on the first download, reading the store does not need it
+    import yfinance as yf
+
+    # Ticker.history keeps its state per ticker object, unlike yf.download which
+    # shares module level state and is not safe to call from several threads
+    with upstream_slot():
+        data = yf.Ticker(symbol).history(**kwargs)
+    if data is None or data.empty:
+        return _empty_bars()
+    data = _normalize(data)
+    if interval in DAILY_INTERVALS and data.index.tz is not None:
+        # Daily bars are stored without time zone, like yf.download returns them
+        data.index = data.index.tz_localize(None)
+    return data
+
+
+def fetch_bars(symbol, interval, start=None):
+    """
+    Download bars from yfinance.
+
+    Without a start date the initial history is downloaded: the full history
+    for daily bars and as much as yfinance serves (INITIAL_HISTORY_DAYS) for
+    intraday bars. Intraday ranges are downloaded concurrently in the chunks
+    yfinance serves per request, see backfill.
+
+    Parameters:
+        symbol (str): The ticker symbol.
+        interval (str): The bar interval.
+        start (datetime-like): Download bars starting at this timestamp.
+
+    Returns:
+        pd.DataFrame: The downloaded bars indexed by timestamp.
+    """
+    if interval not in INITIAL_HISTORY_DAYS:
+        return fetch_range(symbol, interval, start)
+    if start is None:
+        start = datetime.now() - timedelta(days=INITIAL_HISTORY_DAYS[interval])
+
+    # Imported here, backfill downloads with fetch_range of this module
+    from backfill import backfill
+
+    return backfill(symbol, interval, start)
+
+
+def load_bars(
+    symbol,
+    interval,
+    fetch=fetch_bars,
+    root=None,
+    refresh_seconds=None,
+    compact=False,
+    bars=None,
+    drop_weekends=False,
+):
+    """
+    Return the bars of one symbol and interval, updating the store first.
+
+    On the first call the initial history is downloaded and stored. Later
+    calls only download the bars after the last stored timestamp and append
+    them, and no download happens at all if the partition was updated, or a
+    download returned no bars, less than refresh_seconds ago.
+
+    Parameters:
+        symbol (str): The ticker symbol.
+        interval (str): The bar interval.
+        fetch (callable): fetch(symbol, interval, start) returning new bars.
+        root (str): The store root directory, defaults to BAR_STORE_DIR.
+        refresh_seconds (float): Minimum age of the partition before a tail
+            update, defaults to the REFRESH_SECONDS entry for the interval.
+        compact (bool): Return the bars as compact_bars does.
+        bars (int): Only return the last bars stored bars, see read_window.
+        drop_weekends (bool): Leave out the bars on Saturdays and Sundays.
+
+    Returns:
+        pd.DataFrame: All stored bars indexed by timestamp.
+    """
+    if refresh_seconds is None:
+        refresh_seconds = REFRESH_SECONDS.get(interval, DEFAULT_REFRESH_SECONDS)
+
+    path = partition_path(symbol, interval, root)
+    updated = last_update(symbol, interval, root)
+    files = _part_files(path)
+    if updated is None or time.time() - updated >= refresh_seconds:
+        if not files:
+            history = fetch(symbol, interval, None)
+            if history.empty:
+                # Not downloaded again on every rerun until the refresh period passed
+                _mark_checked(path)
+            else:
+                append_bars(symbol, interval, history, root)
+        else:
+            # Only the index of the part files is read to find the last stored bar
+            last_bar = max(_normalize(pd.read_parquet(file, columns=[])).index.max() for file in files)
+            # Re-fetch the last stored bar as well, it may have been incomplete
+            new_bars = fetch(symbol, interval, last_bar)
+            if not new_bars.empty:
+                new_bars = new_bars[
+                    new_bars.index >= _as_index_timestamp(last_bar, new_bars.index)
+                ]
+            if new_bars.empty:
+                # Nothing new upstream, mark the partition as freshly checked
+                _mark_checked(path)
+            else:
+                append_bars(symbol, interval, new_bars, root)
+
+    if bars is not None:
+        return read_window(
+            symbol, interval, bars, root=root, compact=compact, drop_weekends=drop_weekends
+        )
+    return read_bars(symbol, interval, root=root, compact=compact, drop_weekends=drop_weekends)
@@ -0,0 +1,239 @@
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date as date_type, datetime
+
+import pandas as pd
+from dotenv import load_dotenv
+
+from core.payloads import build_new_page_data, build_order, notion_headers
+from core.sizing import calculate_position_sizes
+from metadata_cache import MetadataCache
+from notion_journal import NotionJournalWriter
+from ticker_lookup import lookup_tickers
+
+# Defaults of the optional candidate columns, like the inputs of trading_plan.py
+CANDIDATE_DEFAULTS = {
+    "plan": "",
+    "reason": "",
+    "plan_b": "",
+    "order_type": "STP/STP LMT",
+    "validity": "DAY",
+    "dividends": 0.0,
+    "date": None,
+}
+
+
+def read_candidates(path):
+    """
+    Read trade candidates from a CSV file or a JSON list of objects.
+
+    Every candidate needs a ticker, an entry and a stop. The plan, reason,
+    plan_b, order_type, validity, dividends and date are optional, see
+    CANDIDATE_DEFAULTS.
+
+    Returns:
+        pd.DataFrame: One row per candidate.
+    """
+    if path.endswith(".json"):
+        with open(path) as file:
+            candidates = pd.DataFrame(json.load(file))
+    else:
+        candidates = pd.read_csv(path, dtype={"ticker": str}, keep_default_na=False)
+
+    missing = {"ticker", "entry", "stop"} - set(candidates.columns)
+    if missing:
+        raise ValueError(f"Candidates are missing the columns: {', '.join(sorted(missing))}")
+    for column, default in CANDIDATE_DEFAULTS.items():
+        if column not in candidates:
+            candidates[column] = default
+    candidates["ticker"] = candidates["ticker"].str.strip().str.upper()
+    candidates["entry"] = pd.to_numeric(candidates["entry"], errors="coerce").round(2)
+    candidates["stop"] = pd.to_numeric(candidates["stop"], errors="coerce").round(2)
+    return candidates.reset_index(drop=True)
+
+
+def _trade_date(value):
+    if value is None or value == "" or pd.isna(value):
+        return date_type.today()
+    return pd.Timestamp(value).date()
+
+
+def plan_trades(
+    candidates,
+    cache,
+    account_balance=100000.0,
+    risk_per_trade_percent=0.5,
+    risked_capital_percent=10.0,
+    price_offset=0.02,
+    database_id=None,
+    max_workers=16,
+    lookup_timeout=60.0,
+):
+    """
+    Plan a batch of trades without the Streamlit UI.
+
+    The company names, earnings dates and ex-dividend dates of all tickers are
+    looked up concurrently while all trades are sized in one vectorized pass.
+    Then the Notion journal entry and the TWS order of every trade are built
+    the same way trading_plan.py builds them.
+
+    Parameters:
+        candidates (pd.DataFrame): The candidates, see read_candidates.
+        cache (MetadataCache): The metadata cache used by the lookups.
+        account_balance (float): The total account balance.
+        risk_per_trade_percent (float): The percentage of account balance to risk per trade.
+        risked_capital_percent (float): The maximum percentage of account balance to allocate to a trade.
+        price_offset (float): The offset of the limit price from the entry price.
+        database_id (str): The Notion database of the journal.
+        max_workers (int): The number of concurrent lookups.
+        lookup_timeout (float): Seconds to wait for all lookups.
+
+    Returns:
+        list: One plan per candidate with the ticker, company name, action,
+        quantity, the lookup and sizing errors and the "journal" and "order"
+        payloads. The payloads are None if the trade cannot be sized.
+    """
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        lookups = executor.submit(
+            lookup_tickers, candidates["ticker"].tolist(), cache, max_workers, lookup_timeout
+        )
+        # Size the trades while the lookups are running
+        quantities, invalid = calculate_position_sizes(
+            candidates["entry"],
+            candidates["stop"],
+            account_balance,
+            risk_per_trade_percent,
+            risked_capital_percent,
+        )
+        lookups = lookups.result()
+
+    plans = []
+    for candidate, quantity, invalid_size in zip(
+        candidates.to_dict("records"), quantities.tolist(), invalid.tolist()
+    ):
+        ticker_symbol = candidate["ticker"]
+        entry_price, initial_stop = candidate["entry"], candidate["stop"]
+        results, errors = lookups[ticker_symbol]
+        errors = dict(errors)
+        company_name = results["company_name"]
+        earnings_date, earnings_date_confirmed = results["earnings_date"]
+        pays_dividends, dividends_date, _ = results["ex_dividend_date"]
+
+        action = "Long" if initial_stop < entry_price else "Short"
+        plan = {
+            "ticker": ticker_symbol,
+            "company_name": company_name,
+            "action": action,
+            "quantity": quantity,
+            "errors": errors,
+            "journal": None,
+            "order": None,
+        }
+        plans.append(plan)
+        if invalid_size or quantity == 0:
+            errors["quantity"] = "Invalid entry or stop, the trade cannot be sized"
+            continue
+
+        plan["journal"] = build_new_page_data(
+            database_id,
+            ticker_symbol,
+            action,
+            _trade_date(candidate["date"]),
+            quantity,
+            entry_price,
+            initial_stop,
+            candidate["validity"],
+            candidate["order_type"],
+            earnings_date,
+            bool(earnings_date_confirmed),
+            float(candidate["dividends"] or 0.0),
+            company_name,
+            candidate["plan"],
+            candidate["reason"],
+            candidate["plan_b"],
+            dividends_date=dividends_date if pays_dividends else None,
+        )
+
+        plan["order"] = build_order(
+            ticker_symbol, quantity, entry_price, initial_stop, price_offset, candidate["validity"]
+        )
+    return plans
+
+
+def _json_default(value):
+    # Dates and NumPy scalars in the plans
+    if isinstance(value, (date_type, datetime)):
+        return value.isoformat()
+    if hasattr(value, "item"):
+        return value.item()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Plan a batch of trades without the Streamlit UI")
+    parser.add_argument("candidates", help="CSV or JSON file with ticker, entry, stop and plan")
+    parser.add_argument("--account-balance", type=float, default=100000.0)
+    parser.add_argument("--risk-per-trade-percent", type=float, default=0.5)
+    parser.add_argument("--risked-capital-percent", type=float, default=10.0)
+    parser.add_argument("--price-offset", type=float, default=0.02)
+    parser.add_argument("--workers", type=int, default=16, help="Concurrent lookups")
+    parser.add_argument("--lookup-timeout", type=float, default=60.0)
+    parser.add_argument("--output", help="Write the plans to this JSON file instead of stdout")
+    parser.add_argument("--enqueue", action="store_true", help="Queue the journal entries for Notion")
+    parser.add_argument("--submit", action="store_true", help="Create the orders in TWS, without transmitting them")
+    parser.add_argument("--port", type=int, default=7497, help="The TWS port for --submit")
+    args = parser.parse_args()
+
+    plans = plan_trades(
+        read_candidates(args.candidates),
+        MetadataCache(),
+        account_balance=args.account_balance,
+        risk_per_trade_percent=args.risk_per_trade_percent,
+        risked_capital_percent=args.risked_capital_percent,
+        price_offset=args.price_offset,
+        database_id=os.getenv("NOTION_DB_ID"),
+        max_workers=args.workers,
+        lookup_timeout=args.lookup_timeout,
+    )
+
+    if args.enqueue:
+        writer = NotionJournalWriter(notion_headers(os.getenv("NOTION_API_KEY"))).start()
+        for plan in plans:
+            if plan["journal"] is not None:
+                plan["journal_entry_id"] = writer.enqueue(plan["journal"])
+        if not writer.flush(timeout=60):
+            print(f"{writer.pending()} journal entries are still queued", file=sys.stderr)
+        writer.stop()
+
+    if args.submit:
+        from broker_session import BrokerSession
+
+        session = BrokerSession(port=args.port)
+        orders = [plan for plan in plans if plan["order"] is not None]
+        # Qualify all contracts concurrently before the first order is placed
+        for plan in orders:
+            session.warm(plan["ticker"])
+        for plan in orders:
+            try:
+                plan["order_result"] = session.place_stop_limit_with_stop_loss(**plan["order"])
+            except Exception as e:
+                plan["errors"]["order"] = str(e)
+        session.close()
+
+    output = json.dumps(plans, indent=2, default=_json_default)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output)
+    else:
+        print(output)
+    for plan in plans:
+        for field, error in plan["errors"].items():
+            print(f"{plan['ticker']}: {field}: {error}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
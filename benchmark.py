@@ -0,0 +1,320 @@
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+BASELINE_PATH = "benchmark_baseline.json"
+
+# Relative slowdown or memory growth against the baseline that counts as a regression
+DEFAULT_TOLERANCE = 0.25
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+FULL_SIZES = DEFAULT_SIZES + [10_000_000]
+
+
+def make_ohlcv(rows, seed=0, freq="min"):
+    """
+    Create synthetic OHLCV bars with the columns of yfinance.
+
+    Parameters:
+        rows (int): The number of bars.
+        seed (int): The random seed.
+        freq (str): The bar frequency of the DatetimeIndex.
+
+    Returns:
+        pd.DataFrame: The bars indexed by timestamp.
+    """
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.001, rows)))
+    open_ = close * np.exp(rng.normal(0, 0.0005, rows))
+    index = pd.date_range("2000-01-03", periods=rows, freq=freq, name="Date")
+    return pd.DataFrame(
+        {
+            "Open": open_,
+            "High": np.maximum(open_, close) * (1 + rng.uniform(0, 0.001, rows)),
+            "Low": np.minimum(open_, close) * (1 - rng.uniform(0, 0.001, rows)),
+            "Close": close,
+            "Adj Close": close,
+            "Volume": rng.integers(100, 10_000, rows),
+        },
+        index=index,
+    )
+
+
+def load_fixture(path, rows):
+    """
+    Load recorded bars from a CSV or Parquet file and repeat them up to rows bars.
+    """
+    if path.endswith(".parquet"):
+        data = pd.read_parquet(path)
+    else:
+        data = pd.read_csv(path, index_col=0, parse_dates=True)
+    repeats = -(-rows // len(data))
+    data = pd.concat([data] * repeats).iloc[:rows]
+    data.index = pd.date_range(data.index[0], periods=rows, freq="min", name="Date")
+    return data
+
+
+def measure(function, repeat=3):
+    """
+    Run function repeatedly and return the best wall time in seconds and the
+    peak memory allocated by one run in MB.
+
+    The peak counts the allocations traced by tracemalloc and the Arrow
+    buffers of Parquet reads, which tracemalloc does not see. Both are
+    sampled together every millisecond.
+    """
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+
+    gc.collect()
+    arrow_base = pa.total_allocated_bytes()
+    sampled = 0
+    done = threading.Event()
+
+    def sample():
+        nonlocal sampled
+        while not done.is_set():
+            current = tracemalloc.get_traced_memory()[0] + pa.total_allocated_bytes() - arrow_base
+            sampled = max(sampled, current)
+            done.wait(0.001)
+
+    tracemalloc.start()
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    try:
+        function()
+    finally:
+        done.set()
+        sampler.join()
+        _, traced = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return min(timings), max(sampled, traced) / 1024 / 1024
+
+
+def benchmark_cases(sizes, store, fixture=None):
+    """
+    Yield (name, rows, prepare) for every benchmarked hot path.
+
+    prepare builds the inputs of the benchmark and returns the function that
+    is measured, so only the inputs of the selected benchmarks are built.
+    store is the directory of the bar store the download benchmarks read.
+    """
+    from core.indicators import calculate_indicators, numba_available, warmup_bars
+    from core.sizing import calculate_position_size, calculate_position_sizes
+
+    def bars(rows):
+        return make_ohlcv(rows) if fixture is None else load_fixture(fixture, rows)
+
+    def indicators(rows, **kwargs):
+        def prepare():
+            data = bars(rows).reset_index()
+            return lambda: calculate_indicators(data.copy(), 5, 20, 14, **kwargs)
+
+        return prepare
+
+    for rows in sizes:
+        yield f"calculate_indicators[{rows}]", rows, indicators(rows)
+        yield f"calculate_indicators_compact[{rows}]", rows, indicators(rows, compact=True)
+        # Without numba the fused pass runs in plain Python, too slow to benchmark
+        if numba_available():
+            yield f"calculate_indicators_fused[{rows}]", rows, indicators(rows, backend="fused")
+
+    def plot(rows, **kwargs):
+        def prepare():
+            # The app module sets up the Streamlit page when imported, which
+            # is a no-op outside of streamlit run
+            import app
+
+            app.company_name = "Benchmark"
+            data = calculate_indicators(bars(rows).reset_index(), 5, 20, 14)
+            # Serialize the figure as well, like st.plotly_chart does for the browser
+            return lambda: app.plot_data(data, **kwargs).to_json()
+
+        return prepare
+
+    for rows in sizes:
+        if rows > 1_000_000:
+            continue
+        yield f"plot_data[{rows}]", rows, plot(rows)
+        yield f"plot_data_fast[{rows}]", rows, plot(
+            rows, max_points=1600, webgl=True, shade_signal="signal_1"
+        )
+
+    # download_data reading from a local bar store, without network access
+    import bar_store
+
+    stored = set()
+
+    def download(symbol, rows, compact=False, with_indicators=False, window=None):
+        def prepare():
+            import app
+
+            # The bars of one size are stored once for all download benchmarks
+            if rows not in stored:
+                data = bars(rows)
+                bar_store.append_bars(f"BENCH{rows}", "1m", data, root=store)
+                # The synthetic bars run through the weekends, which download_data drops
+                bar_store.append_bars(f"CHART{rows}", "1m", data[data.index.weekday < 5], root=store)
+                stored.add(rows)
+
+            def load_bars(symbol, interval, compact=False, bars=None, drop_weekends=False):
+                if bars is not None:
+                    return bar_store.read_window(
+                        symbol, interval, bars, root=store, compact=compact, drop_weekends=drop_weekends
+                    )
+                return bar_store.read_bars(
+                    symbol, interval, root=store, compact=compact, drop_weekends=drop_weekends
+                )
+
+            def run():
+                original = app.load_bars
+                app.load_bars = load_bars
+                try:
+                    data = app.download_data(symbol, "1m", compact=compact, bars=window)
+                finally:
+                    app.load_bars = original
+                if with_indicators:
+                    data = calculate_indicators(data, 5, 20, 14, compact=compact)
+                return data
+
+            return run
+
+        return prepare
+
+    for rows in sizes:
+        symbol = f"BENCH{rows}"
+        yield f"download_data[{rows}]", rows, download(symbol, rows)
+        yield f"download_data_compact[{rows}]", rows, download(symbol, rows, compact=True)
+        # Everything the app holds per symbol: the bars with the indicators
+        yield f"symbol_frame[{rows}]", rows, download(symbol, rows, with_indicators=True)
+        yield f"symbol_frame_compact[{rows}]", rows, download(
+            symbol, rows, compact=True, with_indicators=True
+        )
+        # The default chart: 300 candles and the warm-up bars of the indicators
+        yield f"chart_window[{rows}]", rows, download(
+            f"CHART{rows}", rows, with_indicators=True, window=300 + warmup_bars(5, 20, 14)
+        )
+
+    def sizing(rows, vectorized):
+        def prepare():
+            rng = np.random.default_rng(0)
+            entry_price = rng.uniform(1, 500, rows).round(2)
+            stop_loss = (entry_price * rng.uniform(0.8, 0.99, rows)).round(2)
+            if vectorized:
+                return lambda: calculate_position_sizes(entry_price, stop_loss, 100000.0)
+            entry_list, stop_list = entry_price.tolist(), stop_loss.tolist()
+            return lambda: [
+                calculate_position_size(entry, stop, 100000.0) for entry, stop in zip(entry_list, stop_list)
+            ]
+
+        return prepare
+
+    for rows in (1_000, 100_000):
+        yield f"calculate_position_size[{rows}]", rows, sizing(rows, vectorized=False)
+        yield f"calculate_position_sizes[{rows}]", rows, sizing(rows, vectorized=True)
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, fixture=None, repeat=3, only=None):
+    """
+    Run the benchmarks and return their results.
+
+    The bar store of the download benchmarks is a temporary directory that
+    is removed afterwards.
+
+    Returns:
+        dict: {name: {"seconds": float, "rows_per_second": float, "peak_mb": float}}
+    """
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="benchmark_bars_") as store:
+        for name, rows, prepare in benchmark_cases(sizes, store, fixture):
+            if only and not any(pattern in name for pattern in only):
+                continue
+            seconds, peak_mb = measure(prepare(), repeat)
+            results[name] = {
+                "seconds": seconds,
+                "rows_per_second": rows / seconds if seconds > 0 else float("inf"),
+                "peak_mb": peak_mb,
+            }
+    return results
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compare results with a baseline.
+
+    Returns:
+        list: One message per benchmark that is slower or needs more memory
+        than the baseline plus the tolerance.
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        for metric in ("seconds", "peak_mb"):
+            before, after = baseline[name][metric], result[metric]
+            if after > before * (1 + tolerance):
+                regressions.append(
+                    f"{name}: {metric} {before:.4g} -> {after:.4g} (+{(after / before - 1) * 100:.0f}%)"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the data, indicator, plotting and sizing hot paths")
+    parser.add_argument("--full", action="store_true", help="Include 10M rows")
+    parser.add_argument("--sizes", type=int, nargs="+", help="Row counts to benchmark")
+    parser.add_argument("--fixture", help="CSV or Parquet file with recorded bars")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", nargs="+", help="Only run benchmarks containing these names")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    sizes = args.sizes or (FULL_SIZES if args.full else DEFAULT_SIZES)
+    results = run_benchmarks(sizes, args.fixture, args.repeat, args.only)
+
+    print(f"{'benchmark':45} {'seconds':>10} {'rows/s':>14} {'peak MB':>10}")
+    for name, result in results.items():
+        print(
+            f"{name:45} {result['seconds']:10.4f} {result['rows_per_second']:14,.0f} {result['peak_mb']:10.1f}"
+        )
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as file:
+                baseline = json.load(file)
+        baseline.update(results)
+        with open(args.baseline, "w") as file:
+            json.dump(baseline, file, indent=2, sort_keys=True)
+        print(f"Baseline saved to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, run with --save-baseline to create one")
+        return
+    with open(args.baseline) as file:
+        regressions = compare(results, json.load(file), args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+import asyncio
+import itertools
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+def _default_ib_factory():
+    from ib_async import IB
+
+    return IB()
+
+
+class BrokerSession:
+    """
+    Long-lived session with TWS/IB Gateway for order submission.
+
+    The session keeps a pool of TWS connections open on a background event
+    loop and caches the qualified contracts per symbol, so placing an order
+    does not pay for connection setup and contract resolution. Contracts can
+    be qualified ahead of time with warm, e.g. as soon as a ticker is typed.
+    The time from placing an order until TWS acknowledges it is recorded per
+    order.
+
+    Parameters:
+        host (str): The TWS/IB Gateway host.
+        port (int): The TWS/IB Gateway port, 7497 for paper trading.
+        client_ids (tuple): One client id per pooled connection.
+        timeout (float): Seconds to wait for a connection, a contract or an
+            order acknowledgement.
+        ib_factory (callable): Creates the client of one connection, defaults
+            to ib_async.IB.
+    """
+
+    def __init__(self, host="127.0.0.1", port=7497, client_ids=(11, 12), timeout=5.0, ib_factory=None):
+        self.host = host
+        self.port = port
+        self.client_ids = tuple(client_ids)
+        self.timeout = timeout
+        self.ib_factory = ib_factory or _default_ib_factory
+        self.latencies = deque(maxlen=1000)
+
+        self._connections = [None] * len(self.client_ids)
+        self._next_connection = itertools.cycle(range(len(self.client_ids)))
+        self._connecting = {}
+        self._contracts = {}
+        self._lock = threading.Lock()
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="broker_session", daemon=True
+        )
+        self._thread.start()
+
+    def _submit(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    def _run(self, coroutine):
+        return self._submit(coroutine).result(self.timeout * 3)
+
+    async def _connection(self, slot=None):
+        # Return a connected client of the pool, reconnect it if needed
+        slot = next(self._next_connection) if slot is None else slot
+        ib = self._connections[slot]
+        if ib is not None and ib.isConnected():
+            return ib
+
+        # Concurrent callers wait for the same connection attempt
+        task = self._connecting.get(slot)
+        if task is None or task.done():
+            task = self._connecting[slot] = asyncio.ensure_future(self._connect(slot))
+        return await asyncio.shield(task)
+
+    async def _connect(self, slot):
+        ib = self.ib_factory()
+        await ib.connectAsync(
+            self.host, self.port, clientId=self.client_ids[slot], timeout=self.timeout
+        )
+        self._connections[slot] = ib
+        return ib
+
+    def connect(self):
+        """Open all pooled connections, raises if TWS cannot be reached."""
+        async def connect_all():
+            await asyncio.gather(*(self._connection(slot) for slot in range(len(self.client_ids))))
+
+        self._run(connect_all())
+
+    async def _qualify(self, symbol):
+        from ib_async import Stock
+
+        ib = await self._connection()
+        contracts = await asyncio.wait_for(
+            ib.qualifyContractsAsync(Stock(symbol, "SMART", "USD")), self.timeout
+        )
+        contracts = [contract for contract in contracts if contract is not None]
+        if not contracts:
+            raise ValueError(f"Unknown contract: {symbol}")
+        return contracts[0]
+
+    def warm(self, symbol):
+        """
+        Start qualifying the contract of a symbol in the background and return
+        immediately. Connects to TWS first if needed.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the qualified contract.
+        """
+        symbol = symbol.strip().upper()
+        with self._lock:
+            future = self._contracts.get(symbol)
+            if future is None or (future.done() and future.exception() is not None):
+                # Qualify again if there is no cached contract or the last attempt failed
+                future = self._submit(self._qualify(symbol))
+                self._contracts[symbol] = future
+        return future
+
+    def contract(self, symbol):
+        """Return the qualified contract of a symbol, from the cache if possible."""
+        return self.warm(symbol).result(self.timeout * 2)
+
+    async def _place(self, ib, contract, orders):
+        # All orders are placed before any acknowledgement is awaited, TWS
+        # may not acknowledge a parent order before its children are placed
+        acknowledged = {order.orderId: asyncio.Event() for order in orders}
+
+        def on_open_order(trade):
+            if trade.order.orderId in acknowledged:
+                acknowledged[trade.order.orderId].set()
+
+        async def acknowledgement(event, start):
+            await event.wait()
+            return time.perf_counter() - start
+
+        ib.openOrderEvent += on_open_order
+        try:
+            trades = []
+            starts = []
+            for order in orders:
+                event = acknowledged[order.orderId]
+                start = time.perf_counter()
+                try:
+                    trade = ib.placeOrder(contract, order)
+                except Exception:
+                    # Never leave a parent order behind without its stop loss
+                    for placed in trades:
+                        ib.cancelOrder(placed.order)
+                    raise
+                trade.statusEvent += lambda trade, event=event: event.set()
+                trades.append(trade)
+                starts.append(start)
+            waits = [
+                acknowledgement(acknowledged[order.orderId], start) for order, start in zip(orders, starts)
+            ]
+            try:
+                latencies = await asyncio.wait_for(asyncio.gather(*waits), self.timeout)
+            except asyncio.TimeoutError:
+                # The orders exist in TWS, only their acknowledgement is missing
+                return trades, None
+        finally:
+            ib.openOrderEvent -= on_open_order
+        for latency in latencies:
+            self._record_latency(latency)
+        return trades, latencies
+
+    def _record_latency(self, latency):
+        # Recorded on the event loop thread, read by latency_stats in the app
+        with self._lock:
+            self.latencies.append(latency)
+
+    async def _place_stop_limit_with_stop_loss(
+        self, symbol, action, quantity, stop_price, limit_price, stop_loss_price, tif, transmit
+    ):
+        from ib_async import StopLimitOrder, StopOrder
+
+        contract = await asyncio.wrap_future(self.warm(symbol))
+        ib = await self._connection()
+
+        parent = StopLimitOrder(
+            action,
+            quantity,
+            limit_price,
+            stop_price,
+            orderId=ib.client.getReqId(),
+            tif=tif,
+            transmit=False,
+        )
+        stop_loss = StopOrder(
+            "SELL" if action == "BUY" else "BUY",
+            quantity,
+            stop_loss_price,
+            orderId=ib.client.getReqId(),
+            parentId=parent.orderId,
+            tif=tif,
+            transmit=transmit,
+        )
+
+        (parent_trade, _), latencies = await self._place(ib, contract, [parent, stop_loss])
+        return {
+            "parent_order_id": parent.orderId,
+            "stop_loss_order_id": stop_loss.orderId,
+            "status": parent_trade.orderStatus.status,
+            "acknowledged": latencies is not None,
+            "latency_ms": None if latencies is None else round(max(latencies) * 1000, 1),
+        }
+
+    def place_stop_limit_with_stop_loss(
+        self,
+        symbol,
+        action,
+        quantity,
+        stop_price,
+        limit_price,
+        stop_loss_price,
+        tif="DAY",
+        transmit=False,
+    ):
+        """
+        Place a stop limit entry order with an attached stop loss order.
+
+        Parameters:
+            symbol (str): The ticker symbol of the US stock.
+            action (str): "BUY" or "SELL" for the entry order.
+            quantity (int): The number of shares.
+            stop_price (float): The stop price of the entry order.
+            limit_price (float): The limit price of the entry order.
+            stop_loss_price (float): The stop price of the stop loss order.
+            tif (str): The time in force of both orders.
+            transmit (bool): Transmit the orders, otherwise they are only
+                created in TWS and have to be transmitted there.
+
+        Both orders are placed before their acknowledgements are awaited. If
+        the stop loss order cannot be placed, the entry order is cancelled.
+
+        Returns:
+            dict: The order ids and the status of the entry order. Whether
+            TWS "acknowledged" both orders within the timeout and the submit
+            to acknowledge latency of both orders in milliseconds, None if
+            they were placed but not acknowledged in time.
+        """
+        return self._run(
+            self._place_stop_limit_with_stop_loss(
+                symbol.strip().upper(),
+                action,
+                quantity,
+                stop_price,
+                limit_price,
+                stop_loss_price,
+                tif,
+                transmit,
+            )
+        )
+
+    def latency_stats(self):
+        """
+        Return the number of recorded orders and their median, 95th percentile
+        and maximum submit to acknowledge latency in milliseconds.
+        """
+        # A copy taken under the lock, the deque must not change while it is read
+        with self._lock:
+            latencies = list(self.latencies)
+        if not latencies:
+            return {"orders": 0}
+        latencies = np.array(latencies) * 1000
+        return {
+            "orders": len(latencies),
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p95_ms": float(np.percentile(latencies, 95)),
+            "max_ms": float(latencies.max()),
+        }
+
+    def close(self):
+        """Disconnect all connections and stop the event loop."""
+        async def disconnect_all():
+            for ib in self._connections:
+                if ib is not None and ib.isConnected():
+                    ib.disconnect()
+
+        try:
+            self._run(disconnect_all())
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(self.timeout)
@@ -0,0 +1,39 @@
+"""
+Import-light core of the trading tools: position sizing, indicators and the
+Notion and TWS payloads.
+
+Importing core or one of its modules does not import streamlit, yfinance,
+talib, pandas or any other heavy dependency, they are imported by the
+functions that need them. The names below are loaded on first access, e.g.
+core.calculate_position_size imports core.sizing.
+"""
+import importlib
+
+# Seconds that importing all core modules may take in a fresh interpreter,
+# enforced by test_core.py
+IMPORT_BUDGET_SECONDS = 0.2
+
+_EXPORTS = {
+    "calculate_position_size": "sizing",
+    "calculate_position_sizes": "sizing",
+    "cap_position_size": "sizing",
+    "IncrementalIndicators": "indicators",
+    "IndicatorCache": "indicators",
+    "calculate_indicators": "indicators",
+    "data_fingerprint": "indicators",
+    "warmup_bars": "indicators",
+    "build_new_page_data": "payloads",
+    "build_order": "payloads",
+    "notion_headers": "payloads",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module = importlib.import_module(f"{__name__}.{_EXPORTS[name]}")
+    value = getattr(module, name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,596 @@
+import hashlib
+import importlib.util
+import math
+import threading
+from collections import OrderedDict, deque
+
+# numpy, pandas and talib are imported where they are used, so importing
+# this module (e.g. in a worker process or a test) stays cheap
+
+
+# dtype of the signal columns in the compact frame mode
+FLAG_DTYPE = "int8"
+
+# Backends of calculate_indicators, "auto" uses the fused kernel if numba is installed
+BACKENDS = ("talib", "fused", "auto")
+
+# Columns of the fused kernel, in the order of its outputs
+FUSED_FLOAT_COLUMNS = ["EMA_5", "EMA_20", "RSI_14", "SMA_RSI_14"]
+FUSED_FLAG_COLUMNS = [
+    "point_pos_signal_2",
+    "signal_3",
+    "signal_1",
+    "point_pos_signal_1",
+    "signal_2",
+    "long_signal",
+]
+
+
+# Windows of history that the indicators are calculated over before the first
+# shown bar. The seeds of the EMAs and the RSI decay exponentially, after five
+# windows the RSI still differed by up to 0.7%, after ten by less than 1e-5.
+WARMUP_WINDOWS = 10
+
+
+def warmup_bars(ema5_window, ema20_window, rsi_window, sma_rsi_window=14):
+    """
+    Return the number of bars to calculate the indicators over before the
+    first shown bar.
+
+    The EMAs, the RSI and its SMA of the first shown bar are then within a
+    relative 1e-5 of the indicators over the full history, not equal to them.
+    A signal can still differ where the RSI and its SMA are that close.
+    """
+    return WARMUP_WINDOWS * max(ema5_window, ema20_window, rsi_window) + sma_rsi_window
+
+
+def data_fingerprint(data):
+    """
+    Return a fingerprint of the bars the indicators are calculated from.
+
+    The fingerprint covers the index and the "Close" and "Adj Close" columns,
+    so it changes whenever a bar is added or corrected.
+    """
+    import numpy as np
+    import pandas as pd
+
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(len(data)).encode())
+    digest.update(pd.util.hash_array(data.index.to_numpy()).tobytes())
+    for column in ("Close", "Adj Close"):
+        digest.update(np.ascontiguousarray(data[column].to_numpy(dtype=np.float64)).tobytes())
+    return digest.hexdigest()
+
+
+class IndicatorCache:
+    """
+    Bounded least recently used cache for indicator columns.
+
+    Entries are keyed by the symbol, interval and fingerprint of the bars and
+    the indicator with its window, so changing one window only recalculates
+    the columns that depend on it. The least recently used columns are
+    evicted once the cached arrays exceed max_bytes.
+
+    Parameters:
+        max_bytes (int): The maximum size of the cached arrays in bytes.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute):
+        """
+        Return the cached columns for key, or compute, cache and return them.
+
+        Parameters:
+            key (tuple): The cache key.
+            compute (callable): Returns a tuple of NumPy arrays.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        columns = compute()
+        nbytes = sum(column.nbytes for column in columns)
+        with self._lock:
+            if key not in self._entries and nbytes <= self.max_bytes:
+                self._entries[key] = columns
+                self.nbytes += nbytes
+                while self.nbytes > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self.nbytes -= sum(column.nbytes for column in evicted)
+        return columns
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _fused_pass(
+    close, adj_close, ema5_window, ema20_window, rsi_window, sma_rsi_window, floats, flags
+):
+    # One pass over the bars that writes the indicators into floats and the
+    # signals into flags, in the order of FUSED_FLOAT_COLUMNS and
+    # FUSED_FLAG_COLUMNS. Written for numba.njit, it also runs on plain lists.
+    # The operations follow the C code of talib and the rolling mean of pandas.
+    # Builds of talib that contract multiply-adds into FMA instructions round
+    # the EMA and RSI differently in the last bit, so the indicators match the
+    # talib backend to about 1e-12 and the signals except for exact ties.
+    n = len(close)
+    nan = math.nan
+    alpha5 = 2.0 / (ema5_window + 1)
+    alpha20 = 2.0 / (ema20_window + 1)
+    ema5 = nan
+    ema20 = nan
+    total5 = 0.0
+    total20 = 0.0
+    average_gain = 0.0
+    average_loss = 0.0
+    rsi = nan
+    # State of the rolling mean of the RSI, see below
+    count = 0
+    rsi_total = 0.0
+    add_compensation = 0.0
+    remove_compensation = 0.0
+    same_values = 0
+    last_rsi = nan
+    previous_adj_close = nan
+    previous_ema5 = nan
+    previous_ema20 = nan
+    previous_rsi = nan
+    previous_sma_rsi = nan
+    for i in range(n):
+        price = close[i]
+
+        # EMAs seeded with the SMA of the first window closes
+        if i < ema5_window:
+            total5 += price
+            if i == ema5_window - 1:
+                ema5 = total5 / ema5_window
+        else:
+            ema5 += alpha5 * (price - ema5)
+        if i < ema20_window:
+            total20 += price
+            if i == ema20_window - 1:
+                ema20 = total20 / ema20_window
+        else:
+            ema20 += alpha20 * (price - ema20)
+
+        # Wilder RSI seeded with the mean gain and loss of the first window changes
+        if i > 0:
+            change = price - close[i - 1]
+            gain = change if change > 0 else 0.0
+            loss = -change if change < 0 else 0.0
+            if i < rsi_window:
+                average_gain += gain
+                average_loss += loss
+            else:
+                if i == rsi_window:
+                    average_gain = (average_gain + gain) / rsi_window
+                    average_loss = (average_loss + loss) / rsi_window
+                else:
+                    average_gain = (average_gain * (rsi_window - 1) + gain) / rsi_window
+                    average_loss = (average_loss * (rsi_window - 1) + loss) / rsi_window
+                total = average_gain + average_loss
+                rsi = 100.0 * (average_gain / total) if total != 0.0 else 0.0
+        floats[2][i] = rsi
+
+        # Rolling mean of the RSI with the compensated sums of pandas, so
+        # SMA_RSI_14 matches Series.rolling(...).mean() to the last bit
+        if i >= sma_rsi_window:
+            removed = floats[2][i - sma_rsi_window]
+            if removed == removed:
+                count -= 1
+                y = -removed - remove_compensation
+                t = rsi_total + y
+                remove_compensation = t - rsi_total - y
+                rsi_total = t
+        if rsi == rsi:
+            count += 1
+            y = rsi - add_compensation
+            t = rsi_total + y
+            add_compensation = t - rsi_total - y
+            rsi_total = t
+            same_values = same_values + 1 if rsi == last_rsi else 1
+            last_rsi = rsi
+        sma_rsi = nan
+        if count >= sma_rsi_window:
+            if same_values >= count:
+                sma_rsi = last_rsi
+            else:
+                sma_rsi = rsi_total / count
+                if sma_rsi < 0:
+                    sma_rsi = 0.0
+
+        floats[0][i] = ema5
+        floats[1][i] = ema20
+        floats[3][i] = sma_rsi
+
+        # Comparisons with NaN are false, like the pandas signals
+        adj = adj_close[i]
+        signal_1 = 1 if rsi >= sma_rsi else 0
+        signal_2 = 1 if adj >= ema20 else 0
+        signal_3 = 1 if previous_ema5 < previous_ema20 and ema5 >= ema20 else 0
+        flags[0][i] = 1 if previous_adj_close < previous_ema20 and signal_2 == 1 else 0
+        flags[1][i] = signal_3
+        flags[2][i] = signal_1
+        flags[3][i] = 1 if previous_rsi < previous_sma_rsi and signal_1 == 1 else 0
+        flags[4][i] = signal_2
+        flags[5][i] = 1 if signal_1 + signal_2 + signal_3 == 3 else 0
+
+        previous_adj_close = adj
+        previous_ema5 = ema5
+        previous_ema20 = ema20
+        previous_rsi = rsi
+        previous_sma_rsi = sma_rsi
+
+
+_compiled = {}
+
+
+def numba_available():
+    """Return whether numba is installed, without importing it."""
+    return importlib.util.find_spec("numba") is not None
+
+
+def _numba_pass():
+    # Compiled on first use, importing numba takes longer than the import budget of core
+    if "pass" not in _compiled:
+        import numba
+
+        _compiled["pass"] = numba.njit(cache=True, nogil=True)(_fused_pass)
+    return _compiled["pass"]
+
+
+def fused_indicators(
+    close, adj_close, ema5_window=5, ema20_window=20, rsi_window=14, sma_rsi_window=14, use_numba=None
+):
+    """
+    Calculate the indicators and signals of calculate_indicators in a single pass.
+
+    With numba the pass is compiled and runs over contiguous float64 arrays
+    without any temporary arrays. Without numba the same pass runs in plain
+    Python, which is correct but slower than the talib backend.
+
+    Parameters:
+        close (array-like): The closes.
+        adj_close (array-like): The adjusted closes.
+        ema5_window (int): The window of the fast EMA.
+        ema20_window (int): The window of the slow EMA.
+        rsi_window (int): The window of the RSI.
+        sma_rsi_window (int): The window of the SMA of the RSI.
+        use_numba (bool): Compile the pass with numba, defaults to whether
+            numba is installed.
+
+    Returns:
+        tuple: A float64 array of shape (4, n) with the FUSED_FLOAT_COLUMNS
+        and an int8 array of shape (6, n) with the FUSED_FLAG_COLUMNS.
+    """
+    import numpy as np
+
+    close = np.ascontiguousarray(close, dtype=np.float64)
+    adj_close = np.ascontiguousarray(adj_close, dtype=np.float64)
+    windows = (int(ema5_window), int(ema20_window), int(rsi_window), int(sma_rsi_window))
+    if use_numba is None:
+        use_numba = numba_available()
+
+    if use_numba:
+        floats = np.empty((len(FUSED_FLOAT_COLUMNS), len(close)), dtype=np.float64)
+        flags = np.empty((len(FUSED_FLAG_COLUMNS), len(close)), dtype=np.int8)
+        _numba_pass()(close, adj_close, *windows, floats, flags)
+        return floats, flags
+
+    # Python floats and lists are much faster than NumPy scalars in a loop
+    floats = [[math.nan] * len(close) for _ in FUSED_FLOAT_COLUMNS]
+    flags = [[0] * len(close) for _ in FUSED_FLAG_COLUMNS]
+    _fused_pass(close.tolist(), adj_close.tolist(), *windows, floats, flags)
+    return np.array(floats, dtype=np.float64), np.array(flags, dtype=np.int8)
+
+
+def calculate_indicators(
+    data, ema5_window, ema20_window, rsi_window, cache=None, key=None, compact=False, backend="talib"
+):
+    """
+    Calculate the indicator and signal columns of the bars in data.
+
+    With a cache, every indicator column is looked up by the key (e.g. the
+    symbol and interval), a fingerprint of the bars and its own window, so
+    only the columns whose window changed are recalculated.
+
+    In compact mode the bars are compacted with compact_bars, the indicator
+    columns get the dtype of the "Close" column and the signal columns are
+    int8. The indicators are still calculated in float64, but the signals
+    compare the stored float32 values, so a signal can differ from the
+    float64 mode when two values agree to the 7th digit.
+
+    Parameters:
+        data (pd.DataFrame): The bars with "Close" and "Adj Close" columns.
+        ema5_window (int): The window of the fast EMA.
+        ema20_window (int): The window of the slow EMA.
+        rsi_window (int): The window of the RSI.
+        cache (IndicatorCache): The cache for the indicator columns.
+        key (tuple): Identifies the bars in the cache, e.g. (symbol, interval).
+        compact (bool): Use the compact frame mode.
+        backend (str): "talib" calculates every column with talib and pandas,
+            "fused" all columns in one pass of fused_indicators and "auto"
+            uses "fused" if numba is installed. The fused signals compare the
+            float64 indicators, also in compact mode.
+
+    Returns:
+        pd.DataFrame: data with the indicator and signal columns added.
+    """
+    import numpy as np
+    import pandas as pd
+
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}, use one of {', '.join(BACKENDS)}")
+    if backend == "auto":
+        backend = "fused" if numba_available() else "talib"
+
+    if compact:
+        from bar_store import compact_bars
+
+        compact_bars(data)
+        float_dtype = data["Close"].dtype
+        flag_dtype = FLAG_DTYPE
+    else:
+        float_dtype = np.float64
+        flag_dtype = int
+
+    if cache is None:
+        def cached(name, compute):
+            return compute()
+    else:
+        prefix = (key, data_fingerprint(data), compact)
+
+        def cached(name, compute):
+            return cache.get_or_compute(prefix + name, compute)
+
+    if backend == "fused":
+        def fused():
+            floats, flags = fused_indicators(
+                data["Close"].to_numpy(), data["Adj Close"].to_numpy(), ema5_window, ema20_window, rsi_window
+            )
+            return tuple(floats.astype(float_dtype)) + tuple(flags.astype(flag_dtype))
+
+        columns = cached(("FUSED", ema5_window, ema20_window, rsi_window), fused)
+        for column, values in zip(FUSED_FLOAT_COLUMNS + FUSED_FLAG_COLUMNS, columns):
+            data[column] = values
+        return data
+
+    import talib
+
+    # talib only accepts float64 input, arrays avoid the copies of its pandas wrapper
+    close = data["Close"].to_numpy(dtype=np.float64)
+    adj_close = data["Adj Close"]
+
+    def ema(window):
+        return (talib.EMA(close, timeperiod=window).astype(float_dtype, copy=False),)
+
+    def rsi():
+        rsi_14 = pd.Series(talib.RSI(close, timeperiod=rsi_window), index=data.index)
+        sma_rsi_14 = rsi_14.rolling(window=14).mean().to_numpy(dtype=float_dtype)
+        return rsi_14.to_numpy(dtype=float_dtype), sma_rsi_14
+
+    (data["EMA_5"],) = cached(("EMA", ema5_window), lambda: ema(ema5_window))
+    (data["EMA_20"],) = cached(("EMA", ema20_window), lambda: ema(ema20_window))
+    data["RSI_14"], data["SMA_RSI_14"] = cached(("RSI", rsi_window), rsi)
+    # The float64 closes are not needed for the signals
+    del close
+
+    def ema_signals():
+        # data["signal_3"] = ((data["EMA_5"] >= data["EMA_20"])).astype(int)
+        point_pos_signal_2 = ((adj_close.shift(1) < data["EMA_20"].shift(1)) & (adj_close >= data["EMA_20"])).astype(flag_dtype)
+        signal_3 = ((data["EMA_5"].shift(1) < data["EMA_20"].shift(1)) & (data["EMA_5"] >= data["EMA_20"])).astype(flag_dtype)
+        signal_2 = ((adj_close >= data["EMA_20"])).astype(flag_dtype)
+        return point_pos_signal_2.to_numpy(), signal_3.to_numpy(), signal_2.to_numpy()
+
+    def rsi_signals():
+        # data["signal_1"] = ((data["RSI_14"].shift(1) < data["SMA_RSI_14"].shift(1)) & (data["RSI_14"] >= data["SMA_RSI_14"])).astype(int)
+        signal_1 = ((data["RSI_14"] >= data["SMA_RSI_14"])).astype(flag_dtype)
+        point_pos_signal_1 = (
+            (data["RSI_14"].shift(1) < data["SMA_RSI_14"].shift(1))
+            & (data["RSI_14"] >= data["SMA_RSI_14"])
+        ).astype(flag_dtype)
+        # data["point_pos_signal_1"] = data.apply(lambda x: point_pos(x, "signal_1"), axis=1)
+        return signal_1.to_numpy(), point_pos_signal_1.to_numpy()
+
+    data["point_pos_signal_2"], data["signal_3"], signal_2 = cached(
+        ("EMA_SIGNALS", ema5_window, ema20_window), ema_signals
+    )
+    data["signal_1"], data["point_pos_signal_1"] = cached(("RSI_SIGNALS", rsi_window), rsi_signals)
+    data["signal_2"] = signal_2
+    # data["stop_price"] =
+    data["long_signal"] = ((data["signal_1"] + data["signal_2"] + data["signal_3"]) == 3).astype(flag_dtype)
+    # data.reset_index(drop=False, inplace=True)
+    return data
+
+
+class _EMA:
+    # Exponential moving average seeded with the SMA of the first window values, like talib.EMA
+    def __init__(self, window):
+        self.window = window
+        self.alpha = 2.0 / (window + 1)
+        self.count = 0
+        self.total = 0.0
+        self.value = math.nan
+
+    def update(self, price):
+        self.count += 1
+        if self.count <= self.window:
+            self.total += price
+            if self.count == self.window:
+                self.value = self.total / self.window
+        else:
+            self.value += self.alpha * (price - self.value)
+        return self.value
+
+
+class _RSI:
+    # Wilder RSI seeded with the mean gain/loss of the first window changes, like talib.RSI
+    def __init__(self, window):
+        self.window = window
+        self.count = 0
+        self.previous = None
+        self.average_gain = 0.0
+        self.average_loss = 0.0
+        self.value = math.nan
+
+    def update(self, price):
+        if self.previous is None:
+            self.previous = price
+            return self.value
+        change = price - self.previous
+        self.previous = price
+        gain = change if change > 0 else 0.0
+        loss = -change if change < 0 else 0.0
+
+        self.count += 1
+        if self.count < self.window:
+            self.average_gain += gain
+            self.average_loss += loss
+            return self.value
+        if self.count == self.window:
+            self.average_gain = (self.average_gain + gain) / self.window
+            self.average_loss = (self.average_loss + loss) / self.window
+        else:
+            self.average_gain = (self.average_gain * (self.window - 1) + gain) / self.window
+            self.average_loss = (self.average_loss * (self.window - 1) + loss) / self.window
+
+        total = self.average_gain + self.average_loss
+        self.value = 100.0 * self.average_gain / total if total != 0 else 0.0
+        return self.value
+
+
+class _SMA:
+    # Rolling mean over a ring buffer, NaN until window consecutive valid values, like Series.rolling
+    def __init__(self, window):
+        self.window = window
+        self.buffer = deque(maxlen=window)
+        self.total = 0.0
+        self.value = math.nan
+
+    def update(self, value):
+        if math.isnan(value):
+            self.buffer.clear()
+            self.total = 0.0
+            self.value = math.nan
+            return self.value
+        if len(self.buffer) == self.window:
+            self.total -= self.buffer[0]
+        self.buffer.append(value)
+        self.total += value
+        self.value = self.total / self.window if len(self.buffer) == self.window else math.nan
+        return self.value
+
+
+class IncrementalIndicators:
+    """
+    Stateful version of calculate_indicators that updates the indicators and
+    signals bar by bar in constant time.
+
+    The EMA_5/EMA_20 values, the Wilder RSI averages and a ring buffer for
+    SMA_RSI_14 are kept between bars, so every update only costs a few
+    arithmetic operations instead of a recalculation of the whole history.
+    The results match calculate_indicators within float tolerance.
+
+    Parameters:
+        ema5_window (int): The window of the fast EMA.
+        ema20_window (int): The window of the slow EMA.
+        rsi_window (int): The window of the RSI.
+        sma_rsi_window (int): The window of the SMA of the RSI.
+    """
+
+    def __init__(self, ema5_window=5, ema20_window=20, rsi_window=14, sma_rsi_window=14):
+        self._ema5 = _EMA(ema5_window)
+        self._ema20 = _EMA(ema20_window)
+        self._rsi = _RSI(rsi_window)
+        self._sma_rsi = _SMA(sma_rsi_window)
+        self._last_row = None
+        self._saved = None
+
+    @classmethod
+    def from_history(cls, data, ema5_window=5, ema20_window=20, rsi_window=14):
+        """
+        Create an engine and warm it up with the historical bars in data.
+
+        Parameters:
+            data (pd.DataFrame): The bars with "Close" and "Adj Close" columns.
+
+        Returns:
+            IncrementalIndicators: The engine with the last bar of data applied.
+        """
+        engine = cls(ema5_window, ema20_window, rsi_window)
+        for close, adj_close in zip(data["Close"].to_numpy(), data["Adj Close"].to_numpy()):
+            engine.update(float(close), float(adj_close))
+        return engine
+
+    def _state(self):
+        return (
+            dict(self._ema5.__dict__),
+            dict(self._ema20.__dict__),
+            dict(self._rsi.__dict__),
+            dict(self._sma_rsi.__dict__, buffer=self._sma_rsi.buffer.copy()),
+            self._last_row,
+        )
+
+    def _restore(self, state):
+        ema5, ema20, rsi, sma_rsi, self._last_row = state
+        self._ema5.__dict__.update(ema5)
+        self._ema20.__dict__.update(ema20)
+        self._rsi.__dict__.update(rsi)
+        self._sma_rsi.__dict__.update(sma_rsi, buffer=sma_rsi["buffer"].copy())
+
+    def update(self, close, adj_close=None, replace_last=False):
+        """
+        Apply one bar and return its indicator row.
+
+        Parameters:
+            close (float): The close of the bar.
+            adj_close (float): The adjusted close of the bar, defaults to close.
+            replace_last (bool): Replace the previously applied bar instead of
+                appending a new one, e.g. when a still forming bar is updated.
+
+        Returns:
+            dict: The indicator and signal columns of calculate_indicators.
+        """
+        if adj_close is None:
+            adj_close = close
+        if replace_last and self._saved is not None:
+            self._restore(self._saved)
+        self._saved = self._state()
+
+        ema5 = self._ema5.update(close)
+        ema20 = self._ema20.update(close)
+        rsi = self._rsi.update(close)
+        sma_rsi = self._sma_rsi.update(rsi)
+
+        previous = self._last_row
+        if previous is None:
+            previous = dict.fromkeys(["Adj Close", "EMA_5", "EMA_20", "RSI_14", "SMA_RSI_14"], math.nan)
+
+        signal_1 = int(rsi >= sma_rsi)
+        signal_2 = int(adj_close >= ema20)
+        signal_3 = int(previous["EMA_5"] < previous["EMA_20"] and ema5 >= ema20)
+        row = {
+            "Adj Close": adj_close,
+            "EMA_5": ema5,
+            "EMA_20": ema20,
+            "RSI_14": rsi,
+            "SMA_RSI_14": sma_rsi,
+            "point_pos_signal_2": int(previous["Adj Close"] < previous["EMA_20"] and signal_2),
+            "signal_3": signal_3,
+            "signal_1": signal_1,
+            "point_pos_signal_1": int(previous["RSI_14"] < previous["SMA_RSI_14"] and signal_1),
+            "signal_2": signal_2,
+            "long_signal": int(signal_1 + signal_2 + signal_3 == 3),
+        }
+        self._last_row = row
+        return {key: value for key, value in row.items() if key != "Adj Close"}
@@ -0,0 +1,120 @@
+# Time in force of the orders per order validity
+TIME_IN_FORCE = {
+    "DAY": "DAY",
+    "GTC (Good Till Cancelled)": "GTC",
+    "GTC": "GTC",
+}
+
+
+def notion_headers(api_key):
+    """Return the headers of the Notion API requests."""
+    return {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+        "Notion-Version": "2022-06-28",
+    }
+
+
+def build_new_page_data(
+    database_id,
+    ticker_symbol,
+    action,
+    date,
+    quantity,
+    entry_price,
+    initial_stop,
+    validity,
+    order_type,
+    earnings_date,
+    earnings_date_confirmed,
+    dividends,
+    company_name,
+    trade_management_plan,
+    reason,
+    plan_b,
+    dividends_date=None,
+):
+    """
+    Build the Notion page of a trading journal entry.
+
+    Parameters:
+        database_id (str): The Notion database of the journal.
+        ticker_symbol (str): The ticker symbol.
+        action (str): "Long" or "Short".
+        date (date): The date of the trade.
+        quantity (int): The number of shares.
+        entry_price (float): The entry price.
+        initial_stop (float): The initial stop, also used as the current stop.
+        validity (str): The order validity, e.g. "DAY".
+        order_type (str): The order type, e.g. "STP/STP LMT".
+        earnings_date (date): The next earnings date, left out if None.
+        earnings_date_confirmed (bool): Whether the earnings date is confirmed.
+        dividends (float): The dividends.
+        company_name (str): The company name.
+        trade_management_plan (str): How the trade is managed.
+        reason (str): The reason for opening the position.
+        plan_b (str): The exit scenario.
+        dividends_date (date): The (ex-)dividend date, left out if None.
+
+    Returns:
+        dict: The payload for the Notion pages endpoint.
+    """
+    new_page_data = {
+        "parent": {"database_id": database_id},
+        "properties": {
+            "Symbol": {"title": [{"text": {"content": ticker_symbol}}]},
+            "Action": {"select": {"name": action}},
+            "Date": {"date": {"start": date.isoformat()}},  # ISO 8601 formatted date with time
+            "Quantity": {"number": quantity},
+            "Entry Price": {"number": entry_price},
+            "Initial Stop": {"number": initial_stop},
+            "Current Stop": {"number": initial_stop},
+            "Order Validity": {"select": {"name": validity}},
+            "Order Type": {"select": {"name": order_type}},
+            "Dividends": {"number": dividends},
+            "Stock": {"rich_text": [{"text": {"content": company_name}}]},
+            "Trade Management": {"rich_text": [{"text": {"content": trade_management_plan}}]},
+            "Reason": {"rich_text": [{"text": {"content": reason}}]},
+            "Plan B": {"rich_text": [{"text": {"content": plan_b}}]},
+            "Earnings Date Confirmed": {"checkbox": earnings_date_confirmed},
+        },
+    }
+
+    # Conditionally add the dates that are known
+    if earnings_date is not None:
+        new_page_data["properties"]["Earnings Date"] = {"date": {"start": earnings_date.isoformat()}}
+    if dividends_date is not None:
+        new_page_data["properties"]["Dividends Date"] = {"date": {"start": dividends_date.isoformat()}}
+    return new_page_data
+
+
+def build_order(ticker_symbol, quantity, entry_price, initial_stop, price_offset=0.02, validity="DAY"):
+    """
+    Build the stop limit entry order with its stop loss of a trade.
+
+    The trade is long if the stop is below the entry price. The limit price
+    is price_offset above (long) or below (short) the entry price.
+
+    Parameters:
+        ticker_symbol (str): The ticker symbol.
+        quantity (int): The number of shares.
+        entry_price (float): The entry price, the stop price of the entry order.
+        initial_stop (float): The stop price of the stop loss order.
+        price_offset (float): The offset of the limit price from the entry price.
+        validity (str): The order validity, see TIME_IN_FORCE.
+
+    Returns:
+        dict: The keyword arguments of BrokerSession.place_stop_limit_with_stop_loss.
+    """
+    long = initial_stop < entry_price
+    limit_price = entry_price + price_offset if long else entry_price - price_offset
+    return {
+        "symbol": ticker_symbol,
+        "action": "BUY" if long else "SELL",
+        "quantity": quantity,
+        "stop_price": float(f"{entry_price:.2f}"),
+        "limit_price": float(f"{limit_price:.2f}"),  # Format limit_price to 2 decimal places
+        "stop_loss_price": float(f"{initial_stop:.2f}"),
+        "tif": TIME_IN_FORCE.get(validity, "DAY"),
+        "transmit": False,
+    }
@@ -0,0 +1,173 @@
+from math import floor
+
+
+def calculate_position_size(
+    entry_price,
+    stop_loss,
+    account_balance,
+    risk_per_trade_percent=0.5,
+    risked_capital_percent=10.0,
+):
+    """
+    Calculate the trade size (quantity) based on risk management parameters.
+
+    Parameters:
+        entry_price (float): The price at which the trade is entered.
+        stop_loss (float): The stop loss price for the trade.
+        account_balance (float): The total account balance.
+        risk_per_trade_percent (float): The percentage of account balance to risk per trade.
+        risked_capital_percent (float): The maximum percentage of account balance to allocate to the trade.
+
+    Returns:
+        int: The calculated quantity of shares to trade.
+    """
+    try:
+        # Calculate the dollar amount to risk per trade
+        risk_per_trade = (risk_per_trade_percent / 100) * account_balance
+
+        # Calculate the quantity based on risk per trade and the difference between entry price and stop loss
+        quantity = risk_per_trade / (entry_price - stop_loss)
+
+        # Calculate the maximum capital to allocate to the trade
+        max_capitial_per_trade = (risked_capital_percent / 100) * account_balance
+
+        # Adjust quantity if the total cost exceeds the allowed capital allocation
+        if quantity * entry_price > max_capitial_per_trade:
+            quantity = floor(max_capitial_per_trade / entry_price)
+
+        # Ensure the quantity is always positive
+        quantity = floor(abs(quantity))
+        return quantity
+    except ZeroDivisionError:
+        # Handle division by zero if entry_price equals stop_loss
+        return 0
+    except Exception as e:
+        # Log or handle other unexpected exceptions
+        return -99
+
+
+def cap_position_size(
+    quantity,
+    entry_price,
+    stop_loss,
+    account_balance,
+    open_risk=0.0,
+    open_capital=0.0,
+    max_open_risk_percent=5.0,
+    max_open_capital_percent=100.0,
+):
+    """
+    Cap the trade size (quantity) so the portfolio stays within its exposure limits.
+
+    Parameters:
+        quantity (int): The quantity of the trade, e.g. from calculate_position_size.
+        entry_price (float): The price at which the trade is entered.
+        stop_loss (float): The stop loss price for the trade.
+        account_balance (float): The total account balance.
+        open_risk (float): The dollar amount at risk in the open trades.
+        open_capital (float): The capital allocated to the open trades.
+        max_open_risk_percent (float): The maximum percentage of account balance at risk in all trades.
+        max_open_capital_percent (float): The maximum percentage of account balance allocated to all trades.
+
+    Returns:
+        int: The quantity, reduced to what is left of both limits and never negative.
+    """
+    risk_per_share = abs(entry_price - stop_loss)
+    if quantity <= 0 or entry_price <= 0 or risk_per_share == 0:
+        return quantity
+
+    # Risk and capital that are left for new trades
+    risk_left = (max_open_risk_percent / 100) * account_balance - open_risk
+    capital_left = (max_open_capital_percent / 100) * account_balance - open_capital
+
+    quantity = min(quantity, floor(risk_left / risk_per_share), floor(capital_left / entry_price))
+    return max(quantity, 0)
+
+
+def calculate_position_sizes(
+    entry_price,
+    stop_loss,
+    account_balance,
+    risk_per_trade_percent=0.5,
+    risked_capital_percent=10.0,
+):
+    """
+    Calculate the trade sizes (quantities) of many trades in one vectorized pass.
+
+    Applies the same risk per trade and risked capital rules as
+    calculate_position_size to arrays of trades. Every parameter can be a
+    scalar or an array-like (NumPy array, pandas Series or list) and is
+    broadcast against the others.
+
+    Parameters:
+        entry_price (array-like): The prices at which the trades are entered.
+        stop_loss (array-like): The stop loss prices of the trades.
+        account_balance (array-like): The total account balances.
+        risk_per_trade_percent (array-like): The percentages of account balance to risk per trade.
+        risked_capital_percent (array-like): The maximum percentages of account balance to allocate to a trade.
+
+    Returns:
+        tuple: The quantities as an int64 array and a boolean array marking the
+        invalid rows (non-finite or negative inputs, entry prices that are not
+        positive or stop losses equal to the entry price). Invalid rows have a
+        quantity of 0. If entry_price is a pandas Series, both are returned as
+        Series with its index.
+    """
+    # Imported here, the scalar calculate_position_size does not need them
+    import numpy as np
+    import pandas as pd
+
+    index = entry_price.index if isinstance(entry_price, pd.Series) else None
+
+    entry_price, stop_loss, account_balance, risk_per_trade_percent, risked_capital_percent = (
+        np.broadcast_arrays(
+            *(
+                np.asarray(value, dtype=np.float64)
+                for value in (
+                    entry_price,
+                    stop_loss,
+                    account_balance,
+                    risk_per_trade_percent,
+                    risked_capital_percent,
+                )
+            )
+        )
+    )
+
+    invalid = ~(
+        np.isfinite(entry_price)
+        & np.isfinite(stop_loss)
+        & np.isfinite(account_balance)
+        & np.isfinite(risk_per_trade_percent)
+        & np.isfinite(risked_capital_percent)
+    )
+    invalid |= (entry_price <= 0) | (account_balance < 0)
+    invalid |= (risk_per_trade_percent < 0) | (risked_capital_percent < 0)
+    invalid |= entry_price == stop_loss
+
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        # Calculate the dollar amount to risk per trade
+        risk_per_trade = (risk_per_trade_percent / 100) * account_balance
+
+        # Calculate the quantity based on risk per trade and the difference between entry price and stop loss
+        quantity = risk_per_trade / (entry_price - stop_loss)
+
+        # Calculate the maximum capital to allocate to the trade
+        max_capitial_per_trade = (risked_capital_percent / 100) * account_balance
+
+        # Adjust quantity if the total cost exceeds the allowed capital allocation
+        quantity = np.where(
+            quantity * entry_price > max_capitial_per_trade,
+            np.floor(max_capitial_per_trade / entry_price),
+            quantity,
+        )
+
+        # Ensure the quantity is always positive
+        quantity = np.floor(np.abs(quantity))
+
+    invalid |= ~np.isfinite(quantity) | (quantity > np.iinfo(np.int64).max)
+    quantity = np.where(invalid, 0, quantity).astype(np.int64)
+
+    if index is not None:
+        return pd.Series(quantity, index=index), pd.Series(invalid, index=index)
+    return quantity, invalid
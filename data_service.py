@@ -0,0 +1,87 @@
+import threading
+from concurrent.futures import Future
+
+# Network requests to yfinance that may run at the same time in one process
+DEFAULT_MAX_CONCURRENCY = 4
+
+_upstream_slots = threading.BoundedSemaphore(DEFAULT_MAX_CONCURRENCY)
+
+
+def upstream_slot():
+    """
+    Return the process-wide limit of concurrent network requests to use as
+    a context manager around a single request, e.g. a yfinance download.
+
+    Only the network request holds a slot, reads of the local bar store and
+    metadata cache hits never wait for one.
+    """
+    return _upstream_slots
+
+
+class DataService:
+    """
+    Process-wide gate for data requests shared by all sessions.
+
+    Identical requests that are in flight at the same time are coalesced: the
+    first caller runs the request and every caller with the same key waits for
+    and receives its result (or error), so ten sessions opening AAPL at once
+    cause a single download. The network requests the callables make are
+    limited with upstream_slot, not by the service.
+
+    Requests must not call the service with their own key, they would wait
+    for their own result.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._counts = {"calls": 0, "upstream": 0, "coalesced": 0, "errors": 0}
+
+    def call(self, key, fetch, *args, timeout=None, **kwargs):
+        """
+        Return fetch(*args, **kwargs), shared with all concurrent calls with
+        the same key.
+
+        Parameters:
+            key (hashable): Identifies the request, e.g. ("bars", "AAPL", "1d").
+            fetch (callable): Runs the request.
+            timeout (float): Seconds to wait for a request of another caller,
+                None waits until it is done.
+
+        Returns:
+            The result of fetch. Callers that joined a request in flight
+            receive the same object, so results must not be modified in place.
+        """
+        with self._lock:
+            self._counts["calls"] += 1
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[key] = Future()
+                self._counts["upstream"] += 1
+            else:
+                self._counts["coalesced"] += 1
+
+        if not leader:
+            return future.result(timeout)
+
+        try:
+            result = fetch(*args, **kwargs)
+        except BaseException as e:
+            with self._lock:
+                self._counts["errors"] += 1
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._in_flight[key]
+        future.set_result(result)
+        return result
+
+    def stats(self):
+        """
+        Return the number of calls, upstream requests, coalesced calls, failed
+        requests and requests in flight.
+        """
+        with self._lock:
+            return {**self._counts, "in_flight": len(self._in_flight)}
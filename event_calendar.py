@@ -0,0 +1,233 @@
+import argparse
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+
+from metadata_cache import DEFAULT_TTL, MetadataCache, fetch_earnings_date, fetch_ex_dividend_date
+
+EVENT_CALENDAR_PATH = os.getenv(
+    "EVENT_CALENDAR_PATH", os.path.join("data", "event_calendar.sqlite")
+)
+
+# The kinds of events, named like their metadata cache fields
+EVENT_KINDS = ("earnings_date", "ex_dividend_date")
+
+DEFAULT_FETCHERS = {
+    "earnings_date": fetch_earnings_date,
+    "ex_dividend_date": fetch_ex_dividend_date,
+}
+
+# Seconds until the event of a symbol is fetched again, like the metadata cache
+DEFAULT_MAX_AGE = {kind: DEFAULT_TTL[kind] for kind in EVENT_KINDS}
+
+
+def _as_date(value):
+    # Dates, datetimes, pandas Timestamps and ISO strings as a date
+    if value is None or value != value:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def _row(kind, symbol, value):
+    # The events row of a fetched value
+    if kind == "earnings_date":
+        earnings_date, confirmed = value
+        event_date, confirmed = _as_date(earnings_date), int(bool(confirmed))
+    else:
+        pays_dividends, _, ex_dividend_date = value
+        event_date, confirmed = (_as_date(ex_dividend_date) if pays_dividends else None), None
+    return kind, symbol, event_date.isoformat() if event_date else None, confirmed, time.time()
+
+
+class EventCalendar:
+    """
+    Date-indexed calendar of the earnings and ex-dividend dates of a symbol universe.
+
+    refresh fetches the events of many symbols concurrently and only for the
+    symbols whose events are missing, older than max_age or in the past, so
+    it can run on a schedule for the whole universe. The events are stored in
+    a SQLite database indexed by date, which answers "which of these symbols
+    report within N days" in one query.
+
+    Parameters:
+        path (str): The SQLite database file.
+        max_age (dict): Seconds until the event of a symbol is fetched again,
+            per kind.
+    """
+
+    def __init__(self, path=EVENT_CALENDAR_PATH, max_age=None):
+        self.path = path
+        self.max_age = dict(DEFAULT_MAX_AGE if max_age is None else max_age)
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS events ("
+                " kind TEXT NOT NULL, symbol TEXT NOT NULL, event_date TEXT,"
+                " confirmed INTEGER, refreshed_at REAL NOT NULL,"
+                " PRIMARY KEY (kind, symbol))"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS events_date ON events (kind, event_date)"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def stale(self, symbols, kind, today=None):
+        """
+        Return the symbols whose event of this kind has to be fetched: missing,
+        older than max_age or in the past.
+        """
+        symbols = list(dict.fromkeys(symbol.upper() for symbol in symbols))
+        today = today or date.today()
+        with self._connect() as connection:
+            fresh = {
+                row[0]
+                for row in connection.execute(
+                    "SELECT symbol FROM events WHERE kind = ? AND refreshed_at >= ?"
+                    " AND (event_date IS NULL OR event_date >= ?)"
+                    " AND symbol IN (SELECT value FROM json_each(?))",
+                    (kind, time.time() - self.max_age[kind], today.isoformat(), json.dumps(symbols)),
+                )
+            }
+        return [symbol for symbol in symbols if symbol not in fresh]
+
+    def refresh(self, symbols, fetchers=None, cache=None, max_workers=16, force=False):
+        """
+        Fetch the stale events of many symbols concurrently.
+
+        Parameters:
+            symbols (list): The ticker symbols of the universe.
+            fetchers (dict): fetch(symbol) per kind, returning the values of
+                fetch_earnings_date and fetch_ex_dividend_date.
+            cache (MetadataCache): Also store the fetched values in this
+                metadata cache, so the lookups of the planning form are hits.
+            max_workers (int): The number of concurrent fetches.
+            force (bool): Fetch the events of all symbols.
+
+        Returns:
+            tuple: The number of fetched events and a dict mapping the symbols
+            that failed to {kind: error message}.
+        """
+        fetchers = DEFAULT_FETCHERS if fetchers is None else fetchers
+        symbols = list(dict.fromkeys(symbol.upper() for symbol in symbols))
+        jobs = [
+            (symbol, kind)
+            for kind in fetchers
+            for symbol in (symbols if force else self.stale(symbols, kind))
+        ]
+
+        rows = []
+        errors = {}
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="event_calendar") as executor:
+            futures = {executor.submit(fetchers[kind], symbol): (symbol, kind) for symbol, kind in jobs}
+            for future in as_completed(futures):
+                symbol, kind = futures[future]
+                try:
+                    value = future.result()
+                    rows.append(_row(kind, symbol, value))
+                except Exception as e:
+                    errors.setdefault(symbol, {})[kind] = str(e)
+                    continue
+                if cache is not None:
+                    cache.set(kind, symbol, value)
+
+        self._store(rows)
+        return len(rows), errors
+
+    def _store(self, rows):
+        with self._connect() as connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO events (kind, symbol, event_date, confirmed, refreshed_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def store(self, symbol, kind, value):
+        """
+        Store an event that was looked up elsewhere, e.g. by lookup_ticker.
+
+        Parameters:
+            symbol (str): The ticker symbol.
+            kind (str): "earnings_date" or "ex_dividend_date".
+            value: The value of fetch_earnings_date or fetch_ex_dividend_date.
+        """
+        self._store([_row(kind, symbol.upper(), value)])
+
+    def upcoming(self, days, symbols=None, kind="earnings_date", today=None):
+        """
+        Return the events of this kind within the next days days.
+
+        Parameters:
+            days (int): The number of days from today, today included.
+            symbols (list): Only these symbols, all symbols if None.
+            kind (str): "earnings_date" or "ex_dividend_date".
+            today (date): The first day, defaults to today.
+
+        Returns:
+            dict: {symbol: (event date, confirmed)} ordered by date. confirmed
+            is None for ex-dividend dates.
+        """
+        today = today or date.today()
+        query = (
+            "SELECT symbol, event_date, confirmed FROM events"
+            " WHERE kind = ? AND event_date BETWEEN ? AND ?"
+        )
+        parameters = [kind, today.isoformat(), (today + timedelta(days=days)).isoformat()]
+        if symbols is not None:
+            query += " AND symbol IN (SELECT value FROM json_each(?))"
+            parameters.append(json.dumps([symbol.upper() for symbol in symbols]))
+        with self._connect() as connection:
+            rows = connection.execute(query + " ORDER BY event_date, symbol", parameters).fetchall()
+        return {
+            symbol: (date.fromisoformat(event_date), None if confirmed is None else bool(confirmed))
+            for symbol, event_date, confirmed in rows
+        }
+
+
+def main():
+    from scanner import read_watchlist
+
+    parser = argparse.ArgumentParser(
+        description="Refresh the earnings and ex-dividend calendar of a symbol universe"
+    )
+    parser.add_argument("symbols", nargs="*", help="Ticker symbols")
+    parser.add_argument("--watchlist", help="Text file with ticker symbols")
+    parser.add_argument("--days", type=int, default=7, help="Show the events within this many days")
+    parser.add_argument("--workers", type=int, default=16, help="Concurrent fetches")
+    parser.add_argument("--force", action="store_true", help="Fetch the events of all symbols")
+    args = parser.parse_args()
+
+    symbols = list(args.symbols)
+    if args.watchlist:
+        symbols.extend(read_watchlist(args.watchlist))
+    if not symbols:
+        parser.error("No symbols given")
+
+    calendar = EventCalendar()
+    fetched, errors = calendar.refresh(
+        symbols, cache=MetadataCache(), max_workers=args.workers, force=args.force
+    )
+    print(f"Fetched {fetched} events")
+    for kind in EVENT_KINDS:
+        for symbol, (event_date, confirmed) in calendar.upcoming(args.days, symbols, kind).items():
+            note = "" if confirmed is None else (" (confirmed)" if confirmed else " (estimated)")
+            print(f"{event_date} {symbol} {kind.replace('_', ' ')}{note}")
+    for symbol, kinds in errors.items():
+        for kind, error in kinds.items():
+            print(f"{symbol}: {kind}: {error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+import csv
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from core.indicators import IncrementalIndicators
+from resample import RULES, SESSION_OPEN
+
+BAR_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+INDICATOR_COLUMNS = [
+    "EMA_5",
+    "EMA_20",
+    "RSI_14",
+    "SMA_RSI_14",
+    "point_pos_signal_2",
+    "signal_3",
+    "signal_1",
+    "point_pos_signal_1",
+    "signal_2",
+    "long_signal",
+]
+COLUMNS = BAR_COLUMNS + INDICATOR_COLUMNS
+
+
+def replay_ticks(path, speed=None):
+    """
+    Replay recorded ticks from a CSV file with timestamp, price and size columns.
+
+    Any iterable of (timestamp, price, size) tuples can be used as a tick
+    source, this one stands in for a live quote stream.
+
+    Parameters:
+        path (str): The CSV file.
+        speed (float): Replay this many times faster than recorded, e.g. 60
+            for one minute per second. None replays without waiting.
+
+    Yields:
+        tuple: (pd.Timestamp, float, float) per tick.
+    """
+    previous = None
+    started = time.monotonic()
+    with open(path, newline="") as file:
+        for record in csv.DictReader(file):
+            timestamp = pd.Timestamp(record["timestamp"])
+            if speed:
+                if previous is None:
+                    previous = timestamp
+                # Wait until the tick is due relative to the first tick
+                due = (timestamp - previous).total_seconds() / speed
+                time.sleep(max(0.0, due - (time.monotonic() - started)))
+            yield timestamp, float(record["price"]), float(record.get("size") or 0)
+
+
+class LiveBars:
+    """
+    Build OHLCV bars from ticks and update their indicators incrementally.
+
+    The last capacity bars are kept in a fixed-size ring buffer together with
+    the indicator and signal columns of calculate_indicators. A tick either
+    updates the forming bar or opens a new one, intraday bars are aligned to
+    the session open like resample_bars does.
+
+    Parameters:
+        interval (str): The intraday bar interval, e.g. "1m" or "5m".
+        capacity (int): The number of bars kept in the ring buffer.
+        history (pd.DataFrame): Bars to warm up the indicators and fill the
+            buffer with, indexed or with a "Date" column. Pass warmup_bars
+            more bars than capacity, the buffer keeps the last capacity bars
+            and the indicators of its first bar are warmed up.
+        ema5_window (int): The window of the fast EMA.
+        ema20_window (int): The window of the slow EMA.
+        rsi_window (int): The window of the RSI.
+        session_open (str): The offset of the session open from midnight.
+    """
+
+    def __init__(
+        self,
+        interval,
+        capacity=500,
+        history=None,
+        ema5_window=5,
+        ema20_window=20,
+        rsi_window=14,
+        session_open=SESSION_OPEN,
+    ):
+        self.interval = pd.Timedelta(RULES[interval])
+        if self.interval >= pd.Timedelta(days=1):
+            raise ValueError(f"Live bars need an intraday interval, got {interval}")
+        self.session_open = pd.Timedelta(session_open)
+        self.capacity = capacity
+        self.engine = IncrementalIndicators(ema5_window, ema20_window, rsi_window)
+
+        self._times = [None] * capacity
+        self._values = np.full((capacity, len(COLUMNS)), np.nan)
+        self._count = 0
+        # The timezone of the bars, the ticks are converted to it
+        self.tz = None
+
+        if history is not None:
+            if "Date" in history:
+                history = history.set_index("Date")
+            self.tz = getattr(history.index, "tz", None)
+            for timestamp, bar in zip(history.index, history[BAR_COLUMNS].to_numpy(dtype=np.float64)):
+                row = self.engine.update(float(bar[3]))
+                self._append(timestamp, list(bar) + [row[column] for column in INDICATOR_COLUMNS])
+
+    def __len__(self):
+        return min(self._count, self.capacity)
+
+    def _append(self, timestamp, values):
+        slot = self._count % self.capacity
+        self._times[slot] = timestamp
+        self._values[slot] = values
+        self._count += 1
+
+    def _as_bar_time(self, timestamp):
+        # Tick sources such as replay_ticks of a CSV file without offsets
+        # yield tz-naive timestamps, the stored bars are tz-aware
+        timestamp = pd.Timestamp(timestamp)
+        if self._count == 0 and self.tz is None:
+            self.tz = timestamp.tz
+        if self.tz is None:
+            return timestamp.tz_localize(None) if timestamp.tz is not None else timestamp
+        if timestamp.tz is None:
+            return timestamp.tz_localize(self.tz)
+        return timestamp.tz_convert(self.tz)
+
+    def bar_start(self, timestamp):
+        """Return the start of the bar that contains timestamp."""
+        session = timestamp.normalize() + self.session_open
+        return session + ((timestamp - session) // self.interval) * self.interval
+
+    @property
+    def last_time(self):
+        """The start of the forming bar, None before the first bar."""
+        if not self._count:
+            return None
+        return self._times[(self._count - 1) % self.capacity]
+
+    def last_row(self):
+        """Return the forming bar with its indicators as a dict."""
+        values = self._values[(self._count - 1) % self.capacity]
+        return {"Date": self.last_time, **dict(zip(COLUMNS, values.tolist()))}
+
+    def on_tick(self, timestamp, price, size=0.0):
+        """
+        Apply one tick.
+
+        Parameters:
+            timestamp (datetime-like): The time of the tick. A tz-naive time is
+                taken to be in the timezone of the bars, a tz-aware time is
+                converted to it.
+            price (float): The traded price.
+            size (float): The traded size.
+
+        Returns:
+            tuple: The changed bar as a dict with "Date" and the columns of
+            calculate_indicators, and True if the tick opened a new bar. None
+            for a tick that belongs to an older bar.
+        """
+        start = self.bar_start(self._as_bar_time(timestamp))
+        last = self.last_time
+        if last is not None and start < last:
+            return None
+
+        new_bar = last is None or start > last
+        if new_bar:
+            bar = [price, price, price, price, size]
+        else:
+            open_, high, low, _, volume = self._values[(self._count - 1) % self.capacity, :5]
+            bar = [open_, max(high, price), min(low, price), price, volume + size]
+
+        # A tick of the forming bar replaces its last indicator update
+        row = self.engine.update(price, replace_last=not new_bar)
+        values = bar + [row[column] for column in INDICATOR_COLUMNS]
+        if new_bar:
+            self._append(start, values)
+        else:
+            self._values[(self._count - 1) % self.capacity] = values
+        return self.last_row(), new_bar
+
+    def frame(self):
+        """
+        Return the bars in the buffer, oldest first.
+
+        Returns:
+            pd.DataFrame: The bars with a "Date" column and the columns of
+            calculate_indicators, like download_data and calculate_indicators.
+        """
+        n = len(self)
+        order = (np.arange(n) + self._count - n) % self.capacity
+        data = pd.DataFrame(self._values[order], columns=COLUMNS)
+        data.insert(0, "Date", [self._times[slot] for slot in order])
+        data.insert(data.columns.get_loc("Close") + 1, "Adj Close", data["Close"])
+        return data
+
+
+class LiveFeed:
+    """
+    Consume a tick source in a background thread and collect the changed bars.
+
+    The chart polls drain to receive only the bars that changed since the last
+    poll, usually the forming bar and sometimes a new one, instead of
+    rebuilding the figure from all bars per tick. The ticks may be tz-naive,
+    LiveBars.on_tick converts them to the timezone of the bars.
+
+    Parameters:
+        bars (LiveBars): The bars to update.
+        source (iterable): Yields (timestamp, price, size) ticks, e.g.
+            replay_ticks.
+    """
+
+    def __init__(self, bars, source):
+        self.bars = bars
+        self.source = source
+        self.ticks = 0
+        self.error = None
+        self._changed = OrderedDict()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start consuming the source, returns self."""
+        self._thread = threading.Thread(target=self._run, name="live_feed", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            for timestamp, price, size in self.source:
+                if self._stop.is_set():
+                    break
+                with self._lock:
+                    change = self.bars.on_tick(timestamp, price, size)
+                    self.ticks += 1
+                    if change is not None:
+                        row, _ = change
+                        # Only the latest version of every bar is kept
+                        self._changed[row["Date"]] = row
+        except Exception as exception:
+            self.error = exception
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def drain(self):
+        """
+        Return the bars that changed since the last call, oldest first.
+
+        Returns:
+            list: One dict per changed bar, see LiveBars.on_tick.
+        """
+        with self._lock:
+            changed = list(self._changed.values())
+            self._changed.clear()
+        return changed
+
+    def frame(self):
+        """Return a consistent copy of all bars, see LiveBars.frame."""
+        with self._lock:
+            return self.bars.frame()
+
+    def stop(self, timeout=1.0):
+        """Stop consuming the source after the current tick."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
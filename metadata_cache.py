@@ -0,0 +1,204 @@
+import json
+import os
+import sqlite3
+import time
+from datetime import date, datetime
+
+from data_service import upstream_slot
+
+METADATA_CACHE_PATH = os.getenv(
+    "METADATA_CACHE_PATH", os.path.join("data", "metadata_cache.sqlite")
+)
+
+# Time to live in seconds per cached field
+DEFAULT_TTL = {
+    "company_name": 7 * 24 * 3600,
+    "earnings_date": 12 * 3600,
+    "ex_dividend_date": 24 * 3600,
+}
+
+DEFAULT_MAX_ENTRIES = 10000
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, date):
+        return {"__date__": value.isoformat()}
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _decode(value):
+    if "__datetime__" in value:
+        return datetime.fromisoformat(value["__datetime__"])
+    if "__date__" in value:
+        return date.fromisoformat(value["__date__"])
+    return value
+
+
+class MetadataCache:
+    """
+    On-disk cache for ticker metadata shared by all processes on one machine.
+
+    Entries expire after a time to live per field. When the cache holds more
+    than max_entries entries, the least recently used ones are evicted. Hits
+    and misses are counted per field in the database, so the counters cover
+    every process using the same file.
+
+    Parameters:
+        path (str): The SQLite database file.
+        ttl (dict): Time to live in seconds per field, fields that are not
+            listed never expire.
+        max_entries (int): The maximum number of cached entries.
+    """
+
+    def __init__(self, path=METADATA_CACHE_PATH, ttl=None, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl = dict(DEFAULT_TTL if ttl is None else ttl)
+        self.max_entries = max_entries
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS metadata ("
+                " field TEXT NOT NULL, symbol TEXT NOT NULL, value TEXT NOT NULL,"
+                " stored_at REAL NOT NULL, accessed_at REAL NOT NULL,"
+                " PRIMARY KEY (field, symbol))"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS metadata_accessed_at ON metadata (accessed_at)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS stats ("
+                " field TEXT PRIMARY KEY, hits INTEGER NOT NULL, misses INTEGER NOT NULL)"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _count(self, connection, field, hit):
+        connection.execute(
+            "INSERT INTO stats (field, hits, misses) VALUES (?, ?, ?)"
+            " ON CONFLICT (field) DO UPDATE SET hits = hits + excluded.hits,"
+            " misses = misses + excluded.misses",
+            (field, int(hit), int(not hit)),
+        )
+
+    def get(self, field, symbol):
+        """
+        Look up a cached value.
+
+        Returns:
+            tuple: (True, value) on a hit, (False, None) if the value is not
+            cached or has expired.
+        """
+        symbol = symbol.upper()
+        now = time.time()
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT value, stored_at FROM metadata WHERE field = ? AND symbol = ?",
+                (field, symbol),
+            ).fetchone()
+            ttl = self.ttl.get(field)
+            if row is not None and (ttl is None or now - row[1] < ttl):
+                connection.execute(
+                    "UPDATE metadata SET accessed_at = ? WHERE field = ? AND symbol = ?",
+                    (now, field, symbol),
+                )
+                self._count(connection, field, True)
+                return True, json.loads(row[0], object_hook=_decode)
+
+            if row is not None:
+                connection.execute(
+                    "DELETE FROM metadata WHERE field = ? AND symbol = ?", (field, symbol)
+                )
+            self._count(connection, field, False)
+            return False, None
+
+    def set(self, field, symbol, value):
+        """
+        Store a value and evict the least recently used entries if the cache
+        is full. Values must be JSON serializable, dates and datetimes are
+        supported as well.
+        """
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO metadata (field, symbol, value, stored_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (field, symbol.upper(), json.dumps(value, default=_encode), now, now),
+            )
+            connection.execute(
+                "DELETE FROM metadata WHERE rowid IN ("
+                " SELECT rowid FROM metadata ORDER BY accessed_at ASC"
+                " LIMIT max(0, (SELECT count(*) FROM metadata) - ?))",
+                (self.max_entries,),
+            )
+
+    def get_or_fetch(self, field, symbol, fetch):
+        """
+        Return the cached value or call fetch(symbol), cache and return its result.
+        """
+        found, value = self.get(field, symbol)
+        if found:
+            return value
+        value = fetch(symbol)
+        self.set(field, symbol, value)
+        return value
+
+    def stats(self):
+        """
+        Return the hit and miss counters as {field: {"hits": int, "misses": int}}.
+        """
+        with self._connect() as connection:
+            rows = connection.execute("SELECT field, hits, misses FROM stats").fetchall()
+        return {field: {"hits": hits, "misses": misses} for field, hits, misses in rows}
+
+    def clear(self):
+        """Remove all cached entries and reset the counters."""
+        with self._connect() as connection:
+            connection.execute("DELETE FROM metadata")
+            connection.execute("DELETE FROM stats")
+
+
+def fetch_company_name(ticker_symbol):
+    import yfinance as yf
+
+    with upstream_slot():
+        return str(yf.Ticker(ticker_symbol).info.get("shortName", ""))
+
+
+def fetch_earnings_date(ticker_symbol):
+    from pyfinsights.utils import get_earnings_date_from_df
+    from pyfinsights.yfin import get_earnings_dates
+
+    with upstream_slot():
+        earnings_dates = get_earnings_dates(ticker_symbol)
+    earnings_date, earnings_date_confirmed = get_earnings_date_from_df(earnings_dates, ticker_symbol)
+    return [earnings_date, earnings_date_confirmed]
+
+
+def fetch_ex_dividend_date(ticker_symbol):
+    from pyfinsights.yfin import get_dividends_date
+
+    with upstream_slot():
+        pays_dividends, dividends_date, ex_dividend_date, _ = get_dividends_date(ticker_symbol)
+    return [pays_dividends, dividends_date, ex_dividend_date]
+
+
+def get_company_name(ticker_symbol, cache):
+    """Return the short name of the company."""
+    return cache.get_or_fetch("company_name", ticker_symbol, fetch_company_name)
+
+
+def get_earnings_date(ticker_symbol, cache):
+    """Return the next earnings date and whether it is confirmed."""
+    return tuple(cache.get_or_fetch("earnings_date", ticker_symbol, fetch_earnings_date))
+
+
+def get_ex_dividend_date(ticker_symbol, cache):
+    """Return whether the company pays dividends, its dividends date and ex-dividend date."""
+    return tuple(cache.get_or_fetch("ex_dividend_date", ticker_symbol, fetch_ex_dividend_date))
@@ -0,0 +1,303 @@
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from contextlib import nullcontext
+
+import requests
+from requests.adapters import HTTPAdapter
+
+NOTION_PAGES_URL = "https://api.notion.com/v1/pages"
+
+NOTION_JOURNAL_PATH = os.getenv(
+    "NOTION_JOURNAL_PATH", os.path.join("data", "notion_journal.sqlite")
+)
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+SENDING = "sending"
+SAVED = "saved"
+FAILED = "failed"
+
+
+class NotionJournalWriter:
+    """
+    Background writer that saves journal entries to Notion.
+
+    Entries are queued in a SQLite database on local disk and enqueue returns
+    immediately. A worker thread drains the queue in batches over one pooled
+    HTTP session, keeps below the Notion rate limit and retries rate limited
+    (429) and failed (5xx or connection error) requests with backoff. Queued
+    entries survive a restart of the app and are sent once a writer is
+    started again on the same database.
+
+    Parameters:
+        headers (dict): The headers of the Notion API requests.
+        url (str): The endpoint that creates a page.
+        path (str): The SQLite database file of the queue.
+        requests_per_second (float): The maximum request rate, Notion allows
+            an average of three requests per second.
+        batch_size (int): The number of entries taken from the queue at once.
+        max_attempts (int): The number of attempts before an entry fails.
+        backoff_seconds (float): The base delay of the exponential backoff.
+        timeout (float): The timeout of a single request in seconds.
+        tracer (Tracer): Records the duration of every request as a
+            "notion_post" span.
+    """
+
+    def __init__(
+        self,
+        headers,
+        url=NOTION_PAGES_URL,
+        path=NOTION_JOURNAL_PATH,
+        requests_per_second=3.0,
+        batch_size=10,
+        max_attempts=8,
+        backoff_seconds=1.0,
+        timeout=30.0,
+        tracer=None,
+    ):
+        self.url = url
+        self.path = path
+        self.min_interval = 1.0 / requests_per_second
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.timeout = timeout
+        self.tracer = tracer
+
+        self.session = requests.Session()
+        self.session.headers.update(headers)
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._last_request_at = 0.0
+        self._paused_until = 0.0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT, payload TEXT NOT NULL,"
+                " status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0,"
+                " next_attempt_at REAL NOT NULL, last_error TEXT, page_id TEXT,"
+                " created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS entries_queue ON entries (status, next_attempt_at)"
+            )
+            # Entries that were being sent when the app stopped are sent again
+            connection.execute(
+                "UPDATE entries SET status = ? WHERE status = ?", (QUEUED, SENDING)
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def start(self):
+        """Start the worker thread."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="notion_journal_writer", daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """Stop the worker thread, queued entries stay in the queue."""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def enqueue(self, payload):
+        """
+        Queue a page for the Notion database and return immediately.
+
+        Parameters:
+            payload (dict): The new page data, as posted to the Notion API.
+
+        Returns:
+            int: The id of the journal entry, used to query its status.
+        """
+        now = time.time()
+        with self._connect() as connection:
+            cursor = connection.execute(
+                "INSERT INTO entries (payload, status, next_attempt_at, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (json.dumps(payload), QUEUED, now, now, now),
+            )
+            entry_id = cursor.lastrowid
+        self._wakeup.set()
+        return entry_id
+
+    def status(self, entry_id):
+        """
+        Return the status of a journal entry.
+
+        Returns:
+            dict: The "status" (queued, sending, saved or failed), the number
+            of "attempts", the "last_error" and the Notion "page_id", or None
+            if the entry does not exist.
+        """
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT status, attempts, last_error, page_id FROM entries WHERE id = ?",
+                (entry_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("status", "attempts", "last_error", "page_id"), row))
+
+    def pending(self):
+        """Return the number of entries that have not been saved or failed yet."""
+        with self._connect() as connection:
+            return connection.execute(
+                "SELECT count(*) FROM entries WHERE status IN (?, ?)", (QUEUED, SENDING)
+            ).fetchone()[0]
+
+    def flush(self, timeout=None):
+        """
+        Wait until all queued entries have been saved or have failed.
+
+        Returns:
+            bool: True if the queue was drained within the timeout.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while self.pending():
+            if deadline is not None and time.time() >= deadline:
+                return False
+            self._wakeup.set()
+            time.sleep(0.05)
+        return True
+
+    def _next_batch(self):
+        now = time.time()
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT id, payload, attempts FROM entries"
+                " WHERE status = ? AND next_attempt_at <= ? ORDER BY id LIMIT ?",
+                (QUEUED, now, self.batch_size),
+            ).fetchall()
+            connection.executemany(
+                "UPDATE entries SET status = ?, updated_at = ? WHERE id = ?",
+                [(SENDING, now, row[0]) for row in rows],
+            )
+            if rows:
+                return rows, 0.0
+            next_attempt_at = connection.execute(
+                "SELECT min(next_attempt_at) FROM entries WHERE status = ?", (QUEUED,)
+            ).fetchone()[0]
+        return rows, None if next_attempt_at is None else max(0.0, next_attempt_at - now)
+
+    def _update(self, entry_id, status, attempts, last_error=None, page_id=None, next_attempt_at=None):
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute(
+                "UPDATE entries SET status = ?, attempts = ?, last_error = ?, page_id = ?,"
+                " next_attempt_at = ?, updated_at = ? WHERE id = ?",
+                (status, attempts, last_error, page_id, next_attempt_at or now, now, entry_id),
+            )
+
+    def _retry_delay(self, attempts, response=None):
+        if response is not None and response.headers.get("Retry-After"):
+            try:
+                return float(response.headers["Retry-After"])
+            except ValueError:
+                pass
+        return self.backoff_seconds * 2 ** (attempts - 1) * random.uniform(0.5, 1.0)
+
+    def _retry_or_fail(self, entry_id, attempts, last_error, delay=None):
+        # Queue the entry again after a backoff until max_attempts is reached
+        retry = attempts < self.max_attempts
+        if delay is None:
+            delay = self._retry_delay(attempts)
+        self._update(
+            entry_id,
+            QUEUED if retry else FAILED,
+            attempts,
+            last_error=last_error,
+            next_attempt_at=time.time() + delay if retry else None,
+        )
+
+    def _send(self, entry_id, payload, attempts):
+        # Keep below the rate limit and respect a pause requested by Notion
+        wait = max(
+            self._last_request_at + self.min_interval - time.time(),
+            self._paused_until - time.time(),
+        )
+        if wait > 0 and self._stopped.wait(wait):
+            self._update(entry_id, QUEUED, attempts)
+            return
+        self._last_request_at = time.time()
+
+        attempts += 1
+        span = nullcontext() if self.tracer is None else self.tracer.span("notion_post")
+        try:
+            with span:
+                response = self.session.post(self.url, data=payload, timeout=self.timeout)
+        except requests.RequestException as e:
+            self._retry_or_fail(entry_id, attempts, str(e))
+            return
+        except Exception as e:
+            # Any other error of the request, the page was not created
+            logger.exception("Sending journal entry %s failed", entry_id)
+            self._retry_or_fail(entry_id, attempts, f"{type(e).__name__}: {e}")
+            return
+
+        if 200 <= response.status_code < 300:
+            # Notion created the page, it must not be sent again even if the
+            # response cannot be read
+            try:
+                page_id = response.json().get("id")
+                last_error = None
+            except Exception as e:
+                logger.exception("Reading the response of journal entry %s failed", entry_id)
+                page_id = None
+                last_error = f"Saved, unreadable response: {type(e).__name__}: {e}"
+            self._update(entry_id, SAVED, attempts, last_error=last_error, page_id=page_id)
+        elif response.status_code == 429 or response.status_code >= 500:
+            delay = self._retry_delay(attempts, response)
+            if response.status_code == 429:
+                # Rate limits apply to the integration, pause all requests
+                self._paused_until = time.time() + delay
+            self._retry_or_fail(entry_id, attempts, f"{response.status_code}: {response.text}", delay)
+        else:
+            # Other client errors, e.g. a validation error, will not succeed on retry
+            self._update(entry_id, FAILED, attempts, last_error=f"{response.status_code}: {response.text}")
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                batch, wait = self._next_batch()
+                for entry_id, payload, attempts in batch:
+                    if self._stopped.is_set():
+                        self._update(entry_id, QUEUED, attempts)
+                        continue
+                    try:
+                        self._send(entry_id, payload, attempts)
+                    except sqlite3.Error:
+                        raise
+                    except Exception as e:
+                        # An error after the request, the page may have been
+                        # created and is not sent again. It must not stop the
+                        # worker or leave the entry sending.
+                        logger.exception("Handling journal entry %s failed", entry_id)
+                        self._update(entry_id, FAILED, attempts + 1, last_error=f"{type(e).__name__}: {e}")
+            except sqlite3.Error:
+                logger.exception("Journal queue at %s is not available", self.path)
+                wait = 1.0
+            if wait is None or wait > 0:
+                self._wakeup.wait(wait)
+                self._wakeup.clear()
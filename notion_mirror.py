@@ -0,0 +1,379 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+NOTION_DATABASE_QUERY_URL = "https://api.notion.com/v1/databases/{database_id}/query"
+
+NOTION_MIRROR_PATH = os.getenv(
+    "NOTION_MIRROR_PATH", os.path.join("data", "notion_mirror.sqlite")
+)
+
+# Journal property that marks a trade as closed once it is set, e.g. an
+# "Exit Price" number, an "Exit Date" date, a "Closed" checkbox or a "Status"
+# select with one of CLOSED_STATUSES. The pages written by build_new_page_data
+# have no such property, so without it the mirror cannot tell open from
+# closed trades and trading_plan.py does not cap the quantity.
+NOTION_CLOSED_PROPERTY = os.getenv("NOTION_CLOSED_PROPERTY")
+
+# Minimum number of seconds between two syncs with Notion
+DEFAULT_SYNC_INTERVAL = 60.0
+
+# Seconds between two syncs that list all pages, pages that are no longer
+# listed (deleted, archived or moved) are removed from the mirror
+DEFAULT_FULL_SYNC_INTERVAL = 3600.0
+
+# Values of a select or status closed property that mark a trade as closed
+CLOSED_STATUSES = ("Closed", "Exited", "Stopped", "Cancelled")
+
+
+def _property_value(prop):
+    # Plain value of a Notion page property
+    if prop is None:
+        return None
+    kind = prop.get("type")
+    if kind is None:
+        # Properties as they are written, without a type
+        kind = next(
+            (
+                key
+                for key in ("title", "rich_text", "number", "select", "status", "date", "checkbox")
+                if key in prop
+            ),
+            None,
+        )
+    value = prop.get(kind)
+    if kind in ("title", "rich_text"):
+        return "".join(
+            part.get("plain_text") or part.get("text", {}).get("content", "") for part in value or []
+        )
+    if kind in ("select", "status"):
+        return value["name"] if value else None
+    if kind == "date":
+        return value["start"] if value else None
+    return value
+
+
+def _is_closed(prop):
+    # A select or status closes the trade with one of CLOSED_STATUSES, any
+    # other property once it has a value
+    if prop is None:
+        return False
+    value = _property_value(prop)
+    if prop.get("type") in ("select", "status") or "select" in prop or "status" in prop:
+        return value in CLOSED_STATUSES
+    return value not in (None, "", False)
+
+
+def parse_trade(page, closed_property=None):
+    """
+    Extract the trade of a journal page, as written by build_new_page_data.
+
+    A trade is closed if the page is archived or its closed property is set,
+    see NOTION_CLOSED_PROPERTY. Without a closed property every listed page
+    is open.
+
+    Parameters:
+        page (dict): The page as returned by the database query endpoint.
+        closed_property (str): The property that marks a trade as closed.
+
+    Returns:
+        dict: The page id, symbol, action, quantity, entry price, stop (the
+        current stop, or the initial stop if there is none), open flag and
+        last edited time.
+    """
+    properties = page.get("properties", {})
+
+    def value(name):
+        return _property_value(properties.get(name))
+
+    stop = value("Current Stop")
+    if stop is None:
+        stop = value("Initial Stop")
+    closed = page.get("archived", False) or page.get("in_trash", False)
+    if closed_property is not None and _is_closed(properties.get(closed_property)):
+        closed = True
+    return {
+        "page_id": page["id"],
+        "symbol": (value("Symbol") or "").upper(),
+        "action": value("Action") or "Long",
+        "quantity": value("Quantity") or 0,
+        "entry_price": value("Entry Price") or 0.0,
+        "stop": stop,
+        "open": not closed,
+        "last_edited_time": page.get("last_edited_time", ""),
+    }
+
+
+class NotionMirror:
+    """
+    Local mirror of the trades in the Notion journal database.
+
+    A sync only asks Notion for the pages edited since the last sync, page by
+    page, and upserts them into a SQLite database with an index on the open
+    trades. Syncs are throttled to one per sync_interval, so sync can be
+    called before every sizing request and usually returns without a request.
+    Every full_sync_interval, and when the closed property changes, all pages
+    are listed and the trades whose pages are no longer listed are removed.
+
+    Parameters:
+        headers (dict): The headers of the Notion API requests.
+        database_id (str): The Notion journal database.
+        closed_property (str): The property that marks a trade as closed,
+            see NOTION_CLOSED_PROPERTY. Open trades are not tracked without it.
+        path (str): The SQLite database file of the mirror.
+        url (str): The database query endpoint, with a {database_id} field.
+        sync_interval (float): Minimum number of seconds between two syncs.
+        full_sync_interval (float): Seconds between two syncs of all pages.
+        requests_per_second (float): The maximum request rate.
+        page_size (int): The number of pages per request, at most 100.
+        max_attempts (int): The number of attempts of a rate limited request.
+        timeout (float): The timeout of a single request in seconds.
+    """
+
+    def __init__(
+        self,
+        headers,
+        database_id,
+        closed_property=NOTION_CLOSED_PROPERTY,
+        path=NOTION_MIRROR_PATH,
+        url=NOTION_DATABASE_QUERY_URL,
+        sync_interval=DEFAULT_SYNC_INTERVAL,
+        full_sync_interval=DEFAULT_FULL_SYNC_INTERVAL,
+        requests_per_second=3.0,
+        page_size=100,
+        max_attempts=5,
+        timeout=30.0,
+    ):
+        self.database_id = database_id
+        self.closed_property = closed_property or None
+        self.path = path
+        self.url = url.format(database_id=database_id)
+        self.sync_interval = sync_interval
+        self.full_sync_interval = full_sync_interval
+        self.min_interval = 1.0 / requests_per_second
+        self.page_size = page_size
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        self.session.headers.update(headers)
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        self._lock = threading.Lock()
+        self._last_request_at = 0.0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS trades ("
+                " page_id TEXT PRIMARY KEY, database_id TEXT NOT NULL, symbol TEXT NOT NULL,"
+                " action TEXT NOT NULL, quantity REAL NOT NULL, entry_price REAL NOT NULL,"
+                " stop REAL, open INTEGER NOT NULL, last_edited_time TEXT NOT NULL,"
+                " page TEXT NOT NULL)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS trades_open ON trades (database_id, open, symbol)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS sync_state ("
+                " database_id TEXT PRIMARY KEY, last_edited_time TEXT, synced_at REAL NOT NULL,"
+                " full_synced_at REAL NOT NULL DEFAULT 0, closed_property TEXT)"
+            )
+            # Mirrors created before full syncs
+            columns = {row[1] for row in connection.execute("PRAGMA table_info(sync_state)")}
+            if "full_synced_at" not in columns:
+                connection.execute(
+                    "ALTER TABLE sync_state ADD COLUMN full_synced_at REAL NOT NULL DEFAULT 0"
+                )
+                connection.execute("ALTER TABLE sync_state ADD COLUMN closed_property TEXT")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _sync_state(self):
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT last_edited_time, synced_at, full_synced_at, closed_property"
+                " FROM sync_state WHERE database_id = ?",
+                (self.database_id,),
+            ).fetchone()
+        return row if row is not None else (None, 0.0, 0.0, None)
+
+    def last_sync(self):
+        """Return the time of the last sync as a UNIX timestamp, 0 if never synced."""
+        return self._sync_state()[1]
+
+    def _query(self, body):
+        # One database query request, within the rate limit and retried when rate limited
+        for attempt in range(1, self.max_attempts + 1):
+            wait = self._last_request_at + self.min_interval - time.time()
+            if wait > 0:
+                time.sleep(wait)
+            self._last_request_at = time.time()
+            response = self.session.post(self.url, json=body, timeout=self.timeout)
+            if response.status_code == 429 or response.status_code >= 500:
+                if attempt == self.max_attempts:
+                    break
+                try:
+                    delay = float(response.headers.get("Retry-After", ""))
+                except ValueError:
+                    delay = self.min_interval * 2**attempt
+                time.sleep(delay)
+                continue
+            break
+        response.raise_for_status()
+        return response.json()
+
+    def sync(self, force=False):
+        """
+        Pull the pages edited since the last sync into the mirror.
+
+        Parameters:
+            force (bool): Sync all pages, even if the last sync is more
+                recent than sync_interval.
+
+        Returns:
+            int: The number of pages that were pulled, 0 if the sync was
+            skipped.
+        """
+        with self._lock:
+            cursor_time, synced_at, full_synced_at, closed_property = self._sync_state()
+            if not force and time.time() - synced_at < self.sync_interval:
+                return 0
+            full = (
+                force
+                or cursor_time is None
+                or closed_property != self.closed_property
+                or time.time() - full_synced_at >= self.full_sync_interval
+            )
+            if full:
+                cursor_time = None
+
+            body = {
+                "page_size": self.page_size,
+                "sorts": [{"timestamp": "last_edited_time", "direction": "ascending"}],
+            }
+            if cursor_time is not None:
+                # last_edited_time is rounded to the minute, so pages edited in
+                # the minute of the last sync are pulled again and upserted
+                body["filter"] = {
+                    "timestamp": "last_edited_time",
+                    "last_edited_time": {"on_or_after": cursor_time},
+                }
+
+            pulled = 0
+            listed = []
+            started_at = time.time()
+            while True:
+                result = self._query(body)
+                trades = [
+                    parse_trade(page, self.closed_property) for page in result.get("results", [])
+                ]
+                listed.extend(trade["page_id"] for trade in trades)
+                with self._connect() as connection:
+                    connection.executemany(
+                        "INSERT INTO trades (page_id, database_id, symbol, action, quantity,"
+                        " entry_price, stop, open, last_edited_time, page)"
+                        " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+                        " ON CONFLICT (page_id) DO UPDATE SET symbol = excluded.symbol,"
+                        " action = excluded.action, quantity = excluded.quantity,"
+                        " entry_price = excluded.entry_price, stop = excluded.stop,"
+                        " open = excluded.open, last_edited_time = excluded.last_edited_time,"
+                        " page = excluded.page",
+                        [
+                            (
+                                trade["page_id"],
+                                self.database_id,
+                                trade["symbol"],
+                                trade["action"],
+                                trade["quantity"],
+                                trade["entry_price"],
+                                trade["stop"],
+                                int(trade["open"]),
+                                trade["last_edited_time"],
+                                json.dumps(page),
+                            )
+                            for trade, page in zip(trades, result.get("results", []))
+                        ],
+                    )
+                pulled += len(trades)
+                for trade in trades:
+                    if cursor_time is None or trade["last_edited_time"] > cursor_time:
+                        cursor_time = trade["last_edited_time"]
+                if not result.get("has_more"):
+                    break
+                body["start_cursor"] = result["next_cursor"]
+
+            with self._connect() as connection:
+                if full:
+                    # The query does not list deleted, archived or moved pages
+                    connection.execute(
+                        "DELETE FROM trades WHERE database_id = ?"
+                        " AND page_id NOT IN (SELECT value FROM json_each(?))",
+                        (self.database_id, json.dumps(listed)),
+                    )
+                    full_synced_at = started_at
+                connection.execute(
+                    "INSERT INTO sync_state (database_id, last_edited_time, synced_at,"
+                    " full_synced_at, closed_property) VALUES (?, ?, ?, ?, ?)"
+                    " ON CONFLICT (database_id) DO UPDATE SET"
+                    " last_edited_time = excluded.last_edited_time, synced_at = excluded.synced_at,"
+                    " full_synced_at = excluded.full_synced_at,"
+                    " closed_property = excluded.closed_property",
+                    (self.database_id, cursor_time, started_at, full_synced_at, self.closed_property),
+                )
+            return pulled
+
+    def open_trades(self):
+        """Return the open trades as dicts, see parse_trade."""
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT page_id, symbol, action, quantity, entry_price, stop FROM trades"
+                " WHERE database_id = ? AND open = 1 ORDER BY symbol",
+                (self.database_id,),
+            ).fetchall()
+        return [
+            dict(zip(("page_id", "symbol", "action", "quantity", "entry_price", "stop"), row))
+            for row in rows
+        ]
+
+    def exposure(self):
+        """
+        Return the exposure of the open trades.
+
+        The open risk of a trade is what it loses if its stop is hit, 0 once
+        the stop is at or beyond the entry price. A trade without a stop
+        risks its whole capital.
+
+        Returns:
+            dict: The number of "open_trades", the committed "capital" at the
+            entry prices, the "open_risk" in dollars and whether open trades
+            are "tracked" at all, i.e. a closed property is set. Untracked
+            exposure counts every journaled trade and must not cap new trades.
+        """
+        capital = 0.0
+        open_risk = 0.0
+        trades = self.open_trades()
+        for trade in trades:
+            quantity, entry_price, stop = trade["quantity"], trade["entry_price"], trade["stop"]
+            capital += quantity * entry_price
+            if stop is None:
+                open_risk += quantity * entry_price
+            elif trade["action"] == "Short":
+                open_risk += quantity * max(stop - entry_price, 0.0)
+            else:
+                open_risk += quantity * max(entry_price - stop, 0.0)
+        return {
+            "open_trades": len(trades),
+            "capital": capital,
+            "open_risk": open_risk,
+            "tracked": self.closed_property is not None,
+        }
@@ -0,0 +1,161 @@
+import numpy as np
+import pandas as pd
+
+SIGNAL_COLUMNS = [
+    "signal_1",
+    "signal_2",
+    "signal_3",
+    "point_pos_signal_1",
+    "point_pos_signal_2",
+    "long_signal",
+]
+
+
+def downsample_ohlc(data, max_points):
+    """
+    Reduce the bars to at most max_points buckets of consecutive bars.
+
+    Every bucket keeps the first Open, the highest High, the lowest Low, the
+    last Close and the sum of the Volume of its bars, so highs and lows stay
+    visible in the chart. Signal columns are 1 if any bar of the bucket has
+    the signal. All other columns, the x values and the indicators, keep the
+    value of the last bar, so a candle is drawn where its Close and its
+    indicator values were reached.
+
+    Parameters:
+        data (pd.DataFrame): The bars with a RangeIndex, e.g. from download_data.
+        max_points (int): The maximum number of buckets, usually the width
+            of the chart in pixels.
+
+    Returns:
+        pd.DataFrame: The downsampled bars, data itself if it already has at
+        most max_points rows.
+    """
+    n = len(data)
+    if max_points is None or n <= max_points:
+        return data
+
+    # Start row of every bucket, the buckets differ in size by at most one row
+    starts = np.unique(np.arange(max_points) * n // max_points)
+    ends = np.append(starts[1:], n) - 1
+
+    result = data.iloc[ends].reset_index(drop=True)
+    if "Open" in data:
+        result["Open"] = data["Open"].to_numpy()[starts]
+    if "High" in data:
+        result["High"] = np.maximum.reduceat(data["High"].to_numpy(), starts)
+    if "Low" in data:
+        result["Low"] = np.minimum.reduceat(data["Low"].to_numpy(), starts)
+    if "Volume" in data:
+        result["Volume"] = np.add.reduceat(data["Volume"].to_numpy(), starts)
+    for column in SIGNAL_COLUMNS:
+        if column in data:
+            result[column] = np.maximum.reduceat(data[column].to_numpy(), starts)
+    return result
+
+
+def signal_runs(flags):
+    """
+    Find the runs of consecutive 1s in a 0/1 signal with run-length encoding.
+
+    Parameters:
+        flags (array-like): The signal values.
+
+    Returns:
+        tuple: Two arrays with the first and the last position of every run.
+    """
+    flags = np.asarray(flags) == 1
+    edges = np.diff(np.concatenate(([False], flags, [False])).astype(np.int8))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1) - 1
+    return starts, ends
+
+
+def signal_shapes(data, column, x="Date", fillcolor="LightGreen", opacity=0.5):
+    """
+    Build one background rectangle per run of a signal instead of one per bar.
+
+    Parameters:
+        data (pd.DataFrame): The bars with the signal column.
+        column (str): The signal column, e.g. "signal_1".
+        x (str): The column with the x values of the chart.
+
+    Returns:
+        list: The shapes for fig.update_layout(shapes=...).
+    """
+    starts, ends = signal_runs(data[column].to_numpy())
+    x_values = pd.Series(data[x].to_numpy())
+    # A run ends at the bar after its last bar, or at the last bar of the data
+    ends = np.minimum(ends + 1, len(data) - 1)
+    return [
+        {
+            "type": "rect",
+            "x0": x0,
+            "x1": x1,
+            "y0": 0,
+            "y1": 1,
+            "xref": "x",
+            "yref": "paper",
+            "fillcolor": fillcolor,
+            "opacity": opacity,
+            "layer": "below",
+            "line_width": 0,
+        }
+        for x0, x1 in zip(x_values.iloc[starts], x_values.iloc[ends])
+    ]
+
+
+# Indicator column of every line trace of plot_data, by trace name
+LINE_TRACES = {
+    "EMA 5": "EMA_5",
+    "EMA 20": "EMA_20",
+    "RSI 14": "RSI_14",
+    "SMA of RSI 14": "SMA_RSI_14",
+}
+
+
+def _patched(values, value, replace, max_points):
+    # Replace or append the last point, keep at most max_points points
+    values = list(values) if values is not None else []
+    if replace:
+        values[-1] = value
+    else:
+        values.append(value)
+    if max_points is not None and len(values) > max_points:
+        del values[: len(values) - max_points]
+    return values
+
+
+def patch_figure(fig, rows, max_points=None):
+    """
+    Update the last candle and the last indicator points of a plot_data figure
+    in place instead of building a new figure.
+
+    A row for the bar of the last candle replaces it, a row for a newer bar
+    is appended to every trace.
+
+    Parameters:
+        fig (go.Figure): The figure of plot_data.
+        rows (list): Dicts with "Date", OHLC and indicator values, e.g. from
+            LiveFeed.drain.
+        max_points (int): Drop the oldest points beyond this many.
+
+    Returns:
+        go.Figure: fig.
+    """
+    traces = {trace.name: trace for trace in fig.data}
+    candles = traces["Candlesticks"]
+    for row in rows:
+        x = list(candles.x) if candles.x is not None else []
+        replace = bool(x) and pd.Timestamp(x[-1]) == pd.Timestamp(row["Date"])
+        if not replace and x and pd.Timestamp(row["Date"]) < pd.Timestamp(x[-1]):
+            continue
+        for field, column in (("open", "Open"), ("high", "High"), ("low", "Low"), ("close", "Close")):
+            candles[field] = _patched(candles[field], row[column], replace, max_points)
+        for name, column in LINE_TRACES.items():
+            if name in traces:
+                trace = traces[name]
+                trace.y = _patched(trace.y, row[column], replace, max_points)
+                trace.x = _patched(trace.x, row["Date"], replace, max_points)
+        candles.x = _patched(x, row["Date"], replace, max_points)
+    return fig
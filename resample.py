@@ -0,0 +1,163 @@
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.holiday import (
+    AbstractHolidayCalendar,
+    GoodFriday,
+    Holiday,
+    USLaborDay,
+    USMartinLutherKingJr,
+    USMemorialDay,
+    USPresidentsDay,
+    USThanksgivingDay,
+    nearest_workday,
+    sunday_to_monday,
+)
+
+# The interval that is downloaded and stored for every selectable interval,
+# all other intervals are resampled locally from it. 60m/1h bars keep their
+# own base because yfinance serves two years of them but only days of 1m bars.
+BASE_INTERVALS = {
+    "1m": "1m",
+    "2m": "1m",
+    "5m": "1m",
+    "15m": "1m",
+    "30m": "1m",
+    "60m": "1h",
+    "90m": "1m",
+    "1h": "1h",
+    "1d": "1d",
+    "5d": "1d",
+    "1wk": "1d",
+    "1mo": "1d",
+    "3mo": "1d",
+}
+
+# pandas resample rules of the intervals
+RULES = {
+    "1m": "1min",
+    "2m": "2min",
+    "5m": "5min",
+    "15m": "15min",
+    "30m": "30min",
+    "60m": "60min",
+    "90m": "90min",
+    "1h": "60min",
+    "1d": "1D",
+    "1wk": "W-MON",
+    "1mo": "MS",
+    "3mo": "QS",
+}
+
+AGGREGATION = {
+    "Open": "first",
+    "High": "max",
+    "Low": "min",
+    "Close": "last",
+    "Adj Close": "last",
+    "Volume": "sum",
+}
+
+# Most trading days per bar of the intervals resampled from daily bars
+TRADING_DAYS = {"1d": 1, "5d": 5, "1wk": 5, "1mo": 23, "3mo": 66}
+
+# Start of the regular US trading session, intraday bars are aligned to it
+SESSION_OPEN = "9h30min"
+
+# 5d bars group five trading days counted from this day, so a day is always
+# in the same bar whichever window of bars is loaded
+TRADING_DAY_EPOCH = "2000-01-03"
+
+
+class TradingHolidayCalendar(AbstractHolidayCalendar):
+    # The regular NYSE holidays, unscheduled closures are not included
+    rules = [
+        Holiday("New Year's Day", month=1, day=1, observance=sunday_to_monday),
+        USMartinLutherKingJr,
+        USPresidentsDay,
+        GoodFriday,
+        USMemorialDay,
+        Holiday("Juneteenth", month=6, day=19, start_date="2022-01-01", observance=nearest_workday),
+        Holiday("Independence Day", month=7, day=4, observance=nearest_workday),
+        USLaborDay,
+        USThanksgivingDay,
+        Holiday("Christmas", month=12, day=25, observance=nearest_workday),
+    ]
+
+
+@lru_cache(maxsize=1)
+def _trading_holidays():
+    holidays = TradingHolidayCalendar().holidays("1950-01-01", "2100-12-31")
+    return holidays.to_numpy().astype("datetime64[D]")
+
+
+def trading_day_ordinal(index):
+    """
+    Return the number of trading days from TRADING_DAY_EPOCH to every day of
+    index, negative before it. Weekends and TradingHolidayCalendar holidays
+    are not counted.
+    """
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    days = index.to_numpy().astype("datetime64[D]")
+    epoch = np.datetime64(TRADING_DAY_EPOCH, "D")
+    return np.busday_count(epoch, days, holidays=_trading_holidays())
+
+
+def base_interval(interval):
+    """Return the interval that interval is resampled from."""
+    return BASE_INTERVALS[interval]
+
+
+def base_bars(interval, bars):
+    """
+    Return the number of base interval bars that make up at least bars bars
+    of interval.
+    """
+    base = base_interval(interval)
+    if base == "1d":
+        return bars * TRADING_DAYS[interval]
+    return bars * (pd.Timedelta(RULES[interval]) // pd.Timedelta(RULES[base]))
+
+
+def resample_bars(data, interval, session_open=SESSION_OPEN):
+    """
+    Resample bars to a coarser interval.
+
+    Intraday bars are aligned to the session open, e.g. 90m bars start at
+    9:30, 11:00, 12:30 and so on. Weekly bars start on Monday, monthly and
+    quarterly bars on the first day of the period, like the bars of yfinance.
+    5d bars group five trading days, counted from TRADING_DAY_EPOCH so that
+    the bars do not depend on the first loaded bar, and are labelled with
+    their first bar. Bins without any bar are dropped.
+
+    Parameters:
+        data (pd.DataFrame): The bars indexed by timestamp.
+        interval (str): The target interval, one of RULES or "5d".
+        session_open (str): The offset of the session open from midnight.
+
+    Returns:
+        pd.DataFrame: The resampled bars.
+    """
+    if data.empty:
+        return data
+    aggregation = {column: how for column, how in AGGREGATION.items() if column in data}
+
+    if interval == "5d":
+        groups = trading_day_ordinal(data.index) // 5
+        resampled = data.groupby(groups).agg(aggregation)
+        first = np.flatnonzero(np.diff(groups, prepend=groups[0] - 1))
+        resampled.index = data.index[first]
+        return resampled
+
+    rule = RULES[interval]
+    if interval in ("1wk", "1mo", "3mo"):
+        resampled = data.resample(rule, label="left", closed="left").agg(aggregation)
+    elif interval == "1d":
+        resampled = data.resample(rule).agg(aggregation)
+    else:
+        resampled = data.resample(
+            rule, origin="start_day", offset=session_open, label="left", closed="left"
+        ).agg(aggregation)
+    return resampled.dropna(subset=["Open"])
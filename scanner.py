@@ -0,0 +1,219 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+from bar_store import load_bars
+from core.indicators import calculate_indicators
+from event_calendar import EventCalendar
+
+# Columns of the latest bar reported for every hit
+RESULT_COLUMNS = [
+    "Close",
+    "EMA_5",
+    "EMA_20",
+    "RSI_14",
+    "SMA_RSI_14",
+    "long_signal",
+    "point_pos_signal_1",
+    "point_pos_signal_2",
+]
+
+
+def scan_symbol(symbol, data, ema5_window=5, ema20_window=20, rsi_window=14):
+    """
+    Calculate the indicators of one symbol and check its latest bar for signals.
+
+    Parameters:
+        symbol (str): The ticker symbol.
+        data (pd.DataFrame): The bars of the symbol indexed by timestamp.
+        ema5_window (int): The window of the fast EMA.
+        ema20_window (int): The window of the slow EMA.
+        rsi_window (int): The window of the RSI.
+
+    Returns:
+        dict: The latest bar of the symbol if it has a long_signal or a fresh
+        point_pos_signal_1/point_pos_signal_2 cross, otherwise None.
+    """
+    data = data[data.index.weekday < 5]
+    if data.empty:
+        return None
+    data = calculate_indicators(data.copy(), ema5_window, ema20_window, rsi_window, backend="auto")
+
+    latest = data.iloc[-1]
+    if not (
+        latest["long_signal"] == 1
+        or latest["point_pos_signal_1"] == 1
+        or latest["point_pos_signal_2"] == 1
+    ):
+        return None
+
+    hit = {"Symbol": symbol, "Date": data.index[-1]}
+    hit.update({column: latest[column] for column in RESULT_COLUMNS})
+    return hit
+
+
+def rank_hits(hits):
+    """
+    Rank scanner hits: long signals first, then by the number of fresh
+    crosses, then by how far the RSI is above its SMA.
+
+    Parameters:
+        hits (list): The dicts returned by scan_symbol.
+
+    Returns:
+        pd.DataFrame: One row per hit, best ranked first.
+    """
+    columns = ["Symbol", "Date"] + RESULT_COLUMNS + ["score"]
+    if not hits:
+        return pd.DataFrame(columns=columns)
+
+    table = pd.DataFrame(hits)
+    table["score"] = (
+        3 * table["long_signal"] + table["point_pos_signal_1"] + table["point_pos_signal_2"]
+    )
+    table["rsi_strength"] = table["RSI_14"] - table["SMA_RSI_14"]
+    table = table.sort_values(["score", "rsi_strength"], ascending=False)
+    return table[columns].reset_index(drop=True)
+
+
+def scan_watchlist(
+    symbols,
+    interval="1d",
+    ema5_window=5,
+    ema20_window=20,
+    rsi_window=14,
+    download_workers=16,
+    compute_workers=None,
+    load=load_bars,
+    calendar=None,
+    earnings_days=7,
+):
+    """
+    Scan a watchlist for symbols whose latest bar has a long_signal or a fresh
+    point_pos_signal_1/point_pos_signal_2 cross.
+
+    The bars are loaded concurrently in a thread pool and every symbol is
+    handed to a process pool for the indicator calculation as soon as its bars
+    have arrived, so downloads and calculations overlap.
+
+    Parameters:
+        symbols (list): The ticker symbols to scan.
+        interval (str): The bar interval.
+        ema5_window (int): The window of the fast EMA.
+        ema20_window (int): The window of the slow EMA.
+        rsi_window (int): The window of the RSI.
+        download_workers (int): The number of concurrent downloads.
+        compute_workers (int): The number of worker processes, defaults to the
+            number of CPUs.
+        load (callable): load(symbol, interval) returning the bars of a symbol.
+        calendar (EventCalendar): Adds the "earnings_date" of the hits that
+            report within earnings_days days, None for the others.
+        earnings_days (int): The number of days to check for earnings.
+
+    Returns:
+        tuple: The ranked hits as a DataFrame and a dict mapping every symbol
+        that could not be scanned to its error message.
+    """
+    symbols = list(dict.fromkeys(symbol.strip().upper() for symbol in symbols if symbol.strip()))
+    hits = []
+    errors = {}
+
+    with ThreadPoolExecutor(max_workers=download_workers) as downloads, ProcessPoolExecutor(
+        max_workers=compute_workers
+    ) as workers:
+        loading = {downloads.submit(load, symbol, interval): symbol for symbol in symbols}
+        scanning = {}
+        for future in as_completed(loading):
+            symbol = loading[future]
+            try:
+                data = future.result()
+            except Exception as e:
+                errors[symbol] = str(e)
+                continue
+            if data.empty:
+                errors[symbol] = "No data"
+                continue
+            scan = workers.submit(
+                scan_symbol, symbol, data, ema5_window, ema20_window, rsi_window
+            )
+            scanning[scan] = symbol
+
+        for future in as_completed(scanning):
+            try:
+                hit = future.result()
+            except Exception as e:
+                errors[scanning[future]] = str(e)
+                continue
+            if hit is not None:
+                hits.append(hit)
+
+    table = rank_hits(hits)
+    if calendar is not None:
+        # One indexed query for all hits instead of a lookup per symbol
+        upcoming = calendar.upcoming(earnings_days, table["Symbol"].tolist())
+        table["earnings_date"] = [
+            upcoming[symbol][0] if symbol in upcoming else None for symbol in table["Symbol"]
+        ]
+    return table, errors
+
+
+def read_watchlist(path):
+    """
+    Read ticker symbols from a text file, one or more per line separated by
+    commas or whitespace. Lines starting with # are ignored.
+    """
+    symbols = []
+    with open(path) as file:
+        for line in file:
+            if line.lstrip().startswith("#"):
+                continue
+            symbols.extend(line.replace(",", " ").split())
+    return symbols
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scan a watchlist for long signals")
+    parser.add_argument("symbols", nargs="*", help="Ticker symbols to scan")
+    parser.add_argument("--watchlist", help="Text file with ticker symbols")
+    parser.add_argument("--interval", default="1d")
+    parser.add_argument("--ema5-window", type=int, default=5)
+    parser.add_argument("--ema20-window", type=int, default=20)
+    parser.add_argument("--rsi-window", type=int, default=14)
+    parser.add_argument("--download-workers", type=int, default=16)
+    parser.add_argument("--compute-workers", type=int, default=os.cpu_count())
+    parser.add_argument(
+        "--earnings-days", type=int, default=7, help="Flag hits reporting earnings within this many days"
+    )
+    parser.add_argument(
+        "--skip-earnings", action="store_true", help="Drop hits reporting earnings within --earnings-days"
+    )
+    args = parser.parse_args()
+
+    symbols = list(args.symbols)
+    if args.watchlist:
+        symbols.extend(read_watchlist(args.watchlist))
+    if not symbols:
+        parser.error("No symbols given")
+
+    table, errors = scan_watchlist(
+        symbols,
+        interval=args.interval,
+        ema5_window=args.ema5_window,
+        ema20_window=args.ema20_window,
+        rsi_window=args.rsi_window,
+        download_workers=args.download_workers,
+        compute_workers=args.compute_workers,
+        calendar=EventCalendar(),
+        earnings_days=args.earnings_days,
+    )
+    if args.skip_earnings:
+        table = table[table["earnings_date"].isna()]
+    print(table.to_string(index=False))
+    for symbol, error in errors.items():
+        print(f"{symbol}: {error}")
+
+
+if __name__ == "__main__":
+    main()
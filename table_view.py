@@ -0,0 +1,68 @@
+import math
+
+import numpy as np
+
+# Columns shown in the table until others are selected
+DEFAULT_TABLE_COLUMNS = [
+    "Date",
+    "Open",
+    "High",
+    "Low",
+    "Close",
+    "Volume",
+    "EMA_5",
+    "EMA_20",
+    "RSI_14",
+    "long_signal",
+]
+
+# Row filters of the table, the signal column that has to be 1
+TABLE_FILTERS = {
+    "All rows": None,
+    "long_signal": "long_signal",
+    "signal_1": "signal_1",
+    "signal_2": "signal_2",
+    "signal_3": "signal_3",
+    "point_pos_signal_1": "point_pos_signal_1",
+    "point_pos_signal_2": "point_pos_signal_2",
+}
+
+
+def table_page(data, page=1, page_size=100, columns=None, only=None, newest_first=True):
+    """
+    Return one page of rows and columns of the bars for the table.
+
+    Only the rows and columns of the page are copied, so the table does not
+    ship the whole frame to the browser on every rerun.
+
+    Parameters:
+        data (pd.DataFrame): The bars with the indicator columns.
+        page (int): The page number, starting at 1.
+        page_size (int): The number of rows per page.
+        columns (list): The columns to show, all columns if None.
+        only (str): Only include rows where this signal column is 1.
+        newest_first (bool): Page 1 holds the newest rows, newest on top.
+
+    Returns:
+        tuple: The rows of the page as a DataFrame, the number of rows that
+        pass the filter and the number of pages.
+    """
+    if only is None:
+        positions = np.arange(len(data))
+    else:
+        positions = np.flatnonzero(data[only].to_numpy() == 1)
+
+    total = len(positions)
+    pages = max(1, math.ceil(total / page_size))
+    page = min(max(1, page), pages)
+
+    if newest_first:
+        end = total - (page - 1) * page_size
+        positions = positions[max(0, end - page_size):end][::-1]
+    else:
+        positions = positions[(page - 1) * page_size:page * page_size]
+
+    if columns is not None:
+        columns = [column for column in columns if column in data]
+        return data.iloc[positions][columns], total, pages
+    return data.iloc[positions], total, pages
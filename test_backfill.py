@@ -0,0 +1,83 @@
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from backfill import backfill, merge_chunks, plan_chunks
+
+
+def test_plan_chunks_respects_the_limits_of_the_interval():
+    now = pd.Timestamp("2024-07-15 15:00")
+    chunks = plan_chunks("1m", "2024-01-01", now=now)
+    # 1m bars are served for the last 29 days, 7 days per request
+    assert chunks[0][0] == pd.Timestamp("2024-06-16")
+    assert chunks[-1][1] == pd.Timestamp("2024-07-16")
+    assert all(end - start <= pd.Timedelta(days=7) for start, end in chunks)
+    assert all(previous[1] == chunk[0] for previous, chunk in zip(chunks, chunks[1:]))
+    assert len(chunks) == 5
+
+    assert plan_chunks("5m", "2024-07-01", "2024-07-10", now=now) == [
+        (pd.Timestamp("2024-07-01"), pd.Timestamp("2024-07-10"))
+    ]
+    assert plan_chunks("1d", "2000-01-01", now=now) == [
+        (pd.Timestamp("2000-01-01"), pd.Timestamp("2024-07-16"))
+    ]
+    assert plan_chunks("5m", "2024-07-20", now=now) == []
+
+
+def make_chunk_fetch(calls, failures=None, delay=0.0):
+    # One bar per hour of every day in the chunk, the chunks overlap by a bar
+    lock = threading.Lock()
+    running = [0, 0]
+
+    def fetch(symbol, interval, start, end):
+        with lock:
+            calls.append((start, end))
+            running[0] += 1
+            running[1] = max(running)
+            fail = failures is not None and failures.get(start, 0) > 0
+            if fail:
+                failures[start] -= 1
+        try:
+            time.sleep(delay)
+            if fail:
+                raise ConnectionError(f"chunk {start:%Y-%m-%d} failed")
+            index = pd.date_range(start, end, freq="h", inclusive="both")
+            return pd.DataFrame({"Close": [float(start.day)] * len(index)}, index=index)
+        finally:
+            with lock:
+                running[0] -= 1
+
+    fetch.max_running = running
+    return fetch
+
+
+def test_backfill_fetches_chunks_concurrently_and_merges_them():
+    calls = []
+    start = pd.Timestamp.now().normalize() - pd.Timedelta(days=28)
+    fetch = make_chunk_fetch(calls, failures={start: 2}, delay=0.05)
+
+    data = backfill("AAPL", "1m", start, fetch=fetch, max_workers=2, backoff_seconds=0.01)
+
+    assert len(calls) == 5 + 2
+    assert fetch.max_running[1] == 2
+    assert data.index.is_monotonic_increasing
+    assert not data.index.duplicated().any()
+    assert data.index[0] == start
+    assert data.index[-1] == pd.Timestamp.now().normalize() + pd.Timedelta(days=1)
+    assert len(data) == 29 * 24 + 1
+    # The bar at a chunk boundary is taken from the later chunk
+    boundary = start + pd.Timedelta(days=7)
+    assert data.loc[boundary, "Close"] == float(boundary.day)
+
+
+def test_backfill_raises_when_a_chunk_keeps_failing():
+    start = pd.Timestamp.now().normalize() - pd.Timedelta(days=10)
+    fetch = make_chunk_fetch([], failures={start: 5})
+    with pytest.raises(ConnectionError):
+        backfill("AAPL", "1m", start, fetch=fetch, max_attempts=2, backoff_seconds=0.0)
+
+
+def test_merge_chunks_skips_empty_chunks():
+    assert merge_chunks([pd.DataFrame(), None]).empty
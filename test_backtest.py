@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+
+from backtest import backtest_long_signal, run_grid
+from core.indicators import calculate_indicators
+from core.sizing import calculate_position_size
+
+
+def make_bars(periods=1500, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0.0005, 0.015, periods)))
+    open_ = close * np.exp(rng.normal(0, 0.005, periods))
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.01, periods))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.01, periods))
+    return pd.DataFrame(
+        {
+            "Date": pd.bdate_range("2018-01-01", periods=periods),
+            "Open": open_,
+            "High": high,
+            "Low": low,
+            "Close": close,
+            "Adj Close": close,
+            "Volume": 1000,
+        }
+    )
+
+
+def reference_trades(data, account_balance, stop_lookback, max_holding):
+    # Straightforward per-bar simulation of the same rules
+    trades = []
+    long_signal = data["long_signal"].to_numpy()
+    signal_2 = data["signal_2"].to_numpy()
+    i = max(stop_lookback - 1, 1)
+    while i < len(data) - 1:
+        if not (long_signal[i] == 1 and long_signal[i - 1] == 0):
+            i += 1
+            continue
+        entry_bar = i + 1
+        entry_price = data["Open"].iloc[entry_bar]
+        stop = data["Low"].iloc[i - stop_lookback + 1 : i + 1].min()
+        quantity = calculate_position_size(entry_price, stop, account_balance)
+        if stop >= entry_price or quantity <= 0:
+            i += 1
+            continue
+        for bar in range(entry_bar, min(entry_bar + max_holding, len(data))):
+            if data["Low"].iloc[bar] <= stop:
+                exit_price = min(data["Open"].iloc[bar], stop)
+                break
+            if signal_2[bar] == 0 or bar == min(entry_bar + max_holding, len(data)) - 1:
+                exit_price = data["Close"].iloc[bar]
+                break
+        trades.append((entry_bar, bar, quantity, exit_price))
+        i = bar + 1
+    return trades
+
+
+def test_backtest_matches_per_bar_simulation():
+    data = calculate_indicators(make_bars(), 5, 20, 14)
+    result = backtest_long_signal(data, account_balance=100000.0, stop_lookback=5, max_holding=30)
+
+    expected = reference_trades(data, 100000.0, stop_lookback=5, max_holding=30)
+    trades = result["trades"]
+    assert len(trades) == len(expected) > 10
+    assert list(trades["entry_bar"]) == [trade[0] for trade in expected]
+    assert list(trades["exit_bar"]) == [trade[1] for trade in expected]
+    assert list(trades["quantity"]) == [trade[2] for trade in expected]
+    np.testing.assert_allclose(trades["exit_price"], [trade[3] for trade in expected])
+
+    stats = result["stats"]
+    assert stats["trades"] == len(expected)
+    assert np.isclose(result["equity"].iloc[-1], 100000.0 + trades["pnl"].sum())
+    assert stats["max_drawdown"] <= 0
+    assert 0 <= stats["win_rate"] <= 1
+
+
+def test_run_grid_returns_one_row_per_symbol_and_combination():
+    bars = {"AAA": make_bars(seed=1), "BBB": make_bars(seed=2)}
+    results = run_grid(bars, [3, 5], [20, 30], [14], max_workers=2)
+    assert len(results) == 8
+    assert set(results["symbol"]) == {"AAA", "BBB"}
+    assert {"win_rate", "expectancy", "max_drawdown"} <= set(results.columns)
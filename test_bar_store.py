@@ -0,0 +1,149 @@
+import pandas as pd
+
+from bar_store import append_bars, compact, first_bar, load_bars, read_bars, read_window, _part_files, partition_path
+
+
+def make_bars(start, periods):
+    index = pd.date_range(start, periods=periods, freq="D", name="Date")
+    close = pd.Series(range(periods), index=index, dtype=float) + 100.0
+    return pd.DataFrame(
+        {
+            "Open": close,
+            "High": close + 1,
+            "Low": close - 1,
+            "Close": close,
+            "Adj Close": close,
+            "Volume": 1000,
+        }
+    )
+
+
+def test_load_bars_fetches_history_once_then_only_the_tail(tmp_path):
+    calls = []
+    history = make_bars("2024-01-01", 10)
+
+    def fetch(symbol, interval, start):
+        calls.append(start)
+        if start is None:
+            return history.iloc[:8]
+        return history[history.index >= start]
+
+    first = load_bars("AAPL", "1d", fetch=fetch, root=tmp_path, refresh_seconds=0)
+    assert len(first) == 8
+    assert calls == [None]
+
+    second = load_bars("AAPL", "1d", fetch=fetch, root=tmp_path, refresh_seconds=0)
+    # The tail update starts at the last stored bar, which is re-fetched
+    assert calls[1] == history.index[7]
+    assert len(second) == 10
+    assert second.index.is_unique
+    pd.testing.assert_frame_equal(second, history, check_freq=False)
+
+
+def test_load_bars_skips_download_within_refresh_period(tmp_path):
+    calls = []
+
+    def fetch(symbol, interval, start):
+        calls.append(start)
+        return make_bars("2024-01-01", 5)
+
+    load_bars("MSFT", "1d", fetch=fetch, root=tmp_path, refresh_seconds=3600)
+    load_bars("MSFT", "1d", fetch=fetch, root=tmp_path, refresh_seconds=3600)
+    assert calls == [None]
+
+
+def test_load_bars_skips_download_after_an_empty_history(tmp_path):
+    calls = []
+
+    def fetch(symbol, interval, start):
+        calls.append(start)
+        return pd.DataFrame()
+
+    assert load_bars("DELISTED", "1d", fetch=fetch, root=tmp_path, refresh_seconds=3600).empty
+    assert load_bars("DELISTED", "1d", fetch=fetch, root=tmp_path, refresh_seconds=3600).empty
+    assert calls == [None]
+    # After the refresh period the history is downloaded again
+    load_bars("DELISTED", "1d", fetch=fetch, root=tmp_path, refresh_seconds=0)
+    assert calls == [None, None]
+
+
+def test_newer_bars_replace_stored_bars_and_compact_keeps_them(tmp_path):
+    bars = make_bars("2024-01-01", 5)
+    append_bars("AAPL", "1d", bars, root=tmp_path)
+
+    updated = bars.iloc[-1:].copy()
+    updated["Close"] = 999.0
+    append_bars("AAPL", "1d", updated, root=tmp_path)
+
+    assert read_bars("AAPL", "1d", root=tmp_path)["Close"].iloc[-1] == 999.0
+
+    compact("AAPL", "1d", root=tmp_path)
+    assert len(_part_files(partition_path("AAPL", "1d", tmp_path))) == 1
+    stored = read_bars("AAPL", "1d", root=tmp_path)
+    assert len(stored) == 5
+    assert stored["Close"].iloc[-1] == 999.0
+
+
+def test_read_bars_filters_by_date_range(tmp_path):
+    append_bars("AAPL", "1d", make_bars("2024-01-01", 10), root=tmp_path)
+    data = read_bars("AAPL", "1d", start="2024-01-03", end="2024-01-05", root=tmp_path)
+    assert list(data.index.day) == [3, 4, 5]
+
+
+def test_compact_read_returns_float32_prices_and_int32_volume(tmp_path):
+    bars = make_bars("2024-01-01", 10)
+    append_bars("AAPL", "1d", bars.iloc[:6], root=tmp_path)
+    append_bars("AAPL", "1d", bars.iloc[5:], root=tmp_path)
+
+    data = read_bars("AAPL", "1d", root=tmp_path, compact=True)
+    assert data["Close"].dtype == "float32"
+    assert data["Volume"].dtype == "int32"
+    pd.testing.assert_frame_equal(
+        data, read_bars("AAPL", "1d", root=tmp_path), check_dtype=False, check_freq=False
+    )
+
+
+def test_read_window_reads_the_last_bars_across_parts(tmp_path):
+    bars = make_bars("2024-01-01", 30)
+    append_bars("AAPL", "1d", bars.iloc[:20], root=tmp_path)
+    append_bars("AAPL", "1d", bars.iloc[19:], root=tmp_path)
+
+    window = read_window("AAPL", "1d", 5, root=tmp_path)
+    pd.testing.assert_frame_equal(window, bars.iloc[-5:], check_freq=False)
+
+    # The page before a loaded window spans both part files
+    earlier = read_window("AAPL", "1d", 15, end=window.index[0], root=tmp_path)
+    pd.testing.assert_frame_equal(earlier, bars.iloc[10:25], check_freq=False)
+
+    compact = read_window("AAPL", "1d", 15, end=window.index[0], root=tmp_path, compact=True)
+    assert compact["Close"].dtype == "float32"
+    pd.testing.assert_frame_equal(compact, earlier, check_dtype=False, check_freq=False)
+
+    # The history starts within the window
+    assert len(read_window("AAPL", "1d", 100, root=tmp_path)) == 30
+    assert read_window("AAPL", "1d", 5, end="2024-01-01", root=tmp_path).empty
+
+
+def test_first_bar_is_the_first_stored_bar(tmp_path):
+    bars = make_bars("2024-01-06", 30)
+    append_bars("AAPL", "1d", bars.iloc[10:], root=tmp_path)
+    append_bars("AAPL", "1d", bars.iloc[:12], root=tmp_path)
+
+    assert first_bar("AAPL", "1d", root=tmp_path) == pd.Timestamp("2024-01-06")
+    # 2024-01-06 is a Saturday
+    assert first_bar("AAPL", "1d", root=tmp_path, drop_weekends=True) == pd.Timestamp("2024-01-08")
+    assert first_bar("MSFT", "1d", root=tmp_path) is None
+
+
+def test_reads_without_stored_bars_return_empty_bars(tmp_path):
+    for data in [
+        read_bars("AAPL", "1d", root=tmp_path),
+        read_window("AAPL", "1d", 10, root=tmp_path),
+        load_bars("AAPL", "1d", fetch=lambda *args: pd.DataFrame(), root=tmp_path),
+    ]:
+        assert data.empty
+        assert isinstance(data.index, pd.DatetimeIndex)
+        assert list(data.columns) == ["Open", "High", "Low", "Close", "Adj Close", "Volume"]
+
+    compact = read_bars("AAPL", "1d", root=tmp_path, compact=True)
+    assert compact["Close"].dtype == "float32"
@@ -0,0 +1,108 @@
+import json
+import threading
+from datetime import date
+
+import pandas as pd
+
+import ticker_lookup
+from batch_plan import plan_trades, read_candidates
+from core.sizing import calculate_position_size
+
+
+def fake_lookups(monkeypatch):
+    calls = []
+    lock = threading.Lock()
+
+    def company_name(ticker_symbol, cache):
+        with lock:
+            calls.append(ticker_symbol)
+        if ticker_symbol == "FAIL":
+            raise ValueError("unknown ticker")
+        return f"{ticker_symbol} Inc."
+
+    monkeypatch.setattr(
+        ticker_lookup,
+        "LOOKUPS",
+        {
+            "company_name": company_name,
+            "earnings_date": lambda ticker_symbol, cache: (date(2024, 10, 31), True),
+            "ex_dividend_date": lambda ticker_symbol, cache: (True, date(2024, 8, 9), date(2024, 8, 12)),
+        },
+    )
+    return calls
+
+
+def test_read_candidates_from_csv_and_json(tmp_path):
+    csv_path = tmp_path / "candidates.csv"
+    csv_path.write_text("ticker,entry,stop,plan\n aapl ,190.123,185,Trail under EMA 20\nMSFT,410,400,\n")
+    json_path = tmp_path / "candidates.json"
+    json_path.write_text(json.dumps([{"ticker": "aapl", "entry": 190.12, "stop": 185}]))
+
+    candidates = read_candidates(str(csv_path))
+    assert candidates["ticker"].tolist() == ["AAPL", "MSFT"]
+    assert candidates["entry"].tolist() == [190.12, 410.0]
+    assert candidates["plan"].tolist() == ["Trail under EMA 20", ""]
+    assert candidates["validity"].tolist() == ["DAY", "DAY"]
+    assert read_candidates(str(json_path))["ticker"].tolist() == ["AAPL"]
+
+
+def test_plan_trades_sizes_and_builds_payloads(monkeypatch):
+    calls = fake_lookups(monkeypatch)
+    candidates = pd.DataFrame(
+        {
+            "ticker": ["AAPL", "TSLA", "AAPL", "FAIL", "MSFT"],
+            "entry": [190.12, 250.0, 191.0, 10.0, 400.0],
+            "stop": [185.0, 260.0, 186.0, 9.5, 400.0],
+            "plan": ["Trail under EMA 20", "", "", "", ""],
+            "reason": ["Breakout", "", "", "", ""],
+            "plan_b": ["", "", "", "", ""],
+            "order_type": ["STP/STP LMT"] * 5,
+            "validity": ["DAY", "GTC (Good Till Cancelled)", "DAY", "DAY", "DAY"],
+            "dividends": [0.0] * 5,
+            "date": ["2024-07-01", None, None, None, None],
+        }
+    )
+
+    plans = plan_trades(candidates, cache=None, database_id="db")
+
+    # Every ticker is looked up once
+    assert sorted(calls) == ["AAPL", "FAIL", "MSFT", "TSLA"]
+    assert [plan["quantity"] for plan in plans[:4]] == [
+        calculate_position_size(entry, stop, 100000.0)
+        for entry, stop in zip(candidates["entry"].tolist()[:4], candidates["stop"].tolist()[:4])
+    ]
+
+    aapl = plans[0]
+    properties = aapl["journal"]["properties"]
+    assert aapl["journal"]["parent"] == {"database_id": "db"}
+    assert properties["Symbol"]["title"][0]["text"]["content"] == "AAPL"
+    assert properties["Stock"]["rich_text"][0]["text"]["content"] == "AAPL Inc."
+    assert properties["Date"]["date"]["start"] == "2024-07-01"
+    assert properties["Earnings Date"]["date"]["start"] == "2024-10-31"
+    assert properties["Dividends Date"]["date"]["start"] == "2024-08-09"
+    assert properties["Trade Management"]["rich_text"][0]["text"]["content"] == "Trail under EMA 20"
+    assert aapl["order"] == {
+        "symbol": "AAPL",
+        "action": "BUY",
+        "quantity": aapl["quantity"],
+        "stop_price": 190.12,
+        "limit_price": 190.14,
+        "stop_loss_price": 185.0,
+        "tif": "DAY",
+        "transmit": False,
+    }
+
+    tsla = plans[1]
+    assert tsla["action"] == "Short"
+    assert tsla["order"]["action"] == "SELL"
+    assert tsla["order"]["limit_price"] == 249.98
+    assert tsla["order"]["tif"] == "GTC"
+
+    # A failed lookup is reported but the trade is still planned
+    assert plans[3]["errors"] == {"company_name": "unknown ticker"}
+    assert plans[3]["journal"] is not None
+
+    # An entry equal to the stop cannot be sized
+    assert plans[4]["quantity"] == 0
+    assert plans[4]["journal"] is None and plans[4]["order"] is None
+    assert "quantity" in plans[4]["errors"]
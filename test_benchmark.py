@@ -0,0 +1,50 @@
+import benchmark
+from bar_store import append_bars, read_bars
+from benchmark import compare, make_ohlcv, measure, run_benchmarks
+
+
+def test_make_ohlcv_is_consistent():
+    data = make_ohlcv(1000)
+    assert len(data) == 1000
+    assert (data["High"] >= data[["Open", "Close"]].max(axis=1)).all()
+    assert (data["Low"] <= data[["Open", "Close"]].min(axis=1)).all()
+
+
+def test_compare_reports_regressions_beyond_tolerance():
+    baseline = {
+        "a": {"seconds": 1.0, "peak_mb": 10.0},
+        "b": {"seconds": 1.0, "peak_mb": 10.0},
+    }
+    results = {
+        "a": {"seconds": 1.2, "peak_mb": 10.0},
+        "b": {"seconds": 1.0, "peak_mb": 20.0},
+        "c": {"seconds": 5.0, "peak_mb": 50.0},
+    }
+    regressions = compare(results, baseline, tolerance=0.25)
+    assert len(regressions) == 1
+    assert regressions[0].startswith("b: peak_mb")
+
+
+def test_compact_read_halves_the_peak_memory(tmp_path):
+    append_bars("BENCH", "1m", make_ohlcv(300_000), root=tmp_path)
+
+    def read(compact):
+        return read_bars("BENCH", "1m", root=tmp_path, compact=compact, drop_weekends=True)
+
+    _, full_peak = measure(lambda: read(False), repeat=1)
+    _, compact_peak = measure(lambda: read(True), repeat=1)
+    assert compact_peak <= 0.5 * full_peak
+
+
+def test_only_prepares_the_selected_benchmarks(monkeypatch):
+    built = []
+
+    def make_bars(rows, seed=0, freq="min"):
+        built.append(rows)
+        return make_ohlcv(rows, seed, freq)
+
+    monkeypatch.setattr(benchmark, "make_ohlcv", make_bars)
+
+    results = run_benchmarks([1_000, 2_000], repeat=1, only=["calculate_indicators[2000]"])
+    assert list(results) == ["calculate_indicators[2000]"]
+    assert built == [2_000]
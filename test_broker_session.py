@@ -0,0 +1,154 @@
+import asyncio
+import itertools
+from types import SimpleNamespace
+
+import pytest
+from eventkit import Event
+
+from broker_session import BrokerSession
+
+
+class MockTWS:
+    # Stand-in for ib_async.IB that acknowledges every order after a short delay
+    instances = []
+
+    def __init__(self):
+        self.connected = False
+        self.qualified = []
+        self.placed = []
+        self.cancelled = []
+        self.openOrderEvent = Event("openOrderEvent")
+        self.client = SimpleNamespace(getReqId=itertools.count(100).__next__)
+        MockTWS.instances.append(self)
+
+    async def connectAsync(self, host, port, clientId, timeout):
+        await asyncio.sleep(0.01)
+        self.connected = True
+        self.client_id = clientId
+
+    def isConnected(self):
+        return self.connected
+
+    def disconnect(self):
+        self.connected = False
+
+    async def qualifyContractsAsync(self, contract):
+        self.qualified.append(contract.symbol)
+        contract.conId = 265598
+        return [contract]
+
+    def placeOrder(self, contract, order):
+        trade = SimpleNamespace(
+            contract=contract,
+            order=order,
+            orderStatus=SimpleNamespace(status="PreSubmitted"),
+            statusEvent=Event("statusEvent"),
+        )
+        self.placed.append(trade)
+        asyncio.get_running_loop().call_later(0.005, self.openOrderEvent.emit, trade)
+        return trade
+
+    def cancelOrder(self, order):
+        self.cancelled.append(order.orderId)
+
+
+def test_orders_reuse_connections_and_qualified_contracts():
+    MockTWS.instances = []
+    session = BrokerSession(client_ids=(11, 12), timeout=2, ib_factory=MockTWS)
+    try:
+        assert session.warm("aapl").result(2).conId == 265598
+
+        for _ in range(4):
+            result = session.place_stop_limit_with_stop_loss(
+                "AAPL", "BUY", 10, stop_price=100.0, limit_price=100.02, stop_loss_price=95.0
+            )
+            assert result["status"] == "PreSubmitted"
+            assert result["acknowledged"]
+            assert result["latency_ms"] > 0
+
+        assert len(MockTWS.instances) == 2
+        assert sorted(ib.client_id for ib in MockTWS.instances) == [11, 12]
+        assert sum(len(ib.qualified) for ib in MockTWS.instances) == 1
+
+        trades = [trade for ib in MockTWS.instances for trade in ib.placed]
+        assert len(trades) == 8
+        parents = [trade.order for trade in trades if trade.order.parentId == 0]
+        stop_losses = [trade.order for trade in trades if trade.order.parentId != 0]
+        assert {order.action for order in parents} == {"BUY"}
+        assert {order.action for order in stop_losses} == {"SELL"}
+        assert {order.auxPrice for order in stop_losses} == {95.0}
+        assert not any(order.transmit for order in parents + stop_losses)
+
+        stats = session.latency_stats()
+        assert stats["orders"] == 8
+        assert stats["p95_ms"] < 1000
+    finally:
+        session.close()
+
+
+def test_failed_connection_is_retried_on_next_warm():
+    attempts = []
+
+    class FlakyTWS(MockTWS):
+        async def connectAsync(self, host, port, clientId, timeout):
+            attempts.append(clientId)
+            if len(attempts) == 1:
+                raise ConnectionRefusedError("TWS not running")
+            await super().connectAsync(host, port, clientId, timeout)
+
+    session = BrokerSession(client_ids=(11,), timeout=2, ib_factory=FlakyTWS)
+    try:
+        assert session.warm("MSFT").exception(2) is not None
+        assert session.contract("MSFT").symbol == "MSFT"
+        assert len(attempts) == 2
+    finally:
+        session.close()
+
+
+def test_unacknowledged_orders_are_both_placed():
+    class SilentTWS(MockTWS):
+        # TWS may not acknowledge orders that are not transmitted
+        def placeOrder(self, contract, order):
+            trade = SimpleNamespace(
+                contract=contract,
+                order=order,
+                orderStatus=SimpleNamespace(status="PendingSubmit"),
+                statusEvent=Event("statusEvent"),
+            )
+            self.placed.append(trade)
+            return trade
+
+    session = BrokerSession(client_ids=(11,), timeout=0.2, ib_factory=SilentTWS)
+    try:
+        result = session.place_stop_limit_with_stop_loss(
+            "AAPL", "BUY", 10, stop_price=100.0, limit_price=100.02, stop_loss_price=95.0
+        )
+        ib = session._connections[0]
+        assert not result["acknowledged"]
+        assert result["latency_ms"] is None
+        assert [trade.order.orderId for trade in ib.placed] == [
+            result["parent_order_id"],
+            result["stop_loss_order_id"],
+        ]
+        assert ib.cancelled == []
+    finally:
+        session.close()
+
+
+def test_parent_is_cancelled_if_the_stop_loss_cannot_be_placed():
+    class RejectingTWS(MockTWS):
+        def placeOrder(self, contract, order):
+            if order.parentId:
+                raise ConnectionError("TWS disconnected")
+            return super().placeOrder(contract, order)
+
+    session = BrokerSession(client_ids=(11,), timeout=2, ib_factory=RejectingTWS)
+    try:
+        with pytest.raises(ConnectionError):
+            session.place_stop_limit_with_stop_loss(
+                "AAPL", "BUY", 10, stop_price=100.0, limit_price=100.02, stop_loss_price=95.0
+            )
+        ib = session._connections[0]
+        assert ib.cancelled == [ib.placed[0].order.orderId]
+    finally:
+        session.close()
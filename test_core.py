@@ -0,0 +1,47 @@
+import subprocess
+import sys
+
+import core
+
+HEAVY_MODULES = ["numpy", "pandas", "talib", "numba", "yfinance", "streamlit", "plotly", "requests", "pyfinsights"]
+
+IMPORT_CORE = f"""
+import sys, time
+start = time.perf_counter()
+import core.indicators, core.payloads, core.sizing
+from core import calculate_position_size, build_new_page_data, IndicatorCache
+seconds = time.perf_counter() - start
+heavy = [name for name in {HEAVY_MODULES!r} if name in sys.modules]
+print(seconds, ",".join(heavy))
+"""
+
+
+def test_core_imports_no_heavy_dependencies_within_budget():
+    # A fresh interpreter, like a worker process or the container on start
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_CORE], capture_output=True, text=True, check=True
+    ).stdout.split()
+    seconds = float(output[0])
+    heavy = output[1] if len(output) > 1 else ""
+
+    assert heavy == ""
+    assert seconds < core.IMPORT_BUDGET_SECONDS
+
+
+def test_lazy_exports_resolve_to_the_core_modules():
+    from core.sizing import calculate_position_size
+
+    assert core.calculate_position_size is calculate_position_size
+    assert core.calculate_position_size(100.0, 90.0, 10000.0, 1.0, 10.0) == 10
+
+
+def test_build_order_maps_the_validity_and_the_direction():
+    order = core.build_order("AAPL", 10, 100.0, 95.0, 0.02, "GTC (Good Till Cancelled)")
+    assert (order["action"], order["limit_price"], order["stop_loss_price"], order["tif"]) == (
+        "BUY",
+        100.02,
+        95.0,
+        "GTC",
+    )
+    order = core.build_order("AAPL", 10, 100.0, 105.0, 0.02, "DAY")
+    assert (order["action"], order["limit_price"], order["tif"]) == ("SELL", 99.98, "DAY")
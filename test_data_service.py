@@ -0,0 +1,83 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from data_service import DEFAULT_MAX_CONCURRENCY, DataService, upstream_slot
+
+
+def test_concurrent_identical_calls_share_one_request():
+    service = DataService()
+    calls = []
+    release = threading.Event()
+
+    def fetch(symbol):
+        calls.append(symbol)
+        release.wait(5)
+        return {"symbol": symbol}
+
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        futures = [executor.submit(service.call, ("bars", "AAPL"), fetch, "AAPL") for _ in range(10)]
+        # Wait until all callers have joined the request in flight
+        while service.stats()["calls"] < 10:
+            time.sleep(0.01)
+        release.set()
+        results = [future.result() for future in futures]
+
+    assert calls == ["AAPL"]
+    assert all(result is results[0] for result in results)
+    stats = service.stats()
+    assert (stats["upstream"], stats["coalesced"], stats["in_flight"]) == (1, 9, 0)
+
+    # A later call is a new request
+    assert service.call(("bars", "AAPL"), fetch, "AAPL") == {"symbol": "AAPL"}
+    assert calls == ["AAPL", "AAPL"]
+
+
+def test_only_network_requests_are_limited():
+    service = DataService()
+    lock = threading.Lock()
+    running = [0, 0]
+    release = threading.Event()
+
+    def download(symbol):
+        with upstream_slot():
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+            release.wait(5)
+            with lock:
+                running[0] -= 1
+        return symbol
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        futures = [executor.submit(service.call, symbol, download, symbol) for symbol in "ABCDEFGH"]
+        while running[0] < DEFAULT_MAX_CONCURRENCY:
+            time.sleep(0.01)
+        # A request without a download, e.g. a local read, does not wait for a slot
+        assert service.call("local", lambda: "read") == "read"
+        release.set()
+        assert [future.result() for future in futures] == list("ABCDEFGH")
+    assert running[1] == DEFAULT_MAX_CONCURRENCY
+
+
+def test_errors_are_shared_and_not_cached():
+    service = DataService()
+    release = threading.Event()
+
+    def fetch():
+        release.wait(5)
+        raise ConnectionError("rate limited")
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        futures = [executor.submit(service.call, "info", fetch) for _ in range(3)]
+        while service.stats()["calls"] < 3:
+            time.sleep(0.01)
+        release.set()
+        for future in futures:
+            with pytest.raises(ConnectionError):
+                future.result()
+
+    assert service.stats()["errors"] == 1
+    assert service.call("info", lambda: "ok") == "ok"
@@ -0,0 +1,63 @@
+from datetime import date, datetime, timedelta
+
+from event_calendar import EventCalendar
+from metadata_cache import MetadataCache
+
+
+def make_fetchers(calls, earnings, dividends):
+    def fetch_earnings(symbol):
+        calls.append(("earnings_date", symbol))
+        if symbol == "BROKEN":
+            raise ValueError("no earnings")
+        return earnings.get(symbol, [None, False])
+
+    def fetch_dividends(symbol):
+        calls.append(("ex_dividend_date", symbol))
+        return dividends.get(symbol, [False, None, None])
+
+    return {"earnings_date": fetch_earnings, "ex_dividend_date": fetch_dividends}
+
+
+def test_refresh_only_fetches_stale_events_and_upcoming_queries_the_index(tmp_path):
+    today = date.today()
+    earnings = {
+        "AAPL": [datetime.combine(today + timedelta(days=3), datetime.min.time()), True],
+        "MSFT": [(today + timedelta(days=20)).isoformat(), False],
+        "NVDA": [today + timedelta(days=1), False],
+    }
+    dividends = {"MSFT": [True, today + timedelta(days=9), today + timedelta(days=5)]}
+    calls = []
+    calendar = EventCalendar(path=str(tmp_path / "calendar.sqlite"))
+    cache = MetadataCache(path=str(tmp_path / "metadata.sqlite"))
+    symbols = ["aapl", "MSFT", "NVDA", "KO", "BROKEN"]
+
+    fetched, errors = calendar.refresh(
+        symbols, fetchers=make_fetchers(calls, earnings, dividends), cache=cache, max_workers=4
+    )
+    assert fetched == 9
+    assert errors == {"BROKEN": {"earnings_date": "no earnings"}}
+    assert cache.get("earnings_date", "NVDA") == (True, [today + timedelta(days=1), False])
+
+    upcoming = calendar.upcoming(7, symbols)
+    assert list(upcoming) == ["NVDA", "AAPL"]
+    assert upcoming["AAPL"] == (today + timedelta(days=3), True)
+    assert calendar.upcoming(7, ["AAPL", "MSFT"], kind="ex_dividend_date") == {
+        "MSFT": (today + timedelta(days=5), None)
+    }
+    assert list(calendar.upcoming(30)) == ["NVDA", "AAPL", "MSFT"]
+
+    # Only the failed event is fetched again
+    calls.clear()
+    fetched, errors = calendar.refresh(symbols, fetchers=make_fetchers(calls, earnings, dividends))
+    assert calls == [("earnings_date", "BROKEN")]
+
+    # Events in the past are stale
+    calendar.store("NVDA", "earnings_date", [today - timedelta(days=1), True])
+    assert calendar.stale(symbols, "earnings_date") == ["NVDA", "BROKEN"]
+    assert "NVDA" not in calendar.upcoming(7, symbols)
+
+
+def test_expired_events_are_stale(tmp_path):
+    calendar = EventCalendar(path=str(tmp_path / "calendar.sqlite"), max_age={"earnings_date": 0})
+    calendar.store("aapl", "earnings_date", [None, False])
+    assert calendar.stale(["AAPL"], "earnings_date") == ["AAPL"]
@@ -0,0 +1,169 @@
+import numpy as np
+import pandas as pd
+
+from bar_store import compact_bars
+from core.indicators import (
+    FUSED_FLOAT_COLUMNS,
+    IncrementalIndicators,
+    IndicatorCache,
+    calculate_indicators,
+    warmup_bars,
+)
+
+INDICATOR_COLUMNS = ["EMA_5", "EMA_20", "RSI_14", "SMA_RSI_14"]
+SIGNAL_COLUMNS = [
+    "signal_1",
+    "signal_2",
+    "signal_3",
+    "point_pos_signal_1",
+    "point_pos_signal_2",
+    "long_signal",
+]
+
+
+def make_bars(periods=500, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 1, periods))
+    adj_close = close * 0.98
+    return pd.DataFrame({"Close": close, "Adj Close": adj_close})
+
+
+def test_incremental_indicators_match_calculate_indicators():
+    data = make_bars()
+    expected = calculate_indicators(data.copy(), 5, 20, 14)
+
+    engine = IncrementalIndicators(5, 20, 14)
+    rows = pd.DataFrame(
+        [engine.update(close, adj_close) for close, adj_close in zip(data["Close"], data["Adj Close"])]
+    )
+
+    for column in INDICATOR_COLUMNS:
+        np.testing.assert_allclose(rows[column], expected[column], rtol=1e-9, equal_nan=True)
+    for column in SIGNAL_COLUMNS:
+        assert (rows[column] == expected[column]).all(), column
+
+
+def test_replace_last_updates_the_forming_bar():
+    data = make_bars(100)
+    engine = IncrementalIndicators.from_history(data.iloc[:-1])
+    engine.update(150.0, 150.0)
+    row = engine.update(data["Close"].iloc[-1], data["Adj Close"].iloc[-1], replace_last=True)
+
+    expected = calculate_indicators(data.copy(), 5, 20, 14).iloc[-1]
+    for column in INDICATOR_COLUMNS:
+        assert np.isclose(row[column], expected[column])
+    for column in SIGNAL_COLUMNS:
+        assert row[column] == expected[column]
+
+
+def test_warmup_bars_match_the_full_history_within_tolerance():
+    rng = np.random.default_rng(1)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, 5000)))
+    data = pd.DataFrame({"Close": close, "Adj Close": close})
+    full = calculate_indicators(data.copy(), 5, 20, 14)
+
+    warmup = warmup_bars(5, 20, 14)
+    for end in range(1000, 5000, 500):
+        window = calculate_indicators(data.iloc[end - 100 - warmup : end].copy(), 5, 20, 14)
+        for column in INDICATOR_COLUMNS:
+            np.testing.assert_allclose(
+                window[column].iloc[-100:], full[column].iloc[end - 100 : end], rtol=1e-5, err_msg=column
+            )
+
+
+def test_indicator_cache_only_recalculates_changed_windows():
+    data = make_bars()
+    cache = IndicatorCache()
+
+    first = calculate_indicators(data.copy(), 5, 20, 14, cache=cache, key=("AAPL", "1d"))
+    misses = cache.misses
+    second = calculate_indicators(data.copy(), 5, 20, 7, cache=cache, key=("AAPL", "1d"))
+
+    # Only the RSI and the RSI signals are recalculated
+    assert cache.misses == misses + 2
+    pd.testing.assert_frame_equal(first, calculate_indicators(data.copy(), 5, 20, 14))
+    pd.testing.assert_frame_equal(second, calculate_indicators(data.copy(), 5, 20, 7))
+
+    # New bars change the fingerprint
+    calculate_indicators(make_bars(501), 5, 20, 7, cache=cache, key=("AAPL", "1d"))
+    assert cache.misses == misses + 2 + 5
+
+
+def test_indicator_cache_evicts_least_recently_used_columns():
+    data = make_bars()
+    cache = IndicatorCache(max_bytes=10 * len(data) * 8)
+    for rsi_window in range(2, 12):
+        calculate_indicators(data.copy(), 5, 20, rsi_window, cache=cache, key=("AAPL", "1d"))
+    assert cache.nbytes <= cache.max_bytes
+    assert len(cache) < 2 + 10 * 2
+
+
+def make_ohlcv(periods=2000, seed=0):
+    data = make_bars(periods, seed)
+    data["Open"] = data["Close"].shift(1).fillna(data["Close"].iloc[0])
+    data["High"] = data[["Open", "Close"]].max(axis=1) + 0.5
+    data["Low"] = data[["Open", "Close"]].min(axis=1) - 0.5
+    data["Volume"] = np.arange(periods, dtype=np.int64) * 1000
+    return data
+
+
+def test_compact_mode_halves_the_frame():
+    data = make_ohlcv()
+    expected = calculate_indicators(data.copy(), 5, 20, 14)
+    compact = calculate_indicators(data.copy(), 5, 20, 14, compact=True)
+
+    assert list(compact.columns) == list(expected.columns)
+    for column in SIGNAL_COLUMNS:
+        assert compact[column].dtype == np.int8
+        # Signals may only flip where float32 cannot tell the values apart
+        assert (compact[column] != expected[column]).mean() < 0.01, column
+    for column in INDICATOR_COLUMNS + ["Open", "Close"]:
+        assert compact[column].dtype == np.float32
+        np.testing.assert_allclose(compact[column], expected[column], rtol=1e-5, equal_nan=True)
+    assert compact.memory_usage(deep=True).sum() <= expected.memory_usage(deep=True).sum() / 2
+
+
+def test_compact_bars_keeps_float64_where_float32_loses_cents():
+    data = make_ohlcv(10) + 500_000.0
+    data["Volume"] = np.int64(2**40)
+    compact_bars(data)
+    assert data["Close"].dtype == np.float64
+    assert data["Volume"].dtype == np.int64
+
+
+def test_compact_mode_has_its_own_cache_entries():
+    data = make_ohlcv(500)
+    cache = IndicatorCache()
+    calculate_indicators(data.copy(), 5, 20, 14, cache=cache, key=("AAPL", "1d"))
+    compact = calculate_indicators(data.copy(), 5, 20, 14, cache=cache, key=("AAPL", "1d"), compact=True)
+    assert compact["EMA_5"].dtype == np.float32
+    assert compact["signal_1"].dtype == np.int8
+
+
+def test_fused_backend_matches_talib_backend():
+    flat = make_bars(300, seed=3)
+    # In a flat stretch the RSI stays constant and equals its SMA, the signal
+    # of such a tie depends on the last bit of both
+    flat.loc[100:140, ["Close", "Adj Close"]] = 100.0
+    for windows in ((5, 20, 14), (3, 8, 7), (12, 26, 2)):
+        for data, columns in ((make_bars(), None), (flat, FUSED_FLOAT_COLUMNS)):
+            expected = calculate_indicators(data.copy(), *windows)
+            fused = calculate_indicators(data.copy(), *windows, backend="fused")
+            columns = list(expected.columns) if columns is None else columns
+            pd.testing.assert_frame_equal(
+                fused[columns], expected[columns], check_exact=False, rtol=1e-9
+            )
+
+
+def test_fused_backend_is_cached_and_compact():
+    data = make_bars()
+    cache = IndicatorCache()
+    calculate_indicators(data.copy(), 5, 20, 14, cache=cache, key=("AAPL", "1d"), backend="fused")
+    compact = calculate_indicators(
+        data.copy(), 5, 20, 14, cache=cache, key=("AAPL", "1d"), compact=True, backend="fused"
+    )
+    again = calculate_indicators(data.copy(), 5, 20, 14, cache=cache, key=("AAPL", "1d"), backend="fused")
+    assert (cache.hits, cache.misses) == (1, 2)
+    assert compact["EMA_5"].dtype == np.float32
+    assert compact["long_signal"].dtype == np.int8
+    pd.testing.assert_frame_equal(again, calculate_indicators(data.copy(), 5, 20, 14))
@@ -0,0 +1,123 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from core.indicators import calculate_indicators, warmup_bars
+from live_bars import LiveBars, LiveFeed, replay_ticks
+from resample import resample_bars
+
+
+def make_ticks(count=3000, seed=0):
+    # One tick every 7 seconds from the session open on
+    rng = np.random.default_rng(seed)
+    times = pd.Timestamp("2024-01-02 09:30", tz="America/New_York") + pd.to_timedelta(
+        np.arange(count) * 7, unit="s"
+    )
+    prices = 100 + np.cumsum(rng.normal(0, 0.05, count))
+    sizes = rng.integers(1, 100, count).astype(float)
+    return list(zip(times, prices, sizes))
+
+
+def make_history(count, seed=0):
+    # One minute bars from the session open on, with a random walk close
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 0.1, count))
+    return pd.DataFrame(
+        {"Open": close, "High": close + 0.1, "Low": close - 0.1, "Close": close, "Adj Close": close, "Volume": 10.0},
+        index=pd.date_range("2024-01-02 09:30", periods=count, freq="min", tz="America/New_York", name="Date"),
+    )
+
+
+def test_ticks_build_session_aligned_bars_with_indicators():
+    ticks = make_ticks()
+    bars = LiveBars("5m", capacity=1000)
+    for tick in ticks:
+        bars.on_tick(*tick)
+    frame = bars.frame()
+
+    # Every tick is a one tick bar, resampled like the stored bars
+    trades = pd.DataFrame(ticks, columns=["Date", "Close", "Volume"]).set_index("Date")
+    trades["Open"] = trades["High"] = trades["Low"] = trades["Close"]
+    expected = resample_bars(trades, "5m")
+    assert frame["Date"].tolist() == expected.index.tolist()
+    for column in ["Open", "High", "Low", "Close", "Volume"]:
+        np.testing.assert_allclose(frame[column], expected[column])
+
+    # Replacing the forming bar per tick ends with the indicators of the closed bars
+    indicators = calculate_indicators(frame[["Close", "Adj Close"]].copy(), 5, 20, 14)
+    for column in ["EMA_5", "EMA_20", "RSI_14", "SMA_RSI_14"]:
+        np.testing.assert_allclose(frame[column], indicators[column], rtol=1e-9, equal_nan=True)
+    for column in ["signal_1", "signal_2", "signal_3", "long_signal"]:
+        assert (frame[column] == indicators[column]).all(), column
+
+
+def test_ring_buffer_keeps_the_newest_bars():
+    bars = LiveBars("1m", capacity=10)
+    for tick in make_ticks(600):
+        bars.on_tick(*tick)
+    frame = bars.frame()
+
+    assert len(frame) == 10
+    assert frame["Date"].is_monotonic_increasing
+    assert frame["Date"].iloc[-1] == bars.last_time
+    # A tick of an older bar is ignored
+    assert bars.on_tick(frame["Date"].iloc[0], 1.0) is None
+
+
+def test_live_bars_continue_the_history():
+    history = pd.DataFrame(
+        {"Open": 100.0, "High": 101.0, "Low": 99.0, "Close": 100.5, "Volume": 10.0},
+        index=pd.date_range("2024-01-02 09:30", periods=30, freq="min"),
+    )
+    bars = LiveBars("1m", capacity=50, history=history)
+    row, new_bar = bars.on_tick(pd.Timestamp("2024-01-02 09:59:30"), 102.0, 5.0)
+
+    assert not new_bar
+    assert (row["High"], row["Close"], row["Volume"]) == (102.0, 102.0, 15.0)
+    row, new_bar = bars.on_tick(pd.Timestamp("2024-01-02 10:00:01"), 101.0, 1.0)
+    assert new_bar
+    assert len(bars) == 31
+
+
+def test_live_feed_replays_a_file_and_drains_changed_bars(tmp_path):
+    path = tmp_path / "ticks.csv"
+    pd.DataFrame(make_ticks(200), columns=["timestamp", "price", "size"]).to_csv(path, index=False)
+
+    feed = LiveFeed(LiveBars("1m", capacity=100), replay_ticks(path)).start()
+    deadline = time.monotonic() + 5
+    while feed.running and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert feed.error is None
+    assert feed.ticks == 200
+    changed = feed.drain()
+    # Every bar once, in its latest version
+    assert [row["Date"] for row in changed] == feed.frame()["Date"].tolist()
+    assert changed[-1]["Close"] == feed.frame()["Close"].iloc[-1]
+    assert feed.drain() == []
+
+
+def test_warmed_up_buffer_matches_the_full_history():
+    history = calculate_indicators(make_history(300), 5, 20, 14)
+    capacity = 50
+    bars = LiveBars("1m", capacity, history.iloc[-(capacity + warmup_bars(5, 20, 14)) :])
+    frame = bars.frame()
+
+    assert len(frame) == capacity
+    assert frame["Date"].tolist() == history.index[-capacity:].tolist()
+    for column in ["EMA_5", "EMA_20", "RSI_14", "SMA_RSI_14"]:
+        np.testing.assert_allclose(frame[column], history[column].iloc[-capacity:], rtol=1e-5)
+
+
+def test_tz_naive_ticks_continue_tz_aware_history():
+    history = make_history(30)
+    bars = LiveBars("1m", capacity=50, history=history)
+
+    row, new_bar = bars.on_tick(pd.Timestamp("2024-01-02 09:59:30"), 102.0, 5.0)
+    assert not new_bar
+    assert row["Date"] == history.index[-1]
+    # The same time given in UTC
+    row, new_bar = bars.on_tick(pd.Timestamp("2024-01-02 15:00:01", tz="UTC"), 101.0, 1.0)
+    assert new_bar
+    assert row["Date"] == pd.Timestamp("2024-01-02 10:00", tz="America/New_York")
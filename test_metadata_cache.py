@@ -0,0 +1,44 @@
+from datetime import date, datetime
+
+from metadata_cache import MetadataCache
+
+
+def test_get_or_fetch_caches_values_and_counts_hits(tmp_path):
+    cache = MetadataCache(str(tmp_path / "cache.sqlite"))
+    calls = []
+
+    def fetch(symbol):
+        calls.append(symbol)
+        return [date(2024, 10, 31), True]
+
+    assert cache.get_or_fetch("earnings_date", "aapl", fetch) == [date(2024, 10, 31), True]
+    assert cache.get_or_fetch("earnings_date", "AAPL", fetch) == [date(2024, 10, 31), True]
+    assert calls == ["aapl"]
+    assert cache.stats() == {"earnings_date": {"hits": 1, "misses": 1}}
+
+
+def test_cache_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    MetadataCache(path).set("ex_dividend_date", "KO", [True, datetime(2024, 11, 29, 9, 30), None])
+    assert MetadataCache(path).get("ex_dividend_date", "KO") == (
+        True,
+        [True, datetime(2024, 11, 29, 9, 30), None],
+    )
+
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = MetadataCache(str(tmp_path / "cache.sqlite"), ttl={"company_name": 0})
+    cache.set("company_name", "AAPL", "Apple Inc.")
+    assert cache.get("company_name", "AAPL") == (False, None)
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = MetadataCache(str(tmp_path / "cache.sqlite"), max_entries=2)
+    cache.set("company_name", "AAPL", "Apple Inc.")
+    cache.set("company_name", "MSFT", "Microsoft Corporation")
+    cache.get("company_name", "AAPL")
+    cache.set("company_name", "NVDA", "NVIDIA Corporation")
+
+    assert cache.get("company_name", "AAPL") == (True, "Apple Inc.")
+    assert cache.get("company_name", "MSFT") == (False, None)
+    assert cache.get("company_name", "NVDA") == (True, "NVIDIA Corporation")
@@ -0,0 +1,135 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from notion_journal import FAILED, QUEUED, SAVED, NotionJournalWriter
+
+
+class NotionStandIn(BaseHTTPRequestHandler):
+    # Local stand-in for the Notion pages endpoint, answers with the queued responses
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server = self.server
+        with server.lock:
+            server.received.append((self.headers["Authorization"], payload))
+            status, headers, *body = server.responses.pop(0) if server.responses else (200, {})
+        # A queued response may come with its own body
+        body = body[0] if body else json.dumps(
+            {"id": f"page-{len(server.received)}"} if status == 200 else {"status": status}
+        )
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def notion():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), NotionStandIn)
+    server.lock = threading.Lock()
+    server.received = []
+    server.responses = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_writer(notion, path):
+    return NotionJournalWriter(
+        headers={"Authorization": "Bearer secret", "Content-Type": "application/json"},
+        url=f"http://127.0.0.1:{notion.server_address[1]}/v1/pages",
+        path=str(path),
+        requests_per_second=100,
+        backoff_seconds=0.01,
+    )
+
+
+def test_entries_are_saved_and_rate_limits_are_retried(notion, tmp_path):
+    notion.responses = [(429, {"Retry-After": "0.1"}), (502, {})]
+    writer = make_writer(notion, tmp_path / "journal.sqlite").start()
+
+    entry_ids = [writer.enqueue({"properties": {"Symbol": symbol}}) for symbol in ["AAPL", "MSFT", "NVDA"]]
+    assert writer.flush(timeout=10)
+    writer.stop()
+
+    statuses = [writer.status(entry_id) for entry_id in entry_ids]
+    assert [status["status"] for status in statuses] == [SAVED] * 3
+    assert sum(status["attempts"] for status in statuses) == 5
+    assert all(status["page_id"] for status in statuses)
+    saved_symbols = {payload["properties"]["Symbol"] for _, payload in notion.received}
+    assert saved_symbols == {"AAPL", "MSFT", "NVDA"}
+    assert {authorization for authorization, _ in notion.received} == {"Bearer secret"}
+
+
+def test_client_errors_fail_without_retry(notion, tmp_path):
+    notion.responses = [(400, {})]
+    writer = make_writer(notion, tmp_path / "journal.sqlite").start()
+
+    entry_id = writer.enqueue({"properties": {}})
+    assert writer.flush(timeout=10)
+    writer.stop()
+
+    status = writer.status(entry_id)
+    assert status["status"] == FAILED
+    assert status["attempts"] == 1
+    assert status["last_error"].startswith("400")
+
+
+def test_queued_entries_survive_a_restart(notion, tmp_path):
+    path = tmp_path / "journal.sqlite"
+    entry_id = make_writer(notion, path).enqueue({"properties": {"Symbol": "AAPL"}})
+    assert make_writer(notion, path).status(entry_id)["status"] == QUEUED
+    assert notion.received == []
+
+    writer = make_writer(notion, path).start()
+    assert writer.flush(timeout=10)
+    writer.stop()
+    assert writer.status(entry_id)["status"] == SAVED
+    assert len(notion.received) == 1
+
+
+def test_unexpected_errors_are_retried_then_fail(notion, tmp_path, monkeypatch, caplog):
+    writer = make_writer(notion, tmp_path / "journal.sqlite")
+    writer.max_attempts = 3
+
+    def post(*args, **kwargs):
+        raise ValueError("invalid response body")
+
+    monkeypatch.setattr(writer.session, "post", post)
+    writer.start()
+    entry_id = writer.enqueue({"properties": {}})
+    assert writer.flush(timeout=10)
+    # The worker keeps running after the errors
+    assert writer._thread.is_alive()
+    writer.stop()
+
+    status = writer.status(entry_id)
+    assert status["status"] == FAILED
+    assert status["attempts"] == 3
+    assert status["last_error"] == "ValueError: invalid response body"
+    assert "Sending journal entry" in caplog.text
+
+
+def test_saved_pages_with_unreadable_responses_are_not_sent_again(notion, tmp_path):
+    notion.responses = [(200, {}, "<html>Bad gateway</html>")]
+    writer = make_writer(notion, tmp_path / "journal.sqlite").start()
+
+    entry_id = writer.enqueue({"properties": {}})
+    assert writer.flush(timeout=10)
+    writer.stop()
+
+    status = writer.status(entry_id)
+    assert status["status"] == SAVED
+    assert status["page_id"] is None
+    assert status["last_error"].startswith("Saved, unreadable response")
+    assert len(notion.received) == 1
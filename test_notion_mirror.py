@@ -0,0 +1,203 @@
+import json
+import threading
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from core.payloads import build_new_page_data
+from core.sizing import cap_position_size
+from notion_mirror import NotionMirror, parse_trade
+
+
+def make_page(page_id, symbol, edited, quantity=10, entry=100.0, stop=95.0, action="Long", **extra):
+    properties = {
+        "Symbol": {"type": "title", "title": [{"plain_text": symbol}]},
+        "Action": {"type": "select", "select": {"name": action}},
+        "Quantity": {"type": "number", "number": quantity},
+        "Entry Price": {"type": "number", "number": entry},
+        "Initial Stop": {"type": "number", "number": stop},
+        "Current Stop": {"type": "number", "number": stop},
+    }
+    for name, number in extra.items():
+        properties[name.replace("_", " ").title()] = {"type": "number", "number": number}
+    return {"id": page_id, "archived": False, "last_edited_time": edited, "properties": properties}
+
+
+class NotionQueryStandIn(BaseHTTPRequestHandler):
+    # Local stand-in for the Notion database query endpoint, pages the filtered pages
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server = self.server
+        with server.lock:
+            server.received.append(body)
+            status, headers = server.responses.pop(0) if server.responses else (200, {})
+            pages = sorted(server.pages.values(), key=lambda page: page["last_edited_time"])
+        if status == 200:
+            since = body.get("filter", {}).get("last_edited_time", {}).get("on_or_after")
+            if since is not None:
+                pages = [page for page in pages if page["last_edited_time"] >= since]
+            start = int(body.get("start_cursor", 0))
+            end = start + body["page_size"]
+            result = {
+                "results": pages[start:end],
+                "has_more": end < len(pages),
+                "next_cursor": str(end) if end < len(pages) else None,
+            }
+        else:
+            result = {"status": status}
+        payload = json.dumps(result).encode()
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def notion():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), NotionQueryStandIn)
+    server.lock = threading.Lock()
+    server.received = []
+    server.responses = []
+    server.pages = {}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_mirror(notion, path, sync_interval=0.0, closed_property="Exit Price"):
+    return NotionMirror(
+        headers={"Authorization": "Bearer secret"},
+        database_id="journal",
+        closed_property=closed_property,
+        path=str(path),
+        url=f"http://127.0.0.1:{notion.server_address[1]}/v1/databases/{{database_id}}/query",
+        sync_interval=sync_interval,
+        requests_per_second=100,
+        page_size=2,
+    )
+
+
+def test_sync_pulls_all_pages_then_only_edited_pages(notion, tmp_path):
+    notion.pages = {
+        "a": make_page("a", "aapl", "2024-07-01T10:00:00.000Z"),
+        "b": make_page("b", "MSFT", "2024-07-01T11:00:00.000Z", quantity=5, entry=400.0, stop=390.0),
+        "c": make_page("c", "NVDA", "2024-07-01T12:00:00.000Z", action="Short", entry=120.0, stop=125.0),
+    }
+    notion.responses = [(429, {"Retry-After": "0.05"})]
+    mirror = make_mirror(notion, tmp_path / "mirror.sqlite")
+
+    assert mirror.sync() == 3
+    # One rate limited request and two pages of two results
+    assert len(notion.received) == 3
+    assert "filter" not in notion.received[0]
+    assert notion.received[2]["start_cursor"] == "2"
+    assert [trade["symbol"] for trade in mirror.open_trades()] == ["AAPL", "MSFT", "NVDA"]
+
+    # Closing a trade only pulls that page and the pages of the last edited minute
+    notion.pages["a"] = make_page("a", "AAPL", "2024-07-02T09:00:00.000Z", exit_price=110.0)
+    received = len(notion.received)
+    assert mirror.sync() == 2
+    query = notion.received[received]
+    assert query["filter"]["last_edited_time"] == {"on_or_after": "2024-07-01T12:00:00.000Z"}
+    assert [trade["symbol"] for trade in mirror.open_trades()] == ["MSFT", "NVDA"]
+
+    exposure = mirror.exposure()
+    assert exposure["open_trades"] == 2
+    assert exposure["capital"] == pytest.approx(5 * 400.0 + 10 * 120.0)
+    assert exposure["open_risk"] == pytest.approx(5 * 10.0 + 10 * 5.0)
+
+
+def test_sync_is_throttled(notion, tmp_path):
+    notion.pages = {"a": make_page("a", "AAPL", "2024-07-01T10:00:00.000Z")}
+    mirror = make_mirror(notion, tmp_path / "mirror.sqlite", sync_interval=3600)
+
+    assert mirror.sync() == 1
+    assert mirror.sync() == 0
+    assert len(notion.received) == 1
+    assert mirror.sync(force=True) == 1
+    assert len(notion.received) == 2
+
+    # The sync state is kept on disk
+    assert make_mirror(notion, tmp_path / "mirror.sqlite", sync_interval=3600).sync() == 0
+    assert len(notion.received) == 2
+
+
+def test_parse_trade_of_a_written_page():
+    page = {
+        "id": "page-1",
+        "last_edited_time": "2024-07-01T10:00:00.000Z",
+        "properties": {
+            "Symbol": {"title": [{"text": {"content": "AAPL"}}]},
+            "Action": {"select": {"name": "Long"}},
+            "Quantity": {"number": 10},
+            "Entry Price": {"number": 100.0},
+            "Initial Stop": {"number": 95.0},
+            "Current Stop": {"number": None},
+            "Status": {"select": {"name": "Closed"}},
+        },
+    }
+    trade = parse_trade(page, closed_property="Status")
+    assert trade["symbol"] == "AAPL"
+    assert trade["stop"] == 95.0
+    assert not trade["open"]
+    page["properties"]["Status"] = {"select": {"name": "Open"}}
+    assert parse_trade(page, closed_property="Status")["open"]
+    # Without a closed property the page is open
+    assert parse_trade(page)["open"]
+
+
+def journal_page(page_id, symbol, edited):
+    # A page as trading_plan.py writes it, with the fields the query adds
+    page = build_new_page_data(
+        "journal", symbol, "Long", date(2024, 7, 1), 100, 100.0, 95.0, "DAY",
+        "STP/STP LMT", None, False, 0.0, symbol, "", "", "",
+    )
+    return {"id": page_id, "archived": False, "last_edited_time": edited, **page}
+
+
+def test_journal_pages_do_not_stay_open_risk_forever(notion, tmp_path):
+    notion.pages = {
+        str(i): journal_page(str(i), f"SYM{i}", f"2024-07-01T1{i}:00:00.000Z") for i in range(5)
+    }
+
+    # The written pages have no closed property, so the open trades are not tracked
+    untracked = make_mirror(notion, tmp_path / "untracked.sqlite", closed_property=None)
+    untracked.sync()
+    assert not untracked.exposure()["tracked"]
+
+    mirror = make_mirror(notion, tmp_path / "mirror.sqlite")
+    mirror.sync()
+    exposure = mirror.exposure()
+    assert exposure["tracked"]
+    assert exposure["open_risk"] == pytest.approx(5 * 100 * 5.0)
+
+    # Closed by filling in the exit price, or no longer listed by the query
+    notion.pages["0"]["properties"]["Exit Price"] = {"number": 104.0}
+    notion.pages["0"]["last_edited_time"] = "2024-07-02T09:00:00.000Z"
+    del notion.pages["1"]
+    mirror.sync()
+    assert [trade["symbol"] for trade in mirror.open_trades()] == ["SYM1", "SYM2", "SYM3", "SYM4"]
+    mirror.sync(force=True)
+    assert [trade["symbol"] for trade in mirror.open_trades()] == ["SYM2", "SYM3", "SYM4"]
+    assert mirror.exposure()["open_risk"] == pytest.approx(3 * 100 * 5.0)
+
+
+def test_cap_position_size():
+    # 5% of 100,000 may be at risk, 4,000 already is
+    assert cap_position_size(500, 100.0, 98.0, 100000.0, open_risk=4000.0) == 500
+    assert cap_position_size(1000, 100.0, 98.0, 100000.0, open_risk=4000.0) == 500
+    # Capital limit
+    assert cap_position_size(500, 100.0, 98.0, 100000.0, open_capital=90000.0) == 100
+    # Short trades and limits that are used up
+    assert cap_position_size(500, 100.0, 102.0, 100000.0, open_risk=4000.0) == 500
+    assert cap_position_size(500, 100.0, 98.0, 100000.0, open_risk=6000.0) == 0
+    assert cap_position_size(0, 100.0, 100.0, 100000.0) == 0
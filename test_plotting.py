@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+
+from plotting import downsample_ohlc, signal_runs, signal_shapes
+
+
+def make_bars(periods):
+    rng = np.random.default_rng(0)
+    close = 100 + np.cumsum(rng.normal(0, 1, periods))
+    return pd.DataFrame(
+        {
+            "Date": pd.date_range("2024-01-01", periods=periods, freq="min"),
+            "Open": close + rng.normal(0, 0.1, periods),
+            "High": close + rng.uniform(0, 2, periods),
+            "Low": close - rng.uniform(0, 2, periods),
+            "Close": close,
+            "Volume": np.ones(periods, dtype=np.int64),
+            "long_signal": (rng.uniform(size=periods) > 0.99).astype(int),
+        }
+    )
+
+
+def test_downsample_ohlc_keeps_highs_lows_and_signals():
+    data = make_bars(100_003)
+    reduced = downsample_ohlc(data, 1000)
+
+    assert len(reduced) == 1000
+    assert reduced["High"].max() == data["High"].max()
+    assert reduced["Low"].min() == data["Low"].min()
+    assert reduced["Volume"].sum() == data["Volume"].sum()
+    assert reduced["Open"].iloc[0] == data["Open"].iloc[0]
+    assert reduced["Close"].iloc[-1] == data["Close"].iloc[-1]
+    assert reduced["Date"].iloc[-1] == data["Date"].iloc[-1]
+    assert reduced["long_signal"].sum() > 0
+    assert downsample_ohlc(data, None) is data
+
+
+def test_downsample_ohlc_keeps_x_and_indicators_of_the_same_bar():
+    data = make_bars(10_007)
+    data["EMA_5"] = data["Close"].ewm(span=5).mean()
+    reduced = downsample_ohlc(data, 100)
+
+    # Every candle is drawn at the bar its Close and EMA belong to
+    bars = data.set_index("Date").loc[reduced["Date"]]
+    np.testing.assert_array_equal(reduced["Close"], bars["Close"])
+    np.testing.assert_array_equal(reduced["EMA_5"], bars["EMA_5"])
+
+
+def test_signal_runs_and_shapes():
+    starts, ends = signal_runs([1, 1, 0, 0, 1, 0, 1, 1, 1])
+    assert list(starts) == [0, 4, 6]
+    assert list(ends) == [1, 4, 8]
+
+    data = pd.DataFrame({"Date": list("abcdefghi"), "signal_1": [1, 1, 0, 0, 1, 0, 1, 1, 1]})
+    shapes = signal_shapes(data, "signal_1")
+    assert [(shape["x0"], shape["x1"]) for shape in shapes] == [("a", "c"), ("e", "f"), ("g", "i")]
+
+
+def test_patch_figure_replaces_the_last_candle_and_appends_new_ones():
+    import app
+    from plotting import patch_figure
+
+    app.company_name = "Test"
+    data = make_bars(50)
+    for column in ["EMA_5", "EMA_20", "RSI_14", "SMA_RSI_14"]:
+        data[column] = data["Close"]
+    fig = app.plot_data(data)
+
+    last = data.iloc[-1]
+    forming = dict(last, High=last["High"] + 5, Close=last["Close"] + 1, EMA_5=1.0)
+    new = dict(last, Date=last["Date"] + pd.Timedelta(minutes=1), RSI_14=55.0)
+    patch_figure(fig, [forming, new], max_points=50)
+
+    traces = {trace.name: trace for trace in fig.data}
+    candles = traces["Candlesticks"]
+    assert len(candles.x) == 50
+    assert candles.high[-2] == forming["High"]
+    assert candles.close[-2] == forming["Close"]
+    assert traces["EMA 5"].y[-2] == 1.0
+    assert traces["RSI 14"].y[-1] == 55.0
+    assert pd.Timestamp(candles.x[-1]) == new["Date"]
+
+
+def test_plot_data_shows_the_last_visible_candles():
+    import app
+
+    app.company_name = "Test"
+    data = make_bars(50)
+    for column in ["EMA_5", "EMA_20", "RSI_14", "SMA_RSI_14"]:
+        data[column] = data["Close"]
+    fig = app.plot_data(data, visible=20)
+    assert [pd.Timestamp(x) for x in fig.layout.xaxis.range] == [data["Date"].iloc[-20], data["Date"].iloc[-1]]
+    assert app.plot_data(data).layout.xaxis.range is None
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+
+from core.sizing import calculate_position_size, calculate_position_sizes
+
+
+def test_calculate_position_sizes_matches_scalar_function():
+    rng = np.random.default_rng(0)
+    entry_price = rng.uniform(1, 500, 1000).round(2)
+    stop_loss = (entry_price * rng.uniform(0.8, 1.2, 1000)).round(2)
+    account_balance = rng.uniform(1_000, 1_000_000, 1000)
+    risk_per_trade_percent = rng.uniform(0.1, 2.0, 1000)
+    risked_capital_percent = rng.uniform(1.0, 25.0, 1000)
+
+    quantity, invalid = calculate_position_sizes(
+        entry_price, stop_loss, account_balance, risk_per_trade_percent, risked_capital_percent
+    )
+
+    expected = [
+        calculate_position_size(*row)
+        for row in zip(
+            entry_price.tolist(),
+            stop_loss.tolist(),
+            account_balance.tolist(),
+            risk_per_trade_percent.tolist(),
+            risked_capital_percent.tolist(),
+        )
+    ]
+    assert quantity.dtype == np.int64
+    assert list(quantity) == expected
+    assert not invalid[entry_price != stop_loss].any()
+
+
+def test_calculate_position_sizes_marks_invalid_rows():
+    entry_price = pd.Series([100.0, 100.0, np.nan, 0.0, 200.0], index=list("abcde"))
+    stop_loss = pd.Series([90.0, 100.0, 90.0, 1.0, 190.0], index=list("abcde"))
+
+    quantity, invalid = calculate_position_sizes(
+        entry_price, stop_loss, 10000.0, risk_per_trade_percent=1.0, risked_capital_percent=5.0
+    )
+
+    assert list(quantity.index) == list("abcde")
+    assert list(quantity) == [5, 0, 0, 0, 2]
+    assert list(invalid) == [False, True, True, True, False]
@@ -0,0 +1,140 @@
+import numpy as np
+import pandas as pd
+
+from resample import BASE_INTERVALS, RULES, base_bars, base_interval, resample_bars
+
+
+def make_minute_bars(days=("2024-01-02", "2024-01-03")):
+    # One regular session of 1m bars per day, 9:30 to 15:59 New York time
+    index = pd.DatetimeIndex([])
+    for day in days:
+        index = index.append(
+            pd.date_range(f"{day} 09:30", periods=390, freq="min", tz="America/New_York")
+        )
+    rng = np.random.default_rng(0)
+    close = 100 + np.cumsum(rng.normal(0, 0.1, len(index)))
+    open_ = close + rng.normal(0, 0.05, len(index))
+    return pd.DataFrame(
+        {
+            "Open": open_,
+            "High": np.maximum(open_, close) + 0.1,
+            "Low": np.minimum(open_, close) - 0.1,
+            "Close": close,
+            "Adj Close": close,
+            "Volume": rng.integers(100, 1000, len(index)),
+        },
+        index=index.rename("Datetime"),
+    )
+
+
+def test_every_selectable_interval_has_a_base_and_a_rule():
+    for interval in BASE_INTERVALS:
+        assert base_interval(interval) in ("1m", "1h", "1d")
+        assert interval in RULES or interval == "5d"
+
+
+def test_intraday_bars_aggregate_ohlcv():
+    data = make_minute_bars()
+    bars = resample_bars(data, "5m")
+
+    assert len(bars) == 2 * 78
+    first = data.iloc[:5]
+    assert bars["Open"].iloc[0] == first["Open"].iloc[0]
+    assert bars["High"].iloc[0] == first["High"].max()
+    assert bars["Low"].iloc[0] == first["Low"].min()
+    assert bars["Close"].iloc[0] == first["Close"].iloc[-1]
+    assert bars["Volume"].iloc[0] == first["Volume"].sum()
+    assert bars["Volume"].sum() == data["Volume"].sum()
+
+
+def test_90m_bars_are_aligned_to_the_session_open():
+    bars = resample_bars(make_minute_bars(), "90m")
+
+    assert bars.index.strftime("%d %H:%M").tolist() == [
+        "02 09:30", "02 11:00", "02 12:30", "02 14:00", "02 15:30",
+        "03 09:30", "03 11:00", "03 12:30", "03 14:00", "03 15:30",
+    ]
+    # The last bar of a session is shorter, no bar spans the night
+    assert bars["Volume"].sum() == make_minute_bars()["Volume"].sum()
+    assert bars.index.tz is not None
+
+
+def test_60m_bars_start_at_the_half_hour():
+    bars = resample_bars(make_minute_bars(), "60m")
+
+    assert bars.index[0].strftime("%H:%M") == "09:30"
+    assert bars.index[1].strftime("%H:%M") == "10:30"
+    assert len(bars) == 2 * 7
+
+
+def make_daily_bars(periods=70):
+    index = pd.bdate_range("2024-01-01", periods=periods, name="Date")
+    close = np.arange(periods, dtype=float) + 100
+    return pd.DataFrame(
+        {
+            "Open": close - 0.5,
+            "High": close + 1,
+            "Low": close - 1,
+            "Close": close,
+            "Adj Close": close,
+            "Volume": 1000,
+        },
+        index=index,
+    )
+
+
+def test_weekly_monthly_and_quarterly_bars_start_at_the_period():
+    data = make_daily_bars()
+
+    weekly = resample_bars(data, "1wk")
+    assert (weekly.index.weekday == 0).all()
+    assert weekly["Close"].iloc[0] == data["Close"].iloc[4]
+    assert weekly["Volume"].iloc[0] == 5000
+
+    monthly = resample_bars(data, "1mo")
+    assert monthly.index.tolist() == list(pd.to_datetime(["2024-01-01", "2024-02-01", "2024-03-01", "2024-04-01"]))
+    january = data[data.index.month == 1]
+    assert monthly["High"].iloc[0] == january["High"].max()
+    assert monthly["Low"].iloc[0] == january["Low"].min()
+
+    quarterly = resample_bars(data, "3mo")
+    assert quarterly.index.tolist() == list(pd.to_datetime(["2024-01-01", "2024-04-01"]))
+    assert quarterly["Volume"].sum() == data["Volume"].sum()
+
+
+def test_5d_bars_group_five_trading_days():
+    data = make_daily_bars(12)
+    bars = resample_bars(data, "5d")
+
+    assert bars.index.tolist() == data.index[::5].tolist()
+    assert bars["Close"].tolist() == [data["Close"].iloc[4], data["Close"].iloc[9], data["Close"].iloc[11]]
+
+
+def test_5d_bars_do_not_move_with_the_loaded_window():
+    data = make_daily_bars(200)
+    # A later day and an earlier page of bars, like the chart loads them
+    newer = resample_bars(data.iloc[22:190], "5d")
+    older = resample_bars(data.iloc[3:171], "5d")
+
+    # The bars that are complete in both windows are the same
+    shared = newer.index[1:].intersection(older.index[:-1])
+    assert len(shared) > 20
+    pd.testing.assert_frame_equal(newer.loc[shared], older.loc[shared])
+
+
+def test_empty_bins_are_dropped():
+    data = make_daily_bars(10)
+    # A holiday week without bars
+    data = data[(data.index < "2024-01-08") | (data.index > "2024-01-12")]
+    weekly = resample_bars(data, "1wk")
+    assert pd.Timestamp("2024-01-08") not in weekly.index
+    assert weekly["Open"].notna().all()
+
+
+def test_base_bars_cover_the_requested_bars():
+    daily = make_daily_bars(400)
+    for interval in ("5d", "1wk", "1mo", "3mo"):
+        window = daily.iloc[-base_bars(interval, 3):]
+        assert len(resample_bars(window, interval)) >= 3, interval
+    assert base_bars("90m", 2) == 180
+    assert base_bars("60m", 2) == 2
@@ -0,0 +1,68 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from event_calendar import EventCalendar
+from scanner import rank_hits, scan_symbol, scan_watchlist
+
+
+def make_bars(seed, periods=200):
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range("2023-01-02", periods=periods, name="Date")
+    close = 100 + np.cumsum(rng.normal(0, 1, periods))
+    return pd.DataFrame(
+        {
+            "Open": close,
+            "High": close + 1,
+            "Low": close - 1,
+            "Close": close,
+            "Adj Close": close,
+            "Volume": 1000,
+        },
+        index=index,
+    )
+
+
+def test_rank_hits_orders_long_signals_first():
+    hits = [
+        {"Symbol": "A", "long_signal": 0, "point_pos_signal_1": 1, "point_pos_signal_2": 1, "RSI_14": 60, "SMA_RSI_14": 50},
+        {"Symbol": "B", "long_signal": 1, "point_pos_signal_1": 0, "point_pos_signal_2": 0, "RSI_14": 55, "SMA_RSI_14": 50},
+        {"Symbol": "C", "long_signal": 1, "point_pos_signal_1": 0, "point_pos_signal_2": 0, "RSI_14": 70, "SMA_RSI_14": 50},
+        {"Symbol": "D", "long_signal": 0, "point_pos_signal_1": 1, "point_pos_signal_2": 0, "RSI_14": 80, "SMA_RSI_14": 50},
+    ]
+    for hit in hits:
+        hit.update({"Date": None, "Close": 1.0, "EMA_5": 1.0, "EMA_20": 1.0})
+    assert list(rank_hits(hits)["Symbol"]) == ["C", "B", "A", "D"]
+
+
+def test_scan_watchlist_matches_single_symbol_scan_and_reports_errors():
+    bars = {f"S{seed}": make_bars(seed) for seed in range(30)}
+
+    def load(symbol, interval):
+        if symbol == "BROKEN":
+            raise ValueError("download failed")
+        return bars[symbol]
+
+    table, errors = scan_watchlist(
+        list(bars) + ["BROKEN"], load=load, download_workers=4, compute_workers=2
+    )
+
+    expected = [symbol for symbol, data in bars.items() if scan_symbol(symbol, data) is not None]
+    assert expected
+    assert sorted(table["Symbol"]) == sorted(expected)
+    assert errors == {"BROKEN": "download failed"}
+
+
+def test_scan_watchlist_flags_upcoming_earnings(tmp_path):
+    bars = {f"S{seed}": make_bars(seed) for seed in range(30)}
+    expected = [symbol for symbol, data in bars.items() if scan_symbol(symbol, data) is not None]
+    calendar = EventCalendar(path=str(tmp_path / "calendar.sqlite"))
+    calendar.store(expected[0], "earnings_date", [date.today() + timedelta(days=2), True])
+
+    table, _ = scan_watchlist(
+        list(bars), load=lambda symbol, interval: bars[symbol], compute_workers=2, calendar=calendar
+    )
+    flagged = table.set_index("Symbol")["earnings_date"]
+    assert flagged[expected[0]] == date.today() + timedelta(days=2)
+    assert flagged.drop(expected[0]).isna().all()
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+
+from table_view import table_page
+
+
+def make_frame(rows=1000):
+    return pd.DataFrame(
+        {
+            "Date": pd.date_range("2024-01-01", periods=rows, freq="min"),
+            "Close": np.arange(rows, dtype=float),
+            "RSI_14": np.linspace(0, 100, rows),
+            "long_signal": (np.arange(rows) % 10 == 0).astype(int),
+        }
+    )
+
+
+def test_first_page_holds_the_newest_rows():
+    data = make_frame()
+    rows, total, pages = table_page(data, page=1, page_size=100, columns=["Date", "Close"])
+
+    assert (total, pages) == (1000, 10)
+    assert list(rows.columns) == ["Date", "Close"]
+    assert rows["Close"].tolist() == list(range(999, 899, -1))
+
+    rows, _, _ = table_page(data, page=10, page_size=100)
+    assert rows["Close"].iloc[-1] == 0
+    # Pages beyond the last one are clamped
+    rows, _, _ = table_page(data, page=99, page_size=300)
+    assert rows["Close"].tolist() == list(range(99, -1, -1))
+
+
+def test_signal_filter_is_applied_before_paging():
+    data = make_frame()
+    rows, total, pages = table_page(data, page=2, page_size=30, only="long_signal", newest_first=False)
+
+    assert (total, pages) == (100, 4)
+    assert (rows["long_signal"] == 1).all()
+    assert rows["Close"].tolist() == [float(i) for i in range(300, 600, 10)]
+
+
+def test_unknown_columns_are_skipped():
+    rows, _, _ = table_page(make_frame(10), columns=["Date", "EMA_5"])
+    assert list(rows.columns) == ["Date"]
@@ -0,0 +1,78 @@
+import threading
+import time
+
+import ticker_lookup
+from data_service import DataService
+
+
+def test_lookup_ticker_returns_partial_results_on_timeout_and_errors(monkeypatch):
+    release = threading.Event()
+
+    def slow_earnings_date(ticker_symbol, cache):
+        release.wait(5)
+        return ("2024-10-31", True)
+
+    def failing_dividends(ticker_symbol, cache):
+        raise ValueError("no dividends data")
+
+    monkeypatch.setattr(
+        ticker_lookup,
+        "LOOKUPS",
+        {
+            "company_name": lambda ticker_symbol, cache: "Apple Inc.",
+            "earnings_date": slow_earnings_date,
+            "ex_dividend_date": failing_dividends,
+        },
+    )
+
+    received = []
+    start = time.perf_counter()
+    results, errors = ticker_lookup.lookup_ticker(
+        "AAPL", cache=None, timeout=0.2, on_result=lambda field, value: received.append(field)
+    )
+    release.set()
+
+    assert time.perf_counter() - start < 1.0
+    assert received == ["company_name"]
+    assert results["company_name"] == "Apple Inc."
+    assert results["earnings_date"] == ticker_lookup.DEFAULT_RESULTS["earnings_date"]
+    assert results["ex_dividend_date"] == ticker_lookup.DEFAULT_RESULTS["ex_dividend_date"]
+    assert set(errors) == {"earnings_date", "ex_dividend_date"}
+
+
+def test_lookups_run_concurrently(monkeypatch):
+    def lookup(ticker_symbol, cache):
+        time.sleep(0.3)
+        return ticker_symbol
+
+    monkeypatch.setattr(ticker_lookup, "LOOKUPS", dict.fromkeys(ticker_lookup.LOOKUPS, lookup))
+
+    start = time.perf_counter()
+    results, errors = ticker_lookup.lookup_ticker("MSFT", cache=None, timeout=5)
+    assert time.perf_counter() - start < 0.6
+    assert errors == {}
+    assert set(results.values()) == {"MSFT"}
+
+
+def test_concurrent_sessions_share_the_lookups(monkeypatch):
+    calls = []
+
+    def lookup(ticker_symbol, cache):
+        calls.append(ticker_symbol)
+        time.sleep(0.3)
+        return ticker_symbol
+
+    monkeypatch.setattr(ticker_lookup, "LOOKUPS", dict.fromkeys(ticker_lookup.LOOKUPS, lookup))
+
+    service = DataService()
+    sessions = [
+        threading.Thread(
+            target=ticker_lookup.lookup_ticker, args=("NVDA", None, 5), kwargs={"service": service}
+        )
+        for _ in range(3)
+    ]
+    for session in sessions:
+        session.start()
+    for session in sessions:
+        session.join()
+    assert len(calls) == len(ticker_lookup.LOOKUPS)
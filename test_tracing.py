@@ -0,0 +1,66 @@
+import urllib.request
+
+import pytest
+
+from tracing import Tracer, show_timings
+
+
+def test_spans_are_aggregated_into_histograms():
+    tracer = Tracer("app", buckets=(0.1, 1.0), metric_tags=("interval",))
+    tracer.record("download_data", 0.05, symbol="AAPL", interval="1d")
+    tracer.record("download_data", 0.5, symbol="MSFT", interval="1d")
+    tracer.record("download_data", 5.0, symbol="AAPL", interval="1d")
+    with pytest.raises(ValueError):
+        with tracer.span("plot_data", symbol="AAPL", interval="1h"):
+            raise ValueError("failed spans are recorded as well")
+
+    text = tracer.prometheus_text()
+    labels = 'app="app",stage="download_data",interval="1d"'
+    assert f'trade_your_plan_stage_seconds_bucket{{{labels},le="0.1"}} 1' in text
+    assert f'trade_your_plan_stage_seconds_bucket{{{labels},le="1"}} 2' in text
+    assert f'trade_your_plan_stage_seconds_bucket{{{labels},le="+Inf"}} 3' in text
+    assert f"trade_your_plan_stage_seconds_sum{{{labels}}} 5.550000" in text
+    assert f"trade_your_plan_stage_seconds_count{{{labels}}} 3" in text
+    assert 'stage="plot_data",interval="1h"' in text
+    # The symbol is not a label of the histograms
+    assert "AAPL" not in text
+
+    summary = tracer.summary()
+    assert summary["download_data"]["count"] == 3
+    assert summary["download_data"]["last_ms"] == pytest.approx(5000.0)
+    assert summary["download_data"]["p50_ms"] == pytest.approx(500.0)
+    assert summary["download_data"]["p95_ms"] == pytest.approx(5000.0)
+    assert summary["plot_data"]["count"] == 1
+
+
+def test_metrics_are_written_and_served(tmp_path):
+    tracer = Tracer("trading_plan")
+    tracer.record("tws_submit", 0.2, symbol="AAPL")
+
+    path = tmp_path / "metrics" / "trading_plan.prom"
+    tracer.write_prometheus(str(path))
+    assert path.read_text() == tracer.prometheus_text()
+
+    server = tracer.serve_prometheus(0)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        with urllib.request.urlopen(url, timeout=5) as response:
+            assert response.read().decode() == tracer.prometheus_text()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_timing_panel_shows_the_tags_of_the_last_span():
+    class Panel:
+        def __init__(self):
+            self.lines = []
+
+        def write(self, line):
+            self.lines.append(line)
+
+    tracer = Tracer("app")
+    tracer.record("download_data", 0.25, symbol="AAPL", interval="1d")
+    panel = Panel()
+    show_timings(panel, tracer)
+    assert panel.lines == ["download_data (AAPL 1d): 250 ms, p50 250 ms, p95 250 ms, 1 spans"]
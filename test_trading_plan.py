@@ -1,4 +1,10 @@
-from trading_plan import calculate_position_size
+import os
+
+from streamlit.testing.v1 import AppTest
+
+from core.sizing import calculate_position_size
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "trading_plan.py")
 
 
 # test_trading_plan.py
@@ -44,3 +50,14 @@ def test_calculate_position_size_large_account_balance():
         risked_capital_percent=20.0,
     )
     assert result == 2000  # Expected quantity based on calculations
+
+
+def test_trading_plan_reruns_without_errors(tmp_path, monkeypatch):
+    # The caches and the journal mirror are created under data/ of the working directory
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("NOTION_API_KEY", raising=False)
+    app = AppTest.from_file(APP, default_timeout=60)
+    app.run()
+    assert not app.exception
+    # The rerun span is recorded at the very end of the script
+    assert any(expander.label == "Timings" for expander in app.sidebar.expander)
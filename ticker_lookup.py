@@ -0,0 +1,131 @@
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, as_completed
+
+from metadata_cache import get_company_name, get_earnings_date, get_ex_dividend_date
+
+# Default results used for lookups that fail or time out
+DEFAULT_RESULTS = {
+    "company_name": "",
+    "earnings_date": (None, False),
+    "ex_dividend_date": (False, None, None),
+}
+
+LOOKUPS = {
+    "company_name": get_company_name,
+    "earnings_date": get_earnings_date,
+    "ex_dividend_date": get_ex_dividend_date,
+}
+
+# Shared by all lookups, a lookup that times out keeps running in the
+# background and fills the metadata cache for the next rerun
+_executor = ThreadPoolExecutor(max_workers=12, thread_name_prefix="ticker_lookup")
+
+
+def lookup_ticker(ticker_symbol, cache, timeout=5.0, on_result=None, service=None):
+    """
+    Look up the company name, earnings date and ex-dividend date of a ticker
+    concurrently.
+
+    The lookups run in parallel, so the total wait is bounded by the slowest
+    lookup (or the timeout) instead of the sum of all of them. A lookup that
+    fails or does not finish within the timeout does not affect the others,
+    its default result from DEFAULT_RESULTS is used instead.
+
+    Parameters:
+        ticker_symbol (str): The ticker symbol.
+        cache (MetadataCache): The metadata cache used by the lookups.
+        timeout (float): Seconds to wait for each lookup.
+        on_result (callable): Called as on_result(field, value) in the calling
+            thread as soon as a lookup has finished.
+        service (DataService): Share the lookups with the identical lookups
+            of other sessions that are in flight.
+
+    Returns:
+        tuple: A dict with the result of every lookup and a dict mapping the
+        failed lookups to their error message.
+    """
+    results = dict(DEFAULT_RESULTS)
+    errors = {}
+    if service is None:
+        futures = {
+            _executor.submit(lookup, ticker_symbol, cache): field
+            for field, lookup in LOOKUPS.items()
+        }
+    else:
+        futures = {
+            _executor.submit(
+                service.call, (field, ticker_symbol.upper()), lookup, ticker_symbol, cache
+            ): field
+            for field, lookup in LOOKUPS.items()
+        }
+
+    def collect(future):
+        field = futures.pop(future)
+        try:
+            results[field] = future.result()
+        except Exception as e:
+            errors[field] = str(e)
+            return
+        if on_result is not None:
+            on_result(field, results[field])
+
+    try:
+        for future in as_completed(list(futures), timeout=timeout):
+            collect(future)
+    except TimeoutError:
+        for future in list(futures):
+            if future.done():
+                collect(future)
+        for field in futures.values():
+            errors[field] = f"Timed out after {timeout} seconds"
+
+    return results, errors
+
+
+def lookup_tickers(ticker_symbols, cache, max_workers=16, timeout=60.0):
+    """
+    Look up the company name, earnings date and ex-dividend date of many
+    tickers concurrently, e.g. for a batch of trade candidates.
+
+    All lookups of all tickers run in one pool of their own, so a large batch
+    does not queue up behind the interactive lookups of lookup_ticker.
+
+    Parameters:
+        ticker_symbols (list): The ticker symbols.
+        cache (MetadataCache): The metadata cache used by the lookups.
+        max_workers (int): The number of concurrent lookups.
+        timeout (float): Seconds to wait for the whole batch.
+
+    Returns:
+        dict: (results, errors) per ticker symbol, like lookup_ticker.
+    """
+    lookups = {
+        symbol: (dict(DEFAULT_RESULTS), {}) for symbol in dict.fromkeys(ticker_symbols)
+    }
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ticker_lookups")
+    futures = {
+        executor.submit(lookup, symbol, cache): (symbol, field)
+        for symbol in lookups
+        for field, lookup in LOOKUPS.items()
+    }
+
+    def collect(future):
+        symbol, field = futures.pop(future)
+        results, errors = lookups[symbol]
+        try:
+            results[field] = future.result()
+        except Exception as e:
+            errors[field] = str(e)
+
+    try:
+        for future in as_completed(list(futures), timeout=timeout):
+            collect(future)
+    except TimeoutError:
+        for future in list(futures):
+            if future.done():
+                collect(future)
+        for symbol, field in futures.values():
+            lookups[symbol][1][field] = f"Timed out after {timeout} seconds"
+    finally:
+        # Lookups that timed out keep running and fill the metadata cache
+        executor.shutdown(wait=False, cancel_futures=True)
+    return lookups
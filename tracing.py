@@ -0,0 +1,207 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds in seconds of the histogram buckets, +Inf is added
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Tags that become labels of the histograms, the other tags (e.g. the symbol)
+# are only shown with the last span to keep the number of series small
+DEFAULT_METRIC_TAGS = ("interval",)
+
+METRIC_NAME = "trade_your_plan_stage_seconds"
+
+# Write the metrics of every app to <app>.prom in this directory after every
+# rerun, e.g. for the textfile collector of the Prometheus node exporter
+TRACE_METRICS_DIR = os.getenv("TRACE_METRICS_DIR")
+
+# Serve the metrics on this local port, use a different port per app
+TRACE_METRICS_PORT = os.getenv("TRACE_METRICS_PORT")
+
+
+def _label_value(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Tracer:
+    """
+    Record the duration of the stages of a rerun as spans with tags.
+
+    Every span is added to a histogram per stage and metric tags, exported in
+    the Prometheus text format, and to a window of recent durations per stage
+    for the percentiles of the timing panel.
+
+    Parameters:
+        app (str): The app label of the metrics, e.g. "app" or "trading_plan".
+        buckets (tuple): Upper bounds in seconds of the histogram buckets.
+        metric_tags (tuple): The tags that become labels of the histograms.
+        window (int): The number of recent durations kept per stage.
+    """
+
+    def __init__(self, app, buckets=DEFAULT_BUCKETS, metric_tags=DEFAULT_METRIC_TAGS, window=500):
+        self.app = app
+        self.buckets = tuple(sorted(buckets))
+        self.metric_tags = tuple(metric_tags)
+        self.window = window
+        self._lock = threading.Lock()
+        # (stage, metric tag values) -> [bucket counts, sum, count]
+        self._histograms = {}
+        self._recent = {}
+        self._last = {}
+        self._server = None
+
+    @contextmanager
+    def span(self, stage, **tags):
+        """
+        Time the block as one span of stage, also when it raises.
+
+        Parameters:
+            stage (str): The stage, e.g. "download_data".
+            tags: Tags of the span, e.g. symbol="AAPL", interval="1d".
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - started, **tags)
+
+    def record(self, stage, seconds, **tags):
+        """Record a span of stage that took seconds."""
+        key = (stage, tuple(str(tags.get(tag, "")) for tag in self.metric_tags))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect_left(self.buckets, seconds)
+            if index < len(self.buckets):
+                histogram[0][index] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+            recent = self._recent.get(stage)
+            if recent is None:
+                recent = self._recent[stage] = deque(maxlen=self.window)
+            recent.append(seconds)
+            self._last[stage] = {"seconds": seconds, "tags": tags}
+
+    def summary(self):
+        """
+        Return the timings per stage over the recent window.
+
+        Returns:
+            dict: {stage: {"count", "last_ms", "last_tags", "p50_ms", "p95_ms",
+            "max_ms"}} with the count of all spans of the stage.
+        """
+        with self._lock:
+            recent = {stage: sorted(durations) for stage, durations in self._recent.items()}
+            last = dict(self._last)
+            counts = {}
+            for (stage, _), histogram in self._histograms.items():
+                counts[stage] = counts.get(stage, 0) + histogram[2]
+
+        def percentile(durations, q):
+            # Nearest rank percentile
+            return durations[min(len(durations) - 1, int(q * len(durations)))] * 1000
+
+        return {
+            stage: {
+                "count": counts[stage],
+                "last_ms": last[stage]["seconds"] * 1000,
+                "last_tags": last[stage]["tags"],
+                "p50_ms": percentile(durations, 0.5),
+                "p95_ms": percentile(durations, 0.95),
+                "max_ms": durations[-1] * 1000,
+            }
+            for stage, durations in recent.items()
+        }
+
+    def prometheus_text(self):
+        """Return the histograms in the Prometheus text exposition format."""
+        lines = [
+            f"# HELP {METRIC_NAME} Duration of the stages of the Streamlit apps in seconds.",
+            f"# TYPE {METRIC_NAME} histogram",
+        ]
+        with self._lock:
+            histograms = sorted(
+                (key, (list(counts), total, count))
+                for key, (counts, total, count) in self._histograms.items()
+            )
+        for (stage, values), (counts, total, count) in histograms:
+            labels = [f'app="{_label_value(self.app)}"', f'stage="{_label_value(stage)}"']
+            labels += [
+                f'{tag}="{_label_value(value)}"' for tag, value in zip(self.metric_tags, values)
+            ]
+            labels = ",".join(labels)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{METRIC_NAME}_bucket{{{labels},le="{bound:g}"}} {cumulative}')
+            lines.append(f'{METRIC_NAME}_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f"{METRIC_NAME}_sum{{{labels}}} {total:.6f}")
+            lines.append(f"{METRIC_NAME}_count{{{labels}}} {count}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Write the histograms to a file, replaced atomically."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, "w") as file:
+            file.write(self.prometheus_text())
+        os.replace(temporary, path)
+
+    def serve_prometheus(self, port, host="127.0.0.1"):
+        """
+        Serve the histograms on http://host:port/metrics from a background
+        thread, returns the server.
+        """
+        tracer = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = tracer.prometheus_text().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=self._server.serve_forever, name="metrics", daemon=True).start()
+        return self._server
+
+    def export(self):
+        """Write the metrics file of the app if TRACE_METRICS_DIR is set."""
+        if TRACE_METRICS_DIR:
+            self.write_prometheus(os.path.join(TRACE_METRICS_DIR, f"{self.app}.prom"))
+
+
+def make_tracer(app):
+    """
+    Return a tracer for app that serves its metrics on TRACE_METRICS_PORT if
+    the variable is set.
+    """
+    tracer = Tracer(app)
+    if TRACE_METRICS_PORT:
+        tracer.serve_prometheus(int(TRACE_METRICS_PORT))
+    return tracer
+
+
+def show_timings(container, tracer):
+    """Write the timing panel of tracer into a Streamlit container."""
+    for stage, timing in tracer.summary().items():
+        tags = " ".join(str(value) for value in timing["last_tags"].values())
+        container.write(
+            f"{stage}{f' ({tags})' if tags else ''}: {timing['last_ms']:,.0f} ms, "
+            f"p50 {timing['p50_ms']:,.0f} ms, p95 {timing['p95_ms']:,.0f} ms, {timing['count']} spans"
+        )
@@ -1,17 +1,24 @@
 import streamlit as st
 from datetime import datetime
-import requests
-import json
 import os
-from math import floor
+from time import perf_counter
 from dotenv import load_dotenv
-import yfinance as yf
-from pyfinsights.yfin import get_earnings_dates, get_dividends_date
-from pyfinsights.utils import get_earnings_date_from_df
-from pyfinsights.ibkrapi import place_US_stock_stop_limit_with_stop_loss, create_contract_US_stock
+
+from broker_session import BrokerSession
+from core.payloads import build_new_page_data, build_order, notion_headers
+from core.sizing import calculate_position_size, cap_position_size
+from data_service import DataService
+from event_calendar import EventCalendar
+from metadata_cache import MetadataCache
+from notion_journal import NotionJournalWriter
+from notion_mirror import NotionMirror
+from ticker_lookup import lookup_ticker
+from tracing import make_tracer, show_timings
 
 load_dotenv()
 
+rerun_started = perf_counter()
+
 # Create a title for the app
 st.title("Trading Plan - Stocks")
 
@@ -22,62 +29,49 @@ notion_db_id = os.getenv("NOTION_DB_ID")
 url = "https://api.notion.com/v1/pages"
 
 # Set up the headers for the API request
-headers = {
-    "Authorization": f"Bearer {notion_api_key}",
-    "Content-Type": "application/json",
-    "Notion-Version": "2022-06-28",
-}
-
-
-def calculate_position_size(
-    entry_price,
-    stop_loss,
-    account_balance,
-    risk_per_trade_percent=0.5,
-    risked_capital_percent=10.0,
-):
-    """
-    Calculate the trade size (quantity) based on risk management parameters.
-
-    Parameters:
-        entry_price (float): The price at which the trade is entered.
-        stop_loss (float): The stop loss price for the trade.
-        account_balance (float): The total account balance.
-        risk_per_trade_percent (float): The percentage of account balance to risk per trade.
-        risked_capital_percent (float): The maximum percentage of account balance to allocate to the trade.
-
-    Returns:
-        int: The calculated quantity of shares to trade.
-    """
-    try:
-        # Calculate the dollar amount to risk per trade
-        risk_per_trade = (risk_per_trade_percent / 100) * account_balance
+headers = notion_headers(notion_api_key)
 
-        # Calculate the quantity based on risk per trade and the difference between entry price and stop loss
-        quantity = risk_per_trade / (entry_price - stop_loss)
 
-        # Calculate the maximum capital to allocate to the trade
-        max_capitial_per_trade = (risked_capital_percent / 100) * account_balance
+# The metadata cache is stored on disk and shared by all sessions and processes
+@st.cache_resource
+def get_metadata_cache():
+    return MetadataCache()
 
-        # Adjust quantity if the total cost exceeds the allowed capital allocation
-        if quantity * entry_price > max_capitial_per_trade:
-            quantity = floor(max_capitial_per_trade / entry_price)
 
-        # Ensure the quantity is always positive
-        quantity = floor(abs(quantity))
-        return quantity
-    except ZeroDivisionError:
-        # Handle division by zero if entry_price equals stop_loss
-        return 0
-    except Exception as e:
-        # Log or handle other unexpected exceptions
-        return -99
+# Identical lookups of concurrent sessions are made once
+@st.cache_resource
+def get_data_service():
+    return DataService()
+
+
+# The earnings and ex-dividend calendar, refreshed by event_calendar.py on a schedule
+@st.cache_resource
+def get_event_calendar():
+    return EventCalendar()
+
+
+# One TWS session per server, it keeps the connections and qualified contracts
+@st.cache_resource
+def get_broker_session():
+    return BrokerSession(port=7497)
+
+
+# Stage timings of all sessions, exported for Prometheus
+@st.cache_resource
+def get_tracer():
+    return make_tracer("trading_plan")
 
 
-# Caching the result of expensive_computation / data access using @st.cache_data
-@st.cache_data
-def get_earnings_dates_cached(ticker_symbol):
-    return get_earnings_dates(ticker_symbol)
+# One journal writer per server, it saves the queued entries to Notion in the background
+@st.cache_resource
+def get_journal_writer():
+    return NotionJournalWriter(headers, url=url, tracer=get_tracer()).start()
+
+
+# One local mirror of the journal per server, synced with Notion before sizing a trade
+@st.cache_resource
+def get_notion_mirror():
+    return NotionMirror(headers, notion_db_id)
 
 
 global company_name
@@ -114,6 +108,50 @@ price_offset = st.sidebar.number_input(
 )
 price_offset = float(f"{price_offset:.2f}")
 
+lookup_timeout = st.sidebar.number_input(
+    "Lookup Timeout (s)", value=5.0, step=1.0, min_value=1.0
+)
+
+earnings_warning_days = st.sidebar.number_input(
+    "Earnings Warning (days)", value=7, step=1, min_value=0
+)
+
+max_open_risk_percent = st.sidebar.number_input(
+    "Max Open Risk (% of Account Balance)",
+    value=5.0,
+    step=0.5,
+    min_value=0.0,
+    max_value=100.0,
+)
+max_open_capital_percent = st.sidebar.number_input(
+    "Max Open Capital (% of Account Balance)",
+    value=100.0,
+    step=10.0,
+    min_value=0.0,
+)
+
+with st.sidebar.expander("Portfolio Exposure"):
+    exposure = get_notion_mirror().exposure()
+    if not exposure["tracked"]:
+        st.info("Set NOTION_CLOSED_PROPERTY to the journal property that closes a trade to cap new trades")
+    st.write(f"Open trades: {exposure['open_trades']}")
+    st.write(f"Open risk: ${exposure['open_risk']:,.2f}")
+    st.write(f"Open capital: ${exposure['capital']:,.2f}")
+    if st.button("Sync journal"):
+        try:
+            get_notion_mirror().sync(force=True)
+        except Exception as e:
+            st.warning(f"Could not sync the journal: {e}")
+        st.rerun()
+
+with st.sidebar.expander("TWS Latency"):
+    for name, value in get_broker_session().latency_stats().items():
+        st.write(f"{name}: {value:,.1f}" if isinstance(value, float) else f"{name}: {value}")
+
+with st.sidebar.expander("Metadata Cache"):
+    for field, counters in get_metadata_cache().stats().items():
+        st.write(f"{field}: {counters['hits']} hits, {counters['misses']} misses")
+
 max_capitial_per_trade = (risked_capital_percent / 100) * account_balance
 
 # Displaying values in main app
@@ -144,6 +182,8 @@ if 'trade_management_plan' not in st.session_state:
     st.session_state['trade_management_plan'] = ""
 if 'plan_b' not in st.session_state:
     st.session_state['plan_b'] = ""
+if 'journal_entries' not in st.session_state:
+    st.session_state['journal_entries'] = []
 
 # Clear all input fields if a new symbol is chosen
 if ticker_symbol != st.session_state['previous_ticker_symbol']:
@@ -158,27 +198,49 @@ if ticker_symbol != st.session_state['previous_ticker_symbol']:
     st.session_state['plan_b'] = ""
 
 if ticker_symbol:  # Only proceed if a ticker symbol is provided
-    try:
-        ticker = yf.Ticker(ticker_symbol)
-        company_name = str(ticker.info.get("shortName", ""))
-        st.write(company_name)
-
-        # Fetch earnings and dividends data
-        earnings_df = get_earnings_dates_cached(ticker_symbol)
-        earnings_date, earnings_date_confirmed_retrieved = get_earnings_date_from_df(
-            earnings_df, ticker_symbol
-        )
-        pays_dividends, dividends_date_retrieved, ex_dividend_date, ticker = get_dividends_date(
-            ticker_symbol
+    # Fetch company name, earnings and dividends data concurrently and show
+    # each result as soon as it arrives
+    company_name_placeholder = st.empty()
+    lookup_status = st.empty()
+
+    def show_lookup_result(field, value):
+        if field == "company_name":
+            company_name_placeholder.write(value)
+        else:
+            lookup_status.caption(f"Loaded {field.replace('_', ' ')}")
+
+    # Qualify the contract in the background so the order can be submitted right away
+    get_broker_session().warm(ticker_symbol)
+
+    with get_tracer().span("ticker_lookup", symbol=ticker_symbol):
+        lookup_results, lookup_errors = lookup_ticker(
+            ticker_symbol,
+            get_metadata_cache(),
+            timeout=lookup_timeout,
+            on_result=show_lookup_result,
+            service=get_data_service(),
         )
-
-    except Exception as e:
+    lookup_status.empty()
+
+    company_name = lookup_results["company_name"]
+    earnings_date, earnings_date_confirmed_retrieved = lookup_results["earnings_date"]
+    pays_dividends, dividends_date_retrieved, ex_dividend_date = lookup_results["ex_dividend_date"]
+
+    # Keep the calendar current with the looked up dates and warn about earnings soon
+    event_calendar = get_event_calendar()
+    for field in ("earnings_date", "ex_dividend_date"):
+        if field not in lookup_errors:
+            event_calendar.store(ticker_symbol, field, lookup_results[field])
+    upcoming_earnings = event_calendar.upcoming(earnings_warning_days, [ticker_symbol])
+    if ticker_symbol.upper() in upcoming_earnings:
+        next_earnings_date, _ = upcoming_earnings[ticker_symbol.upper()]
+        st.warning(f"{ticker_symbol.upper()} reports earnings on {next_earnings_date:%Y-%m-%d}")
+
+    if len(lookup_errors) == len(lookup_results):
         st.write("Error fetching data for the ticker symbol. Please check the input.")
-        company_name = ""
-        earnings_date = None
-        earnings_date_confirmed_retrieved = False
-        pays_dividends = False
-        dividends_date_retrieved = None
+    else:
+        for field, error in lookup_errors.items():
+            st.write(f"Could not fetch {field.replace('_', ' ')}: {error}")
 else:
     st.write("Please enter a valid ticker symbol to proceed.")
     company_name = ""
@@ -235,6 +297,35 @@ with st.container(border=True):
                 risk_per_trade_percent,
                 risked_capital_percent,
             )
+            # Cap the quantity by the exposure of the open trades in the journal,
+            # only if the journal tells open from closed trades
+            mirror = get_notion_mirror()
+            if mirror.closed_property is not None:
+                try:
+                    with get_tracer().span("notion_sync"):
+                        mirror.sync()
+                except Exception as e:
+                    st.warning(f"Could not sync the journal, using the last synced trades: {e}")
+            exposure = mirror.exposure()
+            capped_quantity = st.session_state['quantity']
+            if exposure["tracked"]:
+                capped_quantity = cap_position_size(
+                    st.session_state['quantity'],
+                    entry_price,
+                    initial_stop,
+                    account_balance,
+                    exposure["open_risk"],
+                    exposure["capital"],
+                    max_open_risk_percent,
+                    max_open_capital_percent,
+                )
+            if capped_quantity < st.session_state['quantity']:
+                st.warning(
+                    f"Quantity capped from {st.session_state['quantity']} to {capped_quantity} "
+                    f"by the open risk (${exposure['open_risk']:,.2f}) and capital "
+                    f"(${exposure['capital']:,.2f}) of {exposure['open_trades']} open trades"
+                )
+                st.session_state['quantity'] = capped_quantity
         else:
             #st.session_state['quantity'] = 0  # Default value if not calculated
             pass
@@ -319,31 +410,26 @@ save_to_notion_button = st.button(label="Save to Notion")
 # Add a button to submit the order to TWS
 submit_to_tws_button = st.button(label="Submit to TWS")
 
-broker_action = "BUY" if initial_stop < entry_price else "SELL"
-
-limit_price = (
-    entry_price + price_offset
-    if initial_stop < entry_price
-    else entry_price - price_offset
-)
-
 if submit_to_tws_button:
     try:
-        contract = create_contract_US_stock(ticker_symbol)
-
-        # Call the function to place the order
-        result = place_US_stock_stop_limit_with_stop_loss(
-            action=broker_action,
-            contract=contract,
-            quantity=st.session_state['quantity'],
-            stop_price=float(f"{entry_price:.2f}"), 
-            limit_price=float(f"{limit_price:.2f}"),  # Format limit_price to 2 decimal places
-            stop_loss_price=float(f"{initial_stop:.2f}") ,
-            tif="DAY",
-            transmit=False,
-            port=7497,
-        )
-        st.write("Order submitted successfully:", result)
+        # Place the order through the persistent TWS session, the contract is
+        # usually already qualified when the ticker was entered
+        with get_tracer().span("tws_submit", symbol=ticker_symbol):
+            # The same order as batch_plan.py builds for the plan
+            order = build_order(
+                ticker_symbol,
+                st.session_state['quantity'],
+                entry_price,
+                initial_stop,
+                price_offset,
+                validity,
+            )
+            result = get_broker_session().place_stop_limit_with_stop_loss(**order)
+        if result["acknowledged"]:
+            st.write("Order submitted successfully:", result)
+        else:
+            # Both orders were placed, check them in TWS
+            st.warning(f"TWS did not acknowledge the orders in time, check them in TWS: {result}")
     except Exception as e:
         st.write("Failed to submit the order. Error:", str(e))
 
@@ -377,51 +463,42 @@ if save_to_notion_button:
         # Map the string response to a boolean
         earnings_date_confirmed_bool = True if earnings_date_confirmed == "Ja" else False
 
-        new_page_data = {
-            "parent": {"database_id": notion_db_id},
-            "properties": {
-                "Symbol": {"title": [{"text": {"content": ticker_symbol}}]},
-                # "Description": {
-                #     "rich_text": [{"text": {"content": "This is an example description."}}]
-                # },
-                "Action": {"select": {"name": action}},
-                "Date": {
-                    "date": {"start": date.isoformat()}
-                },  # ISO 8601 formatted date with time
-                "Quantity": {"number": st.session_state['quantity']},  # Quantity as a number
-                "Entry Price": {"number": entry_price},
-                "Initial Stop": {"number": initial_stop},
-                "Current Stop": {"number": initial_stop},
-                "Order Validity": {"select": {"name": validity}},
-                "Order Type": {"select": {"name": order_type}},
-                "Earnings Date": {
-                    "date": {"start": earnings_date.isoformat()}
-                },  # ISO 8601 formatted date with time
-                # "Dividends Date": {"date": {"start": dividends_date.isoformat()}},
-                "Dividends": {"number": dividends},
-                "Stock": {
-                    "rich_text": [{"text": {"content": company_name}}]
-                },  # Text for stock status
-                "Trade Management": {
-                    "rich_text": [{"text": {"content": trade_management_plan}}]
-                },
-                "Reason": {"rich_text": [{"text": {"content": reason}}]},
-                "Plan B": {"rich_text": [{"text": {"content": plan_b}}]},
-                "Earnings Date Confirmed": {"checkbox": earnings_date_confirmed_bool},
-            },
-        }
-
-        # Conditionally add Dividends Date if it's not None
-        if dividends_date is not None:
-            new_page_data["properties"]["Dividends Date"] = {
-                "date": {"start": dividends_date.isoformat()}
-            }
-
-        # Make the request
-        response = requests.post(url, headers=headers, data=json.dumps(new_page_data))
-
-        # Check the response
-        if response.status_code == 200:
-            st.write("Trade info has been saved to Notion")
-        else:
-            st.write("Failed to create a page. Response:", response.json())
+        new_page_data = build_new_page_data(
+            notion_db_id,
+            ticker_symbol,
+            action,
+            date,
+            st.session_state['quantity'],
+            entry_price,
+            initial_stop,
+            validity,
+            order_type,
+            earnings_date,
+            earnings_date_confirmed_bool,
+            dividends,
+            company_name,
+            trade_management_plan,
+            reason,
+            plan_b,
+            dividends_date=dividends_date,
+        )
+
+        # Queue the entry, the journal writer saves it to Notion in the background
+        entry_id = get_journal_writer().enqueue(new_page_data)
+        st.session_state['journal_entries'].append((ticker_symbol, entry_id))
+        st.write("Trade info has been queued for Notion")
+
+if st.session_state['journal_entries']:
+    with st.expander("Notion Journal", expanded=True):
+        st.button("Refresh status")
+        journal_writer = get_journal_writer()
+        for symbol, entry_id in reversed(st.session_state['journal_entries']):
+            entry_status = journal_writer.status(entry_id)
+            if entry_status["status"] == "failed":
+                st.write(f"{symbol}: failed after {entry_status['attempts']} attempts. Response: {entry_status['last_error']}")
+            else:
+                st.write(f"{symbol}: {entry_status['status']}")
+
+get_tracer().record("rerun", perf_counter() - rerun_started)
+show_timings(st.sidebar.expander("Timings"), get_tracer())
+get_tracer().export()